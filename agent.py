@@ -1,51 +1,143 @@
 from __future__ import annotations
+import time
+_import_started = time.perf_counter()
 import logging
 import asyncio
 import json
+import functools
 from dotenv import load_dotenv
 from livekit.agents import (
     AutoSubscribe,
     JobContext,
+    JobProcess,
     WorkerOptions,
     cli,
     llm,
 )
 from livekit.agents.voice import Agent, AgentSession
-from livekit.plugins import deepgram, cartesia, openai, silero, bey
+from livekit.plugins import deepgram, cartesia, openai, silero
 from livekit import rtc
 from tools import Tools
+from publisher import DataPublisher
+from tts_cache import TTSCache
+import slots
+from summarizer import RollingSummarizer
+from context import ContextCompactor
+from router import ModelRouter, LLM_FAST_MODEL
+from avatar import AvatarManager
+from supervisor import SessionSupervisor
+import db
+import metrics
+import writebehind
+import load
+import logs
+import usage
+import transcripts
 
 load_dotenv()
-logger = logging.getLogger("voice-agent")
+logger = logging.getLogger("voice-agent.agent")
+IMPORT_TIME = time.perf_counter() - _import_started
+
+GREETING = "Hello! I am your clinic assistant. How can I help you today?"
+
+def prewarm(proc: JobProcess):
+    """Runs once per worker process, before it is handed a job.
+
+    Loads the VAD model and builds the plugin clients so none of it sits on the
+    critical path between a participant joining and the greeting playing.
+    """
+    started = time.perf_counter()
+    # Job processes are forked/spawned from the worker: give each its own log writer thread
+    logs.setup_logging()
+    proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["stt"] = deepgram.STT()
+    proc.userdata["llm"] = openai.LLM()
+    proc.userdata["llm_fast"] = openai.LLM(model=LLM_FAST_MODEL)
+    proc.userdata["tts"] = cartesia.TTS(speed=0.85)
+    proc.userdata["tts_cache"] = TTSCache(proc.userdata["tts"])
+    proc.userdata["prewarm_time"] = time.perf_counter() - started
+    logger.info(f"Process prewarmed in {proc.userdata['prewarm_time'] * 1000:.0f}ms")
+
+def _prewarmed(ctx: JobContext, name: str, factory):
+    # Falls back to building the component inline if the process was not prewarmed
+    value = ctx.proc.userdata.get(name)
+    if value is None:
+        value = factory()
+    return value
+
+class ClinicAgent(Agent):
+    """Agent whose per-turn prompt is kept under a token budget (see context.py) and
+    sent to the fast or full model (see router.py). Open LLM/TTS streams are counted
+    for the worker's load score (see load.py)."""
+
+    def __init__(self, *, compactor: ContextCompactor, router: ModelRouter,
+                 tracer: metrics.TurnTracer = None, **kwargs):
+        super().__init__(**kwargs)
+        self.compactor = compactor
+        self.router = router
+        self.tracer = tracer
+
+    async def llm_node(self, chat_ctx, tools, model_settings):
+        chat_ctx = self.compactor.compact(chat_ctx)
+        first = True
+        with load.get_monitor().stream():
+            async for chunk in self.router.chat(chat_ctx, tools, model_settings):
+                if first and self.tracer:
+                    self.tracer.mark("llm_first_token")
+                first = False
+                yield chunk
+
+    async def tts_node(self, text, model_settings):
+        first = True
+        with load.get_monitor().stream():
+            async for frame in Agent.default.tts_node(self, text, model_settings):
+                if first and self.tracer:
+                    self.tracer.mark("tts_first_audio")
+                first = False
+                yield frame
 
 async def entrypoint(ctx: JobContext):
+    job_started = time.perf_counter()
+    logs.setup_logging()  # no-op when prewarm already did it
+    logs.bind_room(ctx.room.name)
+    # What this call uses of each billed service, written to the usage table at close
+    # (if a caller joined)
+    meter = usage.UsageMeter(ctx.room.name)
+    usage.bind(meter)
+    # Owns this room's background tasks and closes the per-room components (in the
+    # order added below) when the room or the session closes
+    supervisor = SessionSupervisor(ctx.room.name)
+    supervisor.attach(ctx)
+
     # --- Avatar Integration ---
-    # Listen for "init_avatar" message from frontend
-    avatar_session_ref = {"session": None}
-    
-    # Define session variable early so it's captured in closure properly (will be assigned later)
-    files_session = {"val": None} 
+    # "init_avatar" from the frontend is queued until the AgentSession exists
+    avatars = AvatarManager(ctx, spawn=supervisor.spawn)
+    supervisor.add_closer(avatars.aclose)
+
+    # Single outgoing event channel for this room (transcripts, tool updates, summary)
+    # (its send loop runs for the whole call: a daemon task, stopped by its aclose)
+    publisher = DataPublisher(ctx.room, spawn=functools.partial(supervisor.spawn, daemon=True))
+    supervisor.add_closer(publisher.aclose)
 
     @ctx.room.on("data_received")
     def on_data_received(data: rtc.DataPacket):
         try:
             msg = data.data.decode("utf-8")
-            print(f"DEBUG: Received data packet: '{msg}' from {data.participant.identity}")
-            if msg == "init_avatar":
-                if not avatar_session_ref["session"]:
-                    print("Initializing Beyond Presence Avatar...")
-                    if files_session["val"]:
-                         asyncio.create_task(init_avatar(ctx, files_session["val"], avatar_session_ref))
-                    else:
-                         print("Error: AgentSession not yet initialized.")
-                else:
-                    print("Avatar already initialized.")
+            logger.debug(f"Received data packet: '{msg}' from {data.participant.identity}")
+            if msg.startswith("encoding:"):
+                publisher.set_encoding(msg.split(":", 1)[1])
+            elif msg == "init_avatar":
+                avatars.request()
         except Exception as e:
             logger.error(f"Error handling data: {e}", exc_info=True)
 
-    print("Room connected")
+    # Make sure the slot inventory is loaded before the first fetch_slots/book_appointment
+    slots.get_inventory().refresh_if_stale()
+
+    logger.info("Room connected")
     # Connect to the room
     await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
+    publisher.start()
 
     # Initial context/greeting
     initial_ctx = llm.ChatContext()
@@ -69,144 +161,180 @@ async def entrypoint(ctx: JobContext):
     )
 
     # Configure the Agent
-    tools = Tools()
+    tts = _prewarmed(ctx, "tts", lambda: cartesia.TTS(speed=0.85))
+    tts_cache = _prewarmed(ctx, "tts_cache", lambda: TTSCache(tts))
+
+    model = _prewarmed(ctx, "llm", openai.LLM)
+    router = ModelRouter(_prewarmed(ctx, "llm_fast", lambda: openai.LLM(model=LLM_FAST_MODEL)), model)
+
+    tools = Tools(supervisor)
     tools.room = ctx.room
+    tools.tts_cache = tts_cache
+    tools.publisher = publisher
+    # Transcript lines go to conversation_turns as they are committed
+    recorder = transcripts.TranscriptRecorder(ctx.room.name)
+    tools.transcript = recorder
+
+    tracer = metrics.TurnTracer()
+    tools.tracer = tracer
+    router.tracer = tracer
+    # Cancelled last at close, so its final write includes the session's report
+    supervisor.spawn(metrics.snapshot_loop(), name="metrics", daemon=True)
+    # Loop lag / open streams of this job, read by the worker's load_fnc
+    load.get_monitor().start()
+    ctx.add_shutdown_callback(load.get_monitor().aclose)
+
+    async def log_session_stats():
+        logger.info(f"DB cache stats: {db.cache_stats()}")
+        logger.info(f"Prefetch stats: {tools.prefetcher.stats}")
+        logger.info(f"LLM routing: {router.stats}")
+        logger.info(f"Transcript: {recorder.stats}")
+        tools.prefetcher.close()
+    supervisor.add_closer(log_session_stats)
+
+    async def flush_usage():
+        await meter.flush(getattr(tools, "current_user_contact", None))
+    supervisor.add_closer(flush_usage)
     
-    assistant = Agent(
+    summarizer = RollingSummarizer(model, spawn=supervisor.spawn)
+    tools.summarizer = summarizer
+    compactor = ContextCompactor(summarizer)
+
+    assistant = ClinicAgent(
+        compactor=compactor,
+        router=router,
+        tracer=tracer,
         instructions="You are a helpful AI voice assistant.", 
-        vad=silero.VAD.load(),
-        stt=deepgram.STT(),
-        llm=openai.LLM(),
-        tts=cartesia.TTS(speed=0.85), 
+        vad=_prewarmed(ctx, "vad", silero.VAD.load),
+        stt=_prewarmed(ctx, "stt", deepgram.STT),
+        llm=model,
+        tts=tts, 
         chat_ctx=initial_ctx,
         tools=llm.find_function_tools(tools),
     )
     tools.assistant = assistant 
     # tts=openai.TTS()
-    print("Assistant initialized")
+    logger.info("Assistant initialized")
     session = AgentSession()
-    files_session["val"] = session 
+    tools.session = session
+    # Running call summary, kept current as turns complete (used by end_conversation
+    # and to collapse old turns out of the prompt)
+    summarizer.attach(session)
+    tracer.attach(session)
+    meter.attach(session)
+
+    @session.on("metrics_collected")
+    def on_metrics_collected(ev):
+        m = ev.metrics
+        if getattr(m, "type", None) == "llm_metrics":
+            logger.info(
+                f"LLM turn: prompt_tokens={m.prompt_tokens} completion_tokens={m.completion_tokens} "
+                f"ttft={m.ttft * 1000:.0f}ms context_est={compactor.last['tokens_before']}->{compactor.last['tokens_after']} "
+                f"collapsed={compactor.last['collapsed_items']}"
+            )
     
     # Start the assistant
     await session.start(assistant, room=ctx.room)
-    print("Assistant started")
+    logger.info("Assistant started")
+    supervisor.watch_session(ctx, session)
     
-    # Start chat monitoring task
-    # Pass the assistant object itself so we can access the latest chat_ctx
-    asyncio.create_task(monitor_chat(assistant, ctx.room))
+    # Stream transcript lines to the frontend as the session commits them
+    # (and appends them to the stored transcript)
+    streamer = TranscriptStreamer(session, ctx.room, publisher, recorder)
+    streamer.start()
+
+    async def close_transcripts():
+        streamer.close()
+    supervisor.add_closer(close_transcripts)
+    # Summaries, transcript turns and other queued writes are flushed (or spooled)
+    # before the job exits. Closers run in order after grace tasks, so the end-of-call
+    # summary, the last turns and the usage totals are all queued by then.
+    supervisor.add_closer(writebehind.get_queue().aclose)
 
     # Wait for a participant to join
     await ctx.wait_for_participant()
-    print("Participant joined")
+    logger.info("Participant joined")
+    meter.start()  # the call (and its billed minutes) starts now
+    # Serves a queued init_avatar, or pre-starts an avatar during the greeting. Not
+    # earlier: the room may sit in the API's warm pool for minutes before a caller joins.
+    avatars.bind(session)
+    participant_joined = time.perf_counter()
     await asyncio.sleep(1)
-    await session.say("Hello! I am your clinic assistant. How can I help you today?", allow_interruptions=True)
-    print("Assistant Speaking")
+    # Greeting audio comes from the TTS cache (no Cartesia round trip after the first call)
+    handle = tts_cache.say(session, GREETING, allow_interruptions=True)
+    first_say = time.perf_counter()
+    prewarm_time = ctx.proc.userdata.get("prewarm_time")
+    logger.info(
+        "Startup report: "
+        f"import={IMPORT_TIME * 1000:.0f}ms "
+        f"prewarm={'n/a' if prewarm_time is None else f'{prewarm_time * 1000:.0f}ms'} "
+        f"job_to_first_say={(first_say - job_started) * 1000:.0f}ms "
+        f"participant_to_first_say={(first_say - participant_joined) * 1000:.0f}ms"
+    )
+    await handle
+    logger.info("Assistant Speaking")
+
+def _message_text(msg) -> str:
+    # ChatMessage exposes .text_content in newer versions; older ones only have .content
+    if hasattr(msg, "text_content") and msg.text_content:
+        return msg.text_content
+    raw_content = getattr(msg, "content", None)
+    if isinstance(raw_content, list):
+        # Join text parts (skip images/audio)
+        return " ".join([c for c in raw_content if isinstance(c, str)])
+    if isinstance(raw_content, str):
+        return raw_content
+    return ""
+
+
+class TranscriptStreamer:
+    """Pushes conversation items to the frontend as the AgentSession commits them.
+
+    Replaces the old polling loop: nothing runs while the room is idle, and there is no
+    index into chat_ctx to go stale when the context is truncated. Coalescing of bursts
+    is left to the room's DataPublisher.
+    """
+
+    def __init__(self, session: AgentSession, room: rtc.Room, publisher: DataPublisher,
+                 recorder: transcripts.TranscriptRecorder = None):
+        self.session = session
+        self.room = room
+        self.publisher = publisher
+        self.recorder = recorder
+        self._closed = False
+
+    def start(self):
+        self.session.on("conversation_item_added", self._on_item_added)
+        self.room.on("disconnected", self._on_disconnected)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.session.off("conversation_item_added", self._on_item_added)
+        self.room.off("disconnected", self._on_disconnected)
+
+    def _on_disconnected(self, *args):
+        self.close()
+
+    def _on_item_added(self, ev):
+        msg = ev.item
+        content = _message_text(msg)
+        if not content:
+            return
+        if self.recorder:
+            self.recorder.record(msg.role, content)
+
+        if msg.role == "user":
+            msg_type = "user_speech"
+        elif msg.role == "assistant":
+            msg_type = "agent_speech"
+        else:
+            msg_type = "tool_execution"
+
+        self.publisher.publish({
+            "type": msg_type,
+            "text": content,
+            "timestamp": asyncio.get_event_loop().time() * 1000
+        }, critical=True)
 
-async def monitor_chat(assistant: Agent, room: rtc.Room):
-    print("Starting chat monitor...")
-    
-    last_count = 0 
-    
-    while True:
-        try:
-            # Access the current chat context dynamically
-            chat_ctx = assistant.chat_ctx
-            if not chat_ctx:
-                await asyncio.sleep(1.0)
-                continue
-
-            # Create a snapshot. Depending on version, it might be .messages or .items
-            current_messages = []
-            if hasattr(chat_ctx, "messages"):
-                current_messages = chat_ctx.messages
-            elif hasattr(chat_ctx, "items"):
-                current_messages = chat_ctx.items
-            
-            # Note: current_messages might be a reference to the internal list, so we must be careful with indexing
-            # copying it might be safer if it changes concurrently, but usually appending is fine.
-            # actually, let's just access by index if it supports it, or just use the list.
-            
-            current_len = len(current_messages)
-            
-            # Debug log periodically or on change
-            if current_len > last_count:
-                print(f"DEBUG: Found new messages. Old count: {last_count}, New count: {current_len}")
-                for i in range(last_count, current_len):
-                    msg = current_messages[i]
-                    print(f"DEBUG: Inspecting message {i}: role={msg.role}, type={type(msg)}")
-                    # print(f"DEBUG: dir(msg): {dir(msg)}") 
-                    
-                    msg_type = ""
-                    
-                    # Extract content safely
-                    content = ""
-                    if hasattr(msg, "content"):
-                        raw_content = msg.content
-                        if isinstance(raw_content, list):
-                            # Join text parts
-                            content = " ".join([str(c) for c in raw_content])
-                        else:
-                            content = raw_content
-                    elif hasattr(msg, "text_content"):
-                         content = msg.text_content
-                    
-                    print(f"DEBUG: Extracted content: '{content}'")
-
-                    # Normalize valid content
-                    if content is None: 
-                        content = ""
-                    
-                    # Skip empty content or non-chat messages
-                    if not content or not isinstance(content, str):
-                        # Log if it's a tool message so we know it's happening
-                        if msg.role == "tool":
-                            print(f"DEBUG: Tool output detected (hidden from transcript)")
-                        # Update last_count even if we skip, so we don't get stuck processing the same invalid msg forever
-                        # Wait, the loop handles 'i', so 'last_count' is updated at the END of the loop block.
-                        # So 'continue' is safe here.
-                        print("DEBUG: Content empty or valid string, skipping.")
-                        continue
-                        
-                    if msg.role == "user":
-                        msg_type = "user_speech"
-                    elif msg.role == "assistant":
-                        # Filter out tool calls which might appear as assistant messages with tool_calls but no content
-                        if hasattr(msg, "tool_calls") and msg.tool_calls:
-                             print("DEBUG: Assistant tool call detected (hidden from transcript)")
-                             
-                        msg_type = "agent_speech"
-                    else:
-                        msg_type = "tool_execution"  
-
-                    if msg_type:
-                        print(f"DEBUG: Publishing {msg_type}: {content[:30]}...") 
-                        payload = json.dumps({
-                            "type": msg_type,
-                            "text": str(content),
-                            "timestamp": asyncio.get_event_loop().time() * 1000
-                        })
-                        await room.local_participant.publish_data(payload, reliable=True)
-                
-                last_count = current_len
-            
-            await asyncio.sleep(0.5)
-        except Exception as e:
-            # Reduce log noise
-            # logger.error(f"Chat monitor error: {e}") 
-            await asyncio.sleep(1)
-
-
-async def init_avatar(ctx, session, ref):
-    try:
-        # Instantiate AvatarSession
-        # Ensure BEY_API_KEY is in env
-        avatar = bey.AvatarSession(avatar_id="f30d7eef-6e71-433f-938d-cecdd8c0b653")
-        ref["session"] = avatar
-        
-        # Start the avatar
-        # Pass session as first arg, room as kwarg
-        await avatar.start(session, room=ctx.room)
-        print("Beyond Presence Avatar Started!")
-    except Exception as e:
-        logger.error(f"Failed to start avatar: {e}", exc_info=True)
-        print(f"Failed to start avatar: {e}") 
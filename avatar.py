@@ -0,0 +1,208 @@
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import time
+
+from livekit import api, rtc
+from livekit.plugins import bey
+
+import metrics
+import usage
+
+logger = logging.getLogger("voice-agent.avatar")
+
+# Beyond Presence avatar shown to callers (needs BEY_API_KEY)
+BEY_AVATAR_ID = os.environ.get("BEY_AVATAR_ID", "f30d7eef-6e71-433f-938d-cecdd8c0b653")
+AVATAR_IDENTITY = os.environ.get("AVATAR_IDENTITY", "bey-avatar-agent")
+# Avatars started per worker process before the frontend asks for one (0 = start on request only).
+# Opt-in: a pre-started avatar is billed and takes over the session's audio until
+# it is claimed or torn down after AVATAR_IDLE_SECONDS
+AVATAR_POOL_SIZE = int(os.environ.get("AVATAR_POOL_SIZE", "0"))
+# A pre-started avatar nobody asked for within this many seconds is torn down (it bills per minute)
+AVATAR_IDLE_SECONDS = float(os.environ.get("AVATAR_IDLE_SECONDS", "60"))
+
+
+class AvatarPool:
+    """Per-process budget of pre-started avatars, plus hit/miss accounting.
+
+    An avatar session is bound to a room, so "warm" here means started in a room as
+    soon as its AgentSession exists, before the frontend sends init_avatar. The pool
+    caps how many of those unclaimed avatars a worker keeps running at once.
+    """
+
+    def __init__(self, size: int = AVATAR_POOL_SIZE):
+        self.size = size
+        self.warm = 0
+        self.stats = {"prestarted": 0, "hits": 0, "misses": 0, "idle_teardowns": 0, "failures": 0}
+
+    def try_acquire(self) -> bool:
+        if self.warm >= self.size:
+            return False
+        self.warm += 1
+        self.stats["prestarted"] += 1
+        return True
+
+    def release(self):
+        self.warm = max(0, self.warm - 1)
+
+
+_pool: AvatarPool = None
+
+
+def get_pool() -> AvatarPool:
+    # One pool per worker process
+    global _pool
+    if _pool is None:
+        _pool = AvatarPool()
+    return _pool
+
+
+class AvatarManager:
+    """Avatar lifecycle for one room.
+
+    - init_avatar requests that arrive before the AgentSession exists are remembered
+      and served by bind() instead of being dropped,
+    - bind() pre-starts an avatar if the process pool has room; a later request is a
+      pool hit, otherwise the avatar is cold-started on request (a miss),
+    - a pre-started avatar that is never requested is torn down after
+      AVATAR_IDLE_SECONDS and the agent's audio goes back to the room,
+    - time to first frame (request -> avatar video track published) is recorded.
+    """
+
+    def __init__(self, ctx, pool: AvatarPool = None, idle_seconds: float = AVATAR_IDLE_SECONDS,
+                 spawn=asyncio.create_task):
+        self.ctx = ctx
+        self.spawn = spawn  # SessionSupervisor.spawn in a room
+        self.pool = pool or get_pool()
+        self.idle_seconds = idle_seconds
+        self.session = None
+        self.avatar = None
+        self._audio_output = None  # session audio output before the avatar took it over
+        self._pooled = False  # holds one of the pool's warm slots
+        self._requested_at = None
+        self._pool_result = None  # "hit" / "miss" for the request
+        self._first_frame_at = None
+        self._ttff_recorded = False
+        self._active_since = None  # billed from a successful start until teardown / close
+        self._tasks = set()
+        ctx.room.on("track_published", self._on_track_published)
+
+    def bind(self, session):
+        """The AgentSession exists: serve a queued request or pre-start from the pool."""
+        self.session = session
+        if self._requested_at is not None:
+            logger.info("Serving queued init_avatar request")
+            self._start()
+        elif self.pool.try_acquire():
+            self._pooled = True
+            self._start()
+            self._spawn(self._teardown_if_idle(), "avatar_idle")
+
+    def request(self):
+        """Frontend sent init_avatar."""
+        if self._requested_at is not None:
+            logger.info("Avatar already requested")
+            return
+        self._requested_at = time.perf_counter()
+        self._pool_result = "hit" if self.avatar is not None else "miss"
+        if self.avatar is not None:
+            self.pool.stats["hits"] += 1
+            metrics.AVATAR_POOL.inc(result="hit")
+            self._release_slot()  # claimed: no longer an idle warm avatar
+            if self._first_frame_at is not None:
+                self._record_ttff(0.0)
+            return
+        self.pool.stats["misses"] += 1
+        metrics.AVATAR_POOL.inc(result="miss")
+        if self.session is None:
+            logger.info("init_avatar queued until the AgentSession is ready")
+            return
+        self._start()
+
+    def _spawn(self, coro, name: str):
+        task = self.spawn(coro, name=name)
+        if task is None:
+            return
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _start(self):
+        if self.avatar is not None:
+            return
+        self.avatar = bey.AvatarSession(avatar_id=BEY_AVATAR_ID, avatar_participant_identity=AVATAR_IDENTITY)
+        self._audio_output = self.session.output.audio
+        self._spawn(self._run_start(self.avatar), "avatar_start")
+
+    async def _run_start(self, avatar):
+        started = time.perf_counter()
+        try:
+            await avatar.start(self.session, room=self.ctx.room)
+            self._active_since = time.monotonic()
+            logger.info(f"Beyond Presence avatar started in {(time.perf_counter() - started) * 1000:.0f}ms")
+        except Exception as e:
+            logger.error(f"Failed to start avatar: {e}", exc_info=True)
+            self.pool.stats["failures"] += 1
+            self._restore_audio()
+            self.avatar = None
+            self._release_slot()
+
+    def _on_track_published(self, publication: rtc.RemoteTrackPublication, participant: rtc.RemoteParticipant):
+        if participant.identity != AVATAR_IDENTITY or publication.kind != rtc.TrackKind.KIND_VIDEO:
+            return
+        # The avatar publishes its video track once it is rendering: our first frame
+        self._first_frame_at = time.perf_counter()
+        if self._requested_at is not None:
+            self._record_ttff(self._first_frame_at - self._requested_at)
+
+    def _record_ttff(self, seconds: float):
+        if self._ttff_recorded:
+            return
+        self._ttff_recorded = True
+        metrics.AVATAR_TTFF.observe(seconds, pool=self._pool_result)
+        logger.info(f"Avatar time to first frame: {seconds * 1000:.0f}ms (pool {self._pool_result})")
+
+    def _release_slot(self):
+        if self._pooled:
+            self._pooled = False
+            self.pool.release()
+
+    def _meter_active(self):
+        if self._active_since is not None:
+            usage.add("avatar_seconds", time.monotonic() - self._active_since)
+            self._active_since = None
+
+    def _restore_audio(self):
+        if self.session is not None and self._audio_output is not None:
+            self.session.output.audio = self._audio_output
+            self._audio_output = None
+
+    async def _teardown_if_idle(self):
+        await asyncio.sleep(self.idle_seconds)
+        if self._requested_at is not None or self.avatar is None:
+            return
+        logger.info(f"Pre-started avatar not requested within {self.idle_seconds:.0f}s, tearing it down")
+        self.pool.stats["idle_teardowns"] += 1
+        await self._teardown()
+
+    async def _teardown(self):
+        self._meter_active()
+        self._restore_audio()
+        self.avatar = None
+        self._first_frame_at = None
+        self._release_slot()
+        try:
+            await self.ctx.api.room.remove_participant(
+                api.RoomParticipantIdentity(room=self.ctx.room.name, identity=AVATAR_IDENTITY))
+        except Exception as e:
+            logger.warning(f"Could not remove avatar participant: {e}")
+
+    async def aclose(self):
+        self.ctx.room.off("track_published", self._on_track_published)
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._release_slot()
+        self._meter_active()
+        logger.info(f"Avatar pool stats: {self.pool.stats}")
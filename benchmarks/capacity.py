@@ -0,0 +1,93 @@
+"""Find how many concurrent rooms one CPU core sustains.
+
+Runs the conversation benchmark in a subprocess pinned to a single core, doubling the
+number of rooms and then bisecting, and reports the largest count whose turn p95
+stays within --slack of the single-room baseline and whose event-loop lag p99 stays
+under --max-loop-lag-ms. Use the result to set MAX_SESSIONS (rooms per core x cores).
+
+    python -m benchmarks.capacity
+    python -m benchmarks.capacity --audio-cpu-ms 30 --max-rooms 400
+
+Other options (--llm-ms, --backend, --think, ...) are passed to benchmarks.conversation.
+Fake STT/LLM/TTS only cost wall time, so without --audio-cpu-ms the result is an
+upper bound for the Python side of a room.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.conversation import RESULTS_DIR
+from load import LOOP_LAG_BUDGET
+
+
+def run_rooms(rooms: int, core: int, extra) -> dict:
+    name = f"capacity-{rooms}"
+    cmd = [sys.executable, "-m", "benchmarks.conversation", "--rooms", str(rooms), "--name", name, *extra]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL,
+                   preexec_fn=lambda: os.sched_setaffinity(0, {core}))
+    path = os.path.join(RESULTS_DIR, f"{name}.json")
+    with open(path) as f:
+        result = json.load(f)
+    os.remove(path)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--core", type=int, default=0, help="CPU core to pin the benchmark to")
+    parser.add_argument("--slack", type=float, default=0.25, help="allowed turn p95 increase over 1 room")
+    parser.add_argument("--max-loop-lag-ms", type=float, default=LOOP_LAG_BUDGET * 1000)
+    parser.add_argument("--max-rooms", type=int, default=1000)
+    args, extra = parser.parse_known_args(argv)
+
+    runs = {}
+
+    def check(rooms: int) -> bool:
+        started = time.perf_counter()
+        r = runs[rooms] = run_rooms(rooms, args.core, extra)
+        ok = r["turn_p95_ms"] <= budget and r["loop_lag_p99_ms"] <= args.max_loop_lag_ms
+        print(f"{rooms:>6}{r['turn_p95_ms']:>14}{r['loop_lag_p99_ms']:>16}{'ok' if ok else 'over':>8}"
+              f"{time.perf_counter() - started:>9.1f}s")
+        return ok
+
+    baseline = run_rooms(1, args.core, extra)
+    budget = baseline["turn_p95_ms"] * (1 + args.slack)
+    print(f"1 room: turn p95 {baseline['turn_p95_ms']}ms -> budget {budget:.1f}ms, loop lag p99 <= {args.max_loop_lag_ms}ms")
+    print(f"{'rooms':>6}{'turn p95 ms':>14}{'loop lag p99':>16}{'':>8}{'took':>10}")
+
+    # Double until over budget, then bisect between the last good and first bad count
+    good, bad = 1, None
+    rooms = 2
+    while rooms <= args.max_rooms:
+        if check(rooms):
+            good = rooms
+            rooms *= 2
+        else:
+            bad = rooms
+            break
+    while bad is not None and bad - good > max(1, good // 20):
+        middle = (good + bad) // 2
+        if check(middle):
+            good = middle
+        else:
+            bad = middle
+
+    cores = os.cpu_count() or 1
+    print(f"\nMax rooms per core: {good}{'+' if bad is None else ''}")
+    print(f"Suggested MAX_SESSIONS for this {cores}-core host: {good * cores}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"capacity-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump({"rooms_per_core": good, "turn_p95_budget_ms": budget, "config": vars(args), "extra": extra,
+                   "runs": {n: {k: r[k] for k in ("turn_p95_ms", "loop_lag_p99_ms", "memory_per_session_kb")}
+                            for n, r in sorted(runs.items())}}, f, indent=2)
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
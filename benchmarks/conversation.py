@@ -0,0 +1,216 @@
+"""Offline conversation benchmark: N concurrent simulated rooms in one process.
+
+Each room runs a scripted call (identify -> history -> slots -> book -> goodbye)
+through the real Tools, DataPublisher, slot inventory and db.py code, with fake
+STT/LLM/TTS latencies and an in-memory stand-in for Supabase.
+
+    python -m benchmarks.conversation --rooms 20
+    python -m benchmarks.conversation --rooms 50 --compare bench_results/baseline.json
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import time
+
+import db
+import slots
+import storage
+from publisher import DataPublisher
+from tools import Tools
+from benchmarks.fakes import FakeLLM, FakeRoom, FakeSTT, FakeSupabase, FakeTTS, Latency
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench_results")
+
+# Metrics compared between runs (lower is better for all of them)
+COMPARED = ("turn_p50_ms", "turn_p95_ms", "turn_p99_ms", "tool_p95_ms", "loop_lag_p99_ms", "loop_lag_max_ms", "memory_per_session_kb")
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def burn(seconds: float):
+    # Busy-wait on the event loop, standing in for per-frame audio work (VAD, resampling)
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def speak(seconds: float, audio_cpu_ms: float, frame: float = 0.02):
+    """User speech: one audio frame every 20ms, each costing audio_cpu_ms per second of audio."""
+    if not audio_cpu_ms:
+        await asyncio.sleep(seconds)
+        return
+    for _ in range(max(1, int(seconds / frame))):
+        await asyncio.sleep(frame)
+        burn(audio_cpu_ms / 1000 * frame)
+
+
+def script(contact: str, name: str, slot: str):
+    # (user utterance, [(tool, kwargs)], agent reply)
+    return [
+        (f"Hi, my number is {contact}", [("identify_user", {"contact_number": contact})], f"Welcome back, {name}. How can I help?"),
+        ("What appointments do I have?", [("retrieve_appointments", {"contact_number": contact})], "Here are your appointments."),
+        ("Which slots are free?", [("fetch_slots", {})], "These slots are available."),
+        (f"Book me at {slot}", [("book_appointment", {"contact_number": contact, "name": name, "time": slot})], f"You're booked at {slot}."),
+        ("Thanks, that's all", [("end_conversation", {})], "Goodbye."),
+    ]
+
+
+class Results:
+    def __init__(self):
+        self.turns = []
+        self.tools = []
+        self.tool_calls = 0
+        self.loop_lag = []
+        self.packets = 0
+        self.bytes = 0
+
+
+async def monitor_loop_lag(results: Results, interval: float = 0.01):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        results.loop_lag.append(max(0.0, time.perf_counter() - started - interval))
+
+
+async def run_room(index: int, args, stt: FakeSTT, model: FakeLLM, tts: FakeTTS, results: Results):
+    room = FakeRoom(f"bench-{index}")
+    publisher = DataPublisher(room)
+    publisher.start()
+    tools = Tools()
+    tools.room = room
+    tools.publisher = publisher
+
+    contact = f"+1555{index % args.users:06d}"
+    turns = script(contact, f"Patient {index}", random.choice(slots.OFFERED_SLOTS))
+
+    await asyncio.sleep(random.uniform(0, args.ramp))
+    for user_text, tool_calls, reply in turns:
+        await speak(args.think, args.audio_cpu_ms)  # user speaking
+        speech_end = time.perf_counter()
+        text = await stt.transcribe(user_text)
+        publisher.publish({"type": "user_speech", "text": text}, critical=True)
+        await model.first_token(text)
+        for tool_name, kwargs in tool_calls:
+            started = time.perf_counter()
+            await getattr(tools, tool_name)(**kwargs)
+            results.tools.append(time.perf_counter() - started)
+            results.tool_calls += 1
+            await model.first_token(text)  # follow-up generation after the tool output
+        await tts.first_audio(reply)
+        results.turns.append(time.perf_counter() - speech_end)
+        publisher.publish({"type": "agent_speech", "text": reply}, critical=True)
+
+    if tools._shutdown_task:
+        await tools._shutdown_task
+    await publisher.aclose()
+    results.packets += room.local_participant.packets
+    results.bytes += room.local_participant.bytes
+
+
+async def run(args) -> dict:
+    random.seed(args.seed)
+    if args.backend == "sqlite":
+        backend = storage.SQLiteBackend(":memory:")
+        for i in range(args.users):
+            await backend.create_user(f"+1555{i:06d}", f"Patient {i}")
+    else:
+        fake_db = FakeSupabase(Latency(args.db_ms / 1000))
+        fake_db.seed(args.users)
+        backend = storage.SupabaseBackend(client=fake_db)
+    db.set_backend(backend)
+    await slots.get_inventory().load()
+
+    stt = FakeSTT(Latency(args.stt_ms / 1000))
+    model = FakeLLM(Latency(args.llm_ms / 1000))
+    tts = FakeTTS(Latency(args.tts_ms / 1000))
+    results = Results()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    monitor = asyncio.create_task(monitor_loop_lag(results))
+    started = time.perf_counter()
+    await asyncio.gather(*(run_room(i, args, stt, model, tts, results) for i in range(args.rooms)))
+    wall = time.perf_counter() - started
+    monitor.cancel()
+    await backend.aclose()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "config": vars(args),
+        "rooms": args.rooms,
+        "wall_s": round(wall, 2),
+        "turn_p50_ms": ms(percentile(results.turns, 50)),
+        "turn_p95_ms": ms(percentile(results.turns, 95)),
+        "turn_p99_ms": ms(percentile(results.turns, 99)),
+        "turn_mean_ms": ms(statistics.fmean(results.turns)) if results.turns else 0.0,
+        "tool_p50_ms": ms(percentile(results.tools, 50)),
+        "tool_p95_ms": ms(percentile(results.tools, 95)),
+        "tool_calls_per_s": round(results.tool_calls / wall, 2),
+        "loop_lag_p99_ms": ms(percentile(results.loop_lag, 99)),
+        "loop_lag_max_ms": ms(max(results.loop_lag, default=0.0)),
+        # ru_maxrss is in KB on Linux
+        "memory_per_session_kb": round(max(0, rss_after - rss_before) / args.rooms, 1),
+        "packets_per_session": round(results.packets / args.rooms, 1),
+        "bytes_per_session": round(results.bytes / args.rooms, 1),
+        "db_cache": db.cache_stats(),
+    }
+
+
+def compare(current: dict, previous: dict):
+    print(f"\n{'metric':<24}{'previous':>12}{'current':>12}{'change':>10}")
+    for key in COMPARED:
+        before, after = previous.get(key), current.get(key)
+        if before is None or after is None:
+            continue
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"{key:<24}{before:>12}{after:>12}{change:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=10, help="concurrent simulated rooms")
+    parser.add_argument("--users", type=int, default=100, help="seeded patients")
+    parser.add_argument("--stt-ms", type=float, default=150, help="speech end -> final transcript")
+    parser.add_argument("--llm-ms", type=float, default=400, help="LLM time to first token")
+    parser.add_argument("--tts-ms", type=float, default=120, help="TTS time to first audio")
+    parser.add_argument("--db-ms", type=float, default=40, help="DB round trip (fake backend)")
+    parser.add_argument("--backend", choices=("fake", "sqlite"), default="fake", help="in-memory Supabase stand-in or embedded SQLite")
+    parser.add_argument("--think", type=float, default=0.5, help="seconds of user speech per turn")
+    parser.add_argument("--audio-cpu-ms", type=float, default=0, help="event-loop CPU per second of user audio (simulated VAD/resampling)")
+    parser.add_argument("--ramp", type=float, default=1.0, help="spread room starts over this many seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--name", default=None, help="results file name (default: timestamp)")
+    parser.add_argument("--compare", default=None, help="previous results file to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(run(args))
+    print(json.dumps({k: v for k, v in result.items() if k != "config"}, indent=2))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{args.name or time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+    return result
+
+
+if __name__ == "__main__":
+    main()
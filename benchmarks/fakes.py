@@ -0,0 +1,281 @@
+"""Local stand-ins for LiveKit, the STT/LLM/TTS providers and Supabase.
+
+Nothing here talks to the network. Latencies are configurable so runs can model a
+fast or a slow provider, and the DB stand-in blocks like the real HTTP client does
+(it runs on db.py's executor threads), so the real db.py code path is exercised.
+"""
+from __future__ import annotations
+import asyncio
+import collections
+import itertools
+import random
+import threading
+import time
+
+
+class Latency:
+    """Mean latency in seconds with +/- jitter (fraction of the mean)."""
+
+    def __init__(self, mean: float, jitter: float = 0.2):
+        self.mean = mean
+        self.jitter = jitter
+
+    def sample(self) -> float:
+        return max(0.0, random.uniform(self.mean * (1 - self.jitter), self.mean * (1 + self.jitter)))
+
+
+class FakeSTT:
+    def __init__(self, final_latency: Latency):
+        self.final_latency = final_latency
+
+    async def transcribe(self, text: str) -> str:
+        # Time from end of speech to the final transcript
+        await asyncio.sleep(self.final_latency.sample())
+        return text
+
+
+class FakeLLM:
+    def __init__(self, ttft: Latency, tokens_per_second: float = 80.0):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+
+    async def first_token(self, prompt: str):
+        await asyncio.sleep(self.ttft.sample())
+
+    async def stream(self, reply: str):
+        for word in reply.split():
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield word + " "
+
+
+class FakeTTS:
+    def __init__(self, ttfb: Latency):
+        self.ttfb = ttfb
+
+    async def first_audio(self, text: str):
+        await asyncio.sleep(self.ttfb.sample())
+
+
+class FakeLocalParticipant:
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+
+    async def publish_data(self, payload, reliable: bool = True, **kwargs):
+        self.packets += 1
+        self.bytes += len(payload)
+
+
+class FakeRoom:
+    def __init__(self, name: str):
+        self.name = name
+        self.local_participant = FakeLocalParticipant()
+        self._connected = True
+        self._handlers = {}
+
+    def isconnected(self) -> bool:
+        return self._connected
+
+    def on(self, event: str, callback=None):
+        if callback is None:
+            def register(fn):
+                self._handlers.setdefault(event, []).append(fn)
+                return fn
+            return register
+        self._handlers.setdefault(event, []).append(callback)
+        return callback
+
+    def off(self, event: str, callback):
+        if callback in self._handlers.get(event, []):
+            self._handlers[event].remove(callback)
+
+    async def disconnect(self):
+        self._connected = False
+        for fn in list(self._handlers.get("disconnected", [])):
+            fn()
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+        self.count = len(data) if isinstance(data, list) else None
+
+    def __iter__(self):
+        # supabase's APIResponse unpacks as (("data", ...), ("count", ...))
+        yield ("data", self.data)
+        yield ("count", self.count)
+
+
+class FakeAPIError(Exception):
+    """Like postgrest's APIError: carries the Postgres SQLSTATE as .code."""
+
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeQuery:
+    def __init__(self, db, table: str):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.columns = "*"
+        self.filters = []
+        self.payload = None
+        self.order_by = None
+        self.row_range = None
+        self.count_mode = None
+
+    def select(self, columns: str = "*", count=None):
+        self.op, self.columns, self.count_mode = "select", columns, count
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, **kwargs):
+        self.op, self.payload = "upsert", payload
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) >= value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) < value)
+        return self
+
+    def in_(self, column, values):
+        values = list(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def order(self, column, desc: bool = False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, n: int):
+        self.row_range = (0, n - 1)
+        return self
+
+    def range(self, start: int, end: int):
+        self.row_range = (start, end)
+        return self
+
+    def single(self):
+        return self
+
+    def execute(self):
+        time.sleep(self.db.latency.sample())
+        with self.db.lock:
+            return FakeResponse(self._apply())
+
+    def _match(self, row) -> bool:
+        return all(f(row) for f in self.filters)
+
+    def _project(self, row) -> dict:
+        if self.columns.strip() == "*":
+            return dict(row)
+        return {c.strip(): row.get(c.strip()) for c in self.columns.split(",")}
+
+    def _apply(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.op in ("insert", "upsert"):
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            out = []
+            for item in payload:
+                row = dict(item)
+                key = self.db.primary_keys.get(self.table, "id")
+                if key == "id":
+                    row.setdefault("id", next(self.db.ids))
+                existing = [r for r in rows if r.get(key) == row.get(key)]
+                if self.table == "appointments" and row.get("status", "booked") == "booked" and any(
+                        r.get("status") == "booked" and r.get("start_time") == row.get("start_time") for r in rows):
+                    # appointments_booked_slot_key (partial unique index)
+                    raise FakeAPIError("duplicate key value violates unique constraint", "23505")
+                if existing and self.op == "upsert":
+                    existing[0].update(row)
+                    out.append(dict(existing[0]))
+                    continue
+                rows.append(row)
+                out.append(dict(row))
+            return out
+        matched = [r for r in rows if self._match(r)]
+        if self.op == "update":
+            for r in matched:
+                r.update(self.payload)
+            return [dict(r) for r in matched]
+        if self.op == "delete":
+            self.db.tables[self.table] = [r for r in rows if not self._match(r)]
+            return [dict(r) for r in matched]
+        if self.order_by:
+            column, desc = self.order_by
+            matched.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        if self.row_range:
+            matched = matched[self.row_range[0]:self.row_range[1] + 1]
+        return [self._project(r) for r in matched]
+
+
+class FakeRPC:
+    """client.rpc(): the SQL functions from setup_db.sql, in Python."""
+
+    def __init__(self, db, name: str, params: dict):
+        self.db = db
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        time.sleep(self.db.latency.sample())
+        with self.db.lock:
+            if self.name == "appointment_counts":
+                groups = collections.Counter(
+                    (r["start_time"] >= self.params["since"], r.get("status"))
+                    for r in self.db.tables["appointments"] if r.get("user_contact") == self.params["contact"])
+                return FakeResponse([{"upcoming": upcoming, "status": status, "n": n} for (upcoming, status), n in groups.items()])
+            if self.name == "usage_totals":
+                quantity, rooms = collections.defaultdict(float), collections.defaultdict(set)
+                for r in self.db.tables.get("usage", []):
+                    if r["ended_at"] >= self.params["since"]:
+                        quantity[(r["metric"], r["detail"])] += r["quantity"]
+                        rooms[(r["metric"], r["detail"])].add(r["room"])
+                return FakeResponse([{"metric": metric, "detail": detail, "quantity": q, "sessions": len(rooms[(metric, detail)])}
+                                     for (metric, detail), q in quantity.items()])
+            raise FakeAPIError(f"function {self.name} does not exist", "42883")
+
+
+class FakeSupabase:
+    """Just enough of the supabase-py client for db.py, backed by in-memory tables."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.primary_keys = {"users": "contact_number"}
+        self.tables = {"users": [], "appointments": [], "conversations": []}
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: dict) -> FakeRPC:
+        return FakeRPC(self, name, params)
+
+    def seed(self, users: int):
+        for i in range(users):
+            self.tables["users"].append({"contact_number": f"+1555{i:06d}", "name": f"Patient {i}"})
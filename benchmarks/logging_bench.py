@@ -0,0 +1,125 @@
+"""Event-loop time spent logging per turn: print vs a plain StreamHandler vs the
+queue pipeline in logs.py.
+
+Each mode runs in a child process that logs what a turn logs (room/assistant
+lines, an LLM turn line with a contact number, a few high-rate DEBUG events) while
+the parent drains the child's stdout slowly, like a log collector that falls
+behind. Only the time the logging calls hold the event loop is counted.
+
+    python -m benchmarks.logging_bench
+    python -m benchmarks.logging_bench --turns 5000 --reader-delay-ms 5 --debug-events 10
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.conversation import RESULTS_DIR, percentile
+
+MODES = ("print", "direct", "queue")
+
+
+def _setup(mode: str):
+    if mode == "direct":
+        # What logging.basicConfig gives: format and write on the calling thread
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        app = logging.getLogger("voice-agent")
+        app.handlers = [handler]
+        app.propagate = False
+        app.setLevel(logging.DEBUG)
+    elif mode == "queue":
+        import logs
+        logs.setup_logging(level="DEBUG", stream=sys.stdout)
+
+
+async def _turns(mode: str, turns: int, debug_events: int) -> list:
+    logger = logging.getLogger("voice-agent.bench")
+    per_turn = []
+    for turn in range(turns):
+        started = time.perf_counter()
+        if mode == "print":
+            print(f"DEBUG: Received data packet: 'encoding:json' from user_{turn}")
+            for i in range(debug_events):
+                print(f"DEBUG: LLM route: fast (short, confidence=0.{i})")
+            print(f"LLM turn: contact=5551234{turn % 1000:03d} prompt_tokens=812 completion_tokens=41 ttft=412ms")
+            print("Assistant Speaking")
+        else:
+            logger.debug(f"Received data packet: 'encoding:json' from user_{turn}")
+            for i in range(debug_events):
+                logger.debug(f"LLM route: fast (short, confidence=0.{i})")
+            logger.info(f"LLM turn: contact=5551234{turn % 1000:03d} prompt_tokens=812 completion_tokens=41 ttft=412ms")
+            logger.info("Assistant Speaking")
+        per_turn.append(time.perf_counter() - started)
+        await asyncio.sleep(0)
+    return per_turn
+
+
+def child(mode: str, turns: int, debug_events: int):
+    _setup(mode)
+    per_turn = asyncio.run(_turns(mode, turns, debug_events))
+    us = lambda seconds: round(seconds * 1e6, 1)
+    result = {
+        "mode": mode,
+        "turns": turns,
+        "loop_us_per_turn_mean": us(sum(per_turn) / len(per_turn)),
+        "loop_us_per_turn_p99": us(percentile(per_turn, 99)),
+        "loop_us_per_turn_max": us(max(per_turn)),
+    }
+    sys.stderr.write(json.dumps(result) + "\n")
+
+
+def run_mode(mode: str, args) -> dict:
+    cmd = [sys.executable, "-m", "benchmarks.logging_bench", "--child", mode,
+           "--turns", str(args.turns), "--debug-events", str(args.debug_events)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen(cmd, cwd=root, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    lines = 0
+    started = time.perf_counter()
+    # Slow consumer: the child's pipe buffer fills and writers on its side block
+    while chunk := proc.stdout.read1(4096):
+        lines += chunk.count(b"\n")
+        time.sleep(args.reader_delay_ms / 1000)
+    proc.wait()
+    stderr = proc.stderr.read().decode()
+    if proc.returncode != 0:
+        raise RuntimeError(f"{mode} run failed:\n{stderr}")
+    result = json.loads(stderr.strip().splitlines()[-1])
+    result["lines_written"] = lines
+    result["wall_s"] = round(time.perf_counter() - started, 2)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--debug-events", type=int, default=5, help="high-rate DEBUG events per turn")
+    parser.add_argument("--reader-delay-ms", type=float, default=2.0, help="pause between 4KB reads of the child's stdout")
+    parser.add_argument("--name", default=None, help="results file name (default: timestamp)")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args.child, args.turns, args.debug_events)
+        return
+
+    results = [run_mode(mode, args) for mode in args.modes.split(",")]
+    print(f"{'mode':<8}{'mean us/turn':>14}{'p99 us/turn':>14}{'max us/turn':>14}{'lines':>9}")
+    for r in results:
+        print(f"{r['mode']:<8}{r['loop_us_per_turn_mean']:>14}{r['loop_us_per_turn_p99']:>14}"
+              f"{r['loop_us_per_turn_max']:>14}{r['lines_written']:>9}")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"logging-{args.name or time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
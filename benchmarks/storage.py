@@ -0,0 +1,88 @@
+"""Per-operation latency of each configured storage backend (bypasses db.py's caches).
+
+    python -m benchmarks.storage                      # sqlite only
+    python -m benchmarks.storage --backends sqlite,postgres,supabase --iterations 200
+
+postgres needs DATABASE_URL and supabase needs SUPABASE_URL/SUPABASE_KEY. Rows are
+written under throwaway contact numbers and cleaned up where the schema allows.
+--history N gives the contact N past appointments first, to check that history
+reads stay flat as a patient's history grows.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import datetime
+import os
+import tempfile
+import time
+import uuid
+
+import storage
+from benchmarks.conversation import percentile
+
+
+async def bench_backend(backend, iterations: int, history: int = 0) -> dict:
+    contact = f"+1999{uuid.uuid4().int % 10**7:07d}"
+    # Far-future slots, a random day per run, so runs never collide on the unique index
+    base = datetime.datetime(2100, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(days=uuid.uuid4().int % 36500)
+    slot = lambda i: (base + datetime.timedelta(minutes=i)).isoformat()
+    await backend.create_user(contact, "Benchmark User")
+    if history:
+        past = base - datetime.timedelta(days=36500)
+        await backend.insert_many("appointments", [
+            {"user_contact": contact, "start_time": (past + datetime.timedelta(hours=i)).isoformat(), "status": "completed"}
+            for i in range(history)])
+    now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0).isoformat()
+
+    ops = {
+        "get_user": lambda i: backend.get_user(contact),
+        "get_user_unknown": lambda i: backend.get_user("+10000000000"),
+        "create_appointment": lambda i: backend.create_appointment(contact, slot(i), "booked"),
+        "get_appointments": lambda i: backend.get_appointments(contact, now, "past", 0, 3),
+        "count_appointments": lambda i: backend.count_appointments(contact, now),
+        "check_slot_availability": lambda i: backend.check_slot_availability(slot(i)),
+        "get_booked_times": lambda i: backend.get_booked_times(base.isoformat()),
+        "cancel_appointment": lambda i: backend.cancel_appointment(contact, slot(i)),
+        "save_conversation": lambda i: backend.save_conversation(contact, "benchmark", datetime.datetime.now().isoformat()),
+    }
+    results = {}
+    for name, op in ops.items():
+        timings = []
+        for i in range(iterations):
+            started = time.perf_counter()
+            await op(i)
+            timings.append(time.perf_counter() - started)
+        results[name] = {
+            "p50_ms": round(percentile(timings, 50) * 1000, 3),
+            "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        }
+    return results
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="sqlite")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--history", type=int, default=0, help="past appointments of the benchmark contact")
+    args = parser.parse_args(argv)
+
+    for name in args.backends.split(","):
+        if name == "sqlite":
+            backend = storage.SQLiteBackend(os.path.join(tempfile.mkdtemp(), "bench.db"))
+        else:
+            backend = storage.create_backend(name)
+        if backend is None:
+            print(f"{name}: not configured, skipped")
+            continue
+        try:
+            results = await bench_backend(backend, args.iterations, args.history)
+        finally:
+            await backend.aclose()
+        print(f"\n{name} ({args.iterations} iterations, {args.history} history rows)")
+        print(f"{'operation':<26}{'p50 ms':>10}{'p95 ms':>10}")
+        for op, r in results.items():
+            print(f"{op:<26}{r['p50_ms']:>10}{r['p95_ms']:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
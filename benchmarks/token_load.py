@@ -0,0 +1,98 @@
+"""Load test for the API's /token endpoint: requests/second and latency percentiles
+under concurrency.
+
+    python server.py &                       # or the docker-compose api service
+    python -m benchmarks.token_load --concurrency 50 --requests 5000
+    python -m benchmarks.token_load --url http://localhost:8000/token --duration 30
+
+With ROOM_POOL_SIZE > 0 the first requests are served from the warm room pool and
+the rest fall back to signing inline; the pool hit count is reported separately.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import aiohttp
+
+from benchmarks.conversation import RESULTS_DIR, percentile
+
+
+async def worker(session, url: str, deadline: float, remaining: list, timings: list, errors: list, rooms: set):
+    while remaining[0] > 0 and time.perf_counter() < deadline:
+        remaining[0] -= 1
+        started = time.perf_counter()
+        try:
+            async with session.get(url) as response:
+                body = await response.json()
+                if response.status != 200 or "token" not in body:
+                    errors.append(response.status)
+                    continue
+                rooms.add(body.get("room"))
+        except Exception as e:
+            errors.append(type(e).__name__)
+            continue
+        timings.append(time.perf_counter() - started)
+
+
+async def run(args) -> dict:
+    timings, errors, rooms = [], [], set()
+    remaining = [args.requests]
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # Room pool hits before the run, to report the hits of this run only
+        async with session.get(args.url.rsplit("/", 1)[0] + "/metrics") as response:
+            before = await response.text()
+        started = time.perf_counter()
+        deadline = started + args.duration if args.duration else float("inf")
+        await asyncio.gather(*(worker(session, args.url, deadline, remaining, timings, errors, rooms)
+                               for _ in range(args.concurrency)))
+        wall = time.perf_counter() - started
+        async with session.get(args.url.rsplit("/", 1)[0] + "/metrics") as response:
+            after = await response.text()
+
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "url": args.url,
+        "concurrency": args.concurrency,
+        "requests": len(timings),
+        "errors": len(errors),
+        "rps": round(len(timings) / wall, 1),
+        "p50_ms": ms(percentile(timings, 50)),
+        "p95_ms": ms(percentile(timings, 95)),
+        "p99_ms": ms(percentile(timings, 99)),
+        "max_ms": ms(max(timings, default=0.0)),
+        "unique_rooms": len(rooms),
+        "pool_hits": _pool_hits(after) - _pool_hits(before),
+    }
+
+
+def _pool_hits(metrics_text: str) -> int:
+    for line in metrics_text.splitlines():
+        if line.startswith('api_room_pool_total{result="hit"}'):
+            return int(float(line.rsplit(" ", 1)[1]))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000/token")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--duration", type=float, default=0, help="stop after this many seconds (0 = run all requests)")
+    parser.add_argument("--name", default=None, help="results file name (default: timestamp)")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"token-{args.name or time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
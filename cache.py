@@ -0,0 +1,64 @@
+from __future__ import annotations
+import collections
+import time
+
+# Returned by TTLCache.get on a miss (None is a valid cached value: "not found")
+MISSING = object()
+
+
+class TTLCache:
+    """Small size-bounded LRU cache with per-entry TTL, for use from the event loop.
+
+    None values are cached with a separate (usually shorter) negative_ttl so unknown
+    keys are not looked up again and again, but show up soon after they are created.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, negative_ttl: float = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._data = collections.OrderedDict()  # key -> (expires_at, value)
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key, default=MISSING, record: bool = True):
+        """record=False leaves the hit/miss counters alone, for callers that keep a
+        container per key and count lookups inside it themselves (record_lookup)."""
+        entry = self._data.get(key)
+        if entry is None:
+            if record:
+                self.stats["misses"] += 1
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            if record:
+                self.stats["misses"] += 1
+            return default
+        self._data.move_to_end(key)
+        if record:
+            self.stats["negative_hits" if value is None else "hits"] += 1
+        return value
+
+    def record_lookup(self, hit: bool):
+        self.stats["hits" if hit else "misses"] += 1
+
+    def set(self, key, value):
+        ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, key):
+        if self._data.pop(key, None) is not None:
+            self.stats["invalidations"] += 1
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+import logging
+import os
+
+from livekit.agents import llm
+
+logger = logging.getLogger("voice-agent.context")
+
+# Approximate prompt budget per LLM turn (tokens ~= chars / 4)
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "3000"))
+# Most recent user turns (and everything after them) always kept verbatim
+CONTEXT_KEEP_TURNS = int(os.environ.get("CONTEXT_KEEP_TURNS", "4"))
+# Tool outputs longer than this are cut down before being sent back to the LLM
+TOOL_OUTPUT_MAX_CHARS = int(os.environ.get("TOOL_OUTPUT_MAX_CHARS", "400"))
+# Per-line cap for the fallback digest of collapsed turns
+DIGEST_LINE_CHARS = 120
+
+
+def _item_text(item) -> str:
+    item_type = getattr(item, "type", "message")
+    if item_type == "function_call":
+        return f"{item.name}({item.arguments})"
+    if item_type == "function_call_output":
+        return str(item.output)
+    return getattr(item, "text_content", None) or ""
+
+
+def estimate_tokens(items) -> int:
+    return sum(len(_item_text(item)) for item in items) // 4 + 4 * len(items)
+
+
+class ContextCompactor:
+    """Bounds the prompt sent to the LLM on every turn.
+
+    Works on a copy of the chat context (the session's history is left untouched):
+    - leading system/developer messages are always kept,
+    - verbose tool outputs are truncated,
+    - if still over budget, everything before the last `keep_turns` user turns is
+      collapsed into one system message, using the RollingSummarizer's summary when it
+      already covers those turns and a short digest otherwise.
+    """
+
+    def __init__(self, summarizer=None, budget: int = CONTEXT_TOKEN_BUDGET,
+                 keep_turns: int = CONTEXT_KEEP_TURNS, tool_output_max_chars: int = TOOL_OUTPUT_MAX_CHARS):
+        self.summarizer = summarizer
+        self.budget = budget
+        self.keep_turns = keep_turns
+        self.tool_output_max_chars = tool_output_max_chars
+        self.last = {"tokens_before": 0, "tokens_after": 0, "collapsed_items": 0}
+        self.stats = {"turns": 0, "compactions": 0}
+
+    def compact(self, chat_ctx: llm.ChatContext) -> llm.ChatContext:
+        items = list(chat_ctx.items)
+        tokens_before = estimate_tokens(items)
+        self.stats["turns"] += 1
+
+        items = [self._strip_tool_output(item) for item in items]
+
+        collapsed = 0
+        if estimate_tokens(items) > self.budget:
+            head = 0
+            while head < len(items) and getattr(items[head], "role", None) in ("system", "developer"):
+                head += 1
+            user_idx = [i for i in range(head, len(items)) if getattr(items[i], "role", None) == "user"]
+            if len(user_idx) > self.keep_turns:
+                cut = user_idx[-self.keep_turns]
+                old = items[head:cut]
+                items = items[:head] + [self._collapse(old)] + items[cut:]
+                collapsed = len(old)
+                self.stats["compactions"] += 1
+
+        self.last = {"tokens_before": tokens_before, "tokens_after": estimate_tokens(items), "collapsed_items": collapsed}
+        return llm.ChatContext(items)
+
+    def _strip_tool_output(self, item):
+        if getattr(item, "type", None) != "function_call_output":
+            return item
+        output = str(item.output)
+        if len(output) <= self.tool_output_max_chars:
+            return item
+        return item.model_copy(update={"output": output[:self.tool_output_max_chars] + "... (truncated)"})
+
+    def _collapse(self, old_items):
+        turns = [item for item in old_items if getattr(item, "role", None) in ("user", "assistant")]
+        summarizer = self.summarizer
+        if summarizer and summarizer.summary and summarizer.folded >= len(turns):
+            text = summarizer.summary
+        else:
+            lines = []
+            for item in turns:
+                content = _item_text(item)
+                if len(content) > DIGEST_LINE_CHARS:
+                    content = content[:DIGEST_LINE_CHARS] + "..."
+                lines.append(f"{item.role}: {content}")
+            text = "\n".join(lines)
+        return llm.ChatMessage(role="system", content=[f"Summary of the earlier part of this call:\n{text}"])
@@ -1,106 +1,214 @@
 import os
-from supabase import create_client, Client
+import asyncio
 import datetime
+import logging
+import time as _time
+from cache import TTLCache, MISSING
+import metrics
+import storage
+import usage
 
-url: str = os.environ.get("SUPABASE_URL", "")
-key: str = os.environ.get("SUPABASE_KEY", "")
+logger = logging.getLogger("voice-agent.db")
 
-# Initialize client only if keys are present (lazy loading for safety)
-supabase: Client = None
+# Queries go to the backend chosen by STORAGE_BACKEND (see storage.py); this module
+# keeps the functions tools use, and adds caching, timeouts and metrics on top.
+# DB_MAX_CONCURRENCY is the max number of queries in flight per worker process; extra
+# calls queue up. DB_TIMEOUT bounds each call (seconds).
+DB_MAX_CONCURRENCY = storage.DB_MAX_CONCURRENCY
+DB_TIMEOUT = storage.DB_TIMEOUT
 
-def get_supabase_client():
-    global supabase
-    if supabase is None and url and key:
-        supabase = create_client(url, key)
-    return supabase
+# Per-process read-through caches for the lookups tools repeat within a call.
+# Unknown numbers are cached for DB_NEGATIVE_TTL so a re-ask is also local; writes
+# from this process invalidate immediately, writes from other workers show up after the TTL.
+DB_CACHE_SIZE = int(os.environ.get("DB_CACHE_SIZE", "1024"))
+DB_CACHE_TTL = float(os.environ.get("DB_CACHE_TTL", "30"))
+DB_NEGATIVE_TTL = float(os.environ.get("DB_NEGATIVE_TTL", "10"))
+
+# Appointment history is read a page at a time (start_time and status only)
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", "3"))
+
+_users = TTLCache("users", DB_CACHE_SIZE, DB_CACHE_TTL, DB_NEGATIVE_TTL)
+# contact -> {(section, since, offset, limit): rows, ("counts", since): counts}: one
+# entry per contact, so a write invalidates all of that contact's pages and counts at
+# once; hits and misses are counted per page / counts key. since is part of the keys:
+# it decides which appointments are upcoming or past, so pages and counts are only
+# reused together with the split they were read with. It is cut to the minute first,
+# otherwise every call (with a new now_timestamp) would miss
+_appointments = TTLCache("appointments", DB_CACHE_SIZE, DB_CACHE_TTL)
+
+# Initialize backend only if it is configured (lazy loading for safety).
+# One backend per process, created on first use inside the worker process so its
+# threads / connection pool belong to that process.
+_backend = None
+_backend_loaded = False
+
+def get_backend():
+    global _backend, _backend_loaded
+    if not _backend_loaded:
+        _backend = storage.create_backend()
+        _backend_loaded = True
+    return _backend
+
+def set_backend(backend):
+    """Swap the backend (tests/benchmarks); clears the caches."""
+    global _backend, _backend_loaded
+    _backend, _backend_loaded = backend, True
+    _users.clear()
+    _appointments.clear()
+
+async def _call(op: str, *args):
+    """Run a backend operation with the per-call timeout, recording its latency."""
+    started = _time.perf_counter()
+    usage.add("db_round_trips", 1, op)
+    try:
+        return await asyncio.wait_for(getattr(get_backend(), op)(*args), DB_TIMEOUT)
+    finally:
+        metrics.DB_LATENCY.observe(_time.perf_counter() - started, op=op)
+
+def cache_stats():
+    return {c.name: dict(c.stats, size=len(c)) for c in (_users, _appointments)}
 
 async def create_user(contact_number: str, name: str):
-    client = get_supabase_client()
-    if not client: return None
+    if not get_backend(): return None
     try:
-        data, count = client.table("users").upsert({"contact_number": contact_number, "name": name}).execute()
+        data = await _call("create_user", contact_number, name)
+        _users.invalidate(contact_number)
         return data
     except Exception as e:
-        print(f"Error creating user: {e}")
+        logger.error(f"Error creating user: {e}")
         return None
 
 async def get_user(contact_number: str):
-    client = get_supabase_client()
-    if not client: return None
+    cached = _users.get(contact_number)
+    if cached is not MISSING:
+        return cached
+    if not get_backend(): return None
     try:
-        # data, count = client.table("users").select("*").eq("contact_number", contact_number).single().execute()
-        # Using .execute() returns response
-        response = client.table("users").select("*").eq("contact_number", contact_number).execute()
-        if response.data:
-            return response.data[0]
-        return None
+        user = await _call("get_user", contact_number)
+        _users.set(contact_number, user) # None = negative entry
+        return user
     except Exception as e:
-        print(f"Error fetching user: {e}")
+        logger.error(f"Error fetching user: {e}")
         return None
 
 async def create_appointment(contact_number: str, time: str, status: str = "booked"):
-    client = get_supabase_client()
-    if not client: return None
+    """time is an ISO timestamp (slots.slot_timestamp). Returns the new rows, [] if the
+    slot is already booked (unique index conflict) or None on error."""
+    if not get_backend(): return None
     try:
-        data, count = client.table("appointments").insert({
-            "user_contact": contact_number,
-            "start_time": time,
-            "status": status
-        }).execute()
+        data = await _call("create_appointment", contact_number, time, status)
+        _appointments.invalidate(contact_number)
         return data
     except Exception as e:
-        print(f"Error creating appointment: {e}")
+        logger.error(f"Error creating appointment: {e}")
         return None
 
-async def get_appointments(contact_number: str):
-    client = get_supabase_client()
-    if not client: return []
+def _history_since(since: str) -> str:
+    return datetime.datetime.fromisoformat(since).replace(second=0, microsecond=0).isoformat()
+
+def _history_entry(contact_number: str) -> dict:
+    # Taken before the query, so a result read while a write invalidated the entry
+    # lands in the discarded dict rather than in the cache
+    entry = _appointments.get(contact_number, record=False)
+    if entry is MISSING:
+        entry = {}
+        _appointments.set(contact_number, entry)
+    return entry
+
+def _history_lookup(entry: dict, key):
+    value = entry.get(key, MISSING)
+    _appointments.record_lookup(value is not MISSING)
+    return value
+
+async def get_appointments(contact_number: str, since: str, section: str = "upcoming",
+                           offset: int = 0, limit: int = HISTORY_PAGE_SIZE):
+    """One page of the contact's appointments (start_time, status): "upcoming" (from
+    since, an ISO timestamp cut to the minute, on) soonest first, or "past" most recent first."""
+    since = _history_since(since)
+    entry = _history_entry(contact_number)
+    key = (section, since, offset, limit)
+    cached = _history_lookup(entry, key)
+    if cached is not MISSING:
+        return cached
+    if not get_backend(): return []
     try:
-        response = client.table("appointments").select("*").eq("user_contact", contact_number).execute()
-        return response.data
+        appointments = await _call("get_appointments", contact_number, since, section, offset, limit)
+        entry[key] = appointments
+        return appointments
     except Exception as e:
-        print(f"Error fetching appointments: {e}")
+        logger.error(f"Error fetching appointments: {e}")
         return []
 
+async def get_appointment_counts(contact_number: str, since: str):
+    """{"upcoming": {status: n}, "past": {status: n}}, or None on error."""
+    since = _history_since(since)
+    entry = _history_entry(contact_number)
+    key = ("counts", since)
+    cached = _history_lookup(entry, key)
+    if cached is not MISSING:
+        return cached
+    if not get_backend(): return None
+    try:
+        rows = await _call("count_appointments", contact_number, since)
+    except Exception as e:
+        logger.error(f"Error counting appointments: {e}")
+        return None
+    counts = {"upcoming": {}, "past": {}}
+    for row in rows:
+        counts["upcoming" if row["upcoming"] else "past"][row["status"]] = int(row["n"])
+    entry[key] = counts
+    return counts
+
 async def check_slot_availability(time: str):
-    client = get_supabase_client()
-    if not client: return False # Fail safe
+    if not get_backend(): return False # Fail safe
     try:
-        # Check if any appointment exists for this time with 'booked' status
-        response = client.table("appointments").select("*").eq("start_time", time).eq("status", "booked").execute()
-        if response.data and len(response.data) > 0:
-            return False # Slot is taken
-        return True # Slot is free
+        # Free if no appointment exists for this time with 'booked' status
+        return await _call("check_slot_availability", time)
     except Exception as e:
-        print(f"Error checking slot availability: {e}")
+        logger.error(f"Error checking slot availability: {e}")
         return False # Assume unavailable on error to prevent double booking
 
+async def get_booked_times(since: str):
+    """start_time of booked appointments from since (ISO timestamp) on, for the slot inventory."""
+    if not get_backend(): return None
+    try:
+        return await _call("get_booked_times", since)
+    except Exception as e:
+        logger.error(f"Error fetching booked slots: {e}")
+        return None
+
 async def cancel_appointment(contact_number: str, time: str):
-    client = get_supabase_client()
-    if not client: return False
+    if not get_backend(): return False
     try:
         # We can either delete or set status to cancelled. Deleting for now as per request.
-        # Check if it exists first? No, delete logic usually handles it.
-        # But let's restrict to deleting only 'booked' appointments for this user and time.
-        response = client.table("appointments").delete().eq("user_contact", contact_number).eq("start_time", time).execute()
-        # response.data usually contains the deleted rows
-        if response.data and len(response.data) > 0:
-             return True
-        return False
+        result = await _call("cancel_appointment", contact_number, time)
+        _appointments.invalidate(contact_number)
+        return result
     except Exception as e:
-        print(f"Error canceling appointment: {e}")
+        logger.error(f"Error canceling appointment: {e}")
         return False
 
 async def save_conversation(contact_number: str, summary: str):
-    client = get_supabase_client()
-    if not client: return None
+    # Non-critical: queued and written in batches by the write-behind queue
+    import writebehind
+    writebehind.get_queue().enqueue("conversations", {
+        "user_contact": contact_number,
+        "summary": summary,
+        "timestamp": datetime.datetime.now().isoformat()
+    })
+
+async def get_recent_turns(contact_number: str, exclude_room: str, limit: int):
+    """Last turns of the contact's earlier calls, newest first ([] on error)."""
+    if not get_backend(): return []
     try:
-        data, count = client.table("conversations").insert({
-            "user_contact": contact_number,
-            "summary": summary,
-            "timestamp": datetime.datetime.now().isoformat()
-        }).execute()
-        return data
+        return await _call("recent_turns", contact_number, exclude_room, limit)
     except Exception as e:
-        print(f"Error saving conversation: {e}")
-        return None
+        logger.error(f"Error reading recent turns: {e}")
+        return []
+
+async def insert_rows(table: str, rows: list):
+    """Multi-row insert used by the write-behind queue. Unlike the functions above this
+    raises on failure, so the caller can spool and retry. False if there is no backend."""
+    if not get_backend(): return False
+    await _call("insert_many", table, rows)
+    return True
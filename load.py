@@ -0,0 +1,174 @@
+"""Worker load score for job admission.
+
+Job processes report their event-loop lag and in-flight LLM/TTS streams to small
+files under METRICS_DIR/load/. The worker process combines those with CPU usage and
+its number of active jobs into one score in [0, 1] (see load_fnc); LiveKit stops
+dispatching rooms to a worker whose score is above LOAD_THRESHOLD.
+"""
+from __future__ import annotations
+import asyncio
+import contextlib
+import glob
+import json
+import logging
+import os
+import time
+
+import metrics
+
+try:
+    import psutil
+except ImportError:  # fall back to the 1-minute load average
+    psutil = None
+
+logger = logging.getLogger("voice-agent.load")
+
+# Refuse new rooms above this score
+LOAD_THRESHOLD = float(os.environ.get("LOAD_THRESHOLD", "0.75"))
+# Each signal is divided by its budget, so 1.0 means "at capacity":
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", str(4 * (os.cpu_count() or 1))))  # rooms per worker
+LOOP_LAG_BUDGET = float(os.environ.get("LOOP_LAG_BUDGET", "0.05"))  # seconds of event-loop lag in any job
+MAX_PENDING_STREAMS = int(os.environ.get("MAX_PENDING_STREAMS", str(8 * (os.cpu_count() or 1))))  # LLM+TTS streams in flight
+# How often job processes report (seconds); reports older than 3x this are ignored
+LOAD_REPORT_SECONDS = float(os.environ.get("LOAD_REPORT_SECONDS", "1"))
+
+LOAD_DIR = os.path.join(metrics.METRICS_DIR, "load")
+
+
+class LoadMonitor:
+    """Runs in a job process: samples event-loop lag and counts open LLM/TTS streams,
+    and writes them to LOAD_DIR/<pid>.json every LOAD_REPORT_SECONDS."""
+
+    def __init__(self, interval: float = LOAD_REPORT_SECONDS):
+        self.interval = interval
+        self.pending_streams = 0
+        self.loop_lag = 0.0  # worst lag seen since the last report
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    @contextlib.contextmanager
+    def stream(self):
+        """Wrap an LLM/TTS stream so it counts as pending while it runs."""
+        self.pending_streams += 1
+        try:
+            yield
+        finally:
+            self.pending_streams -= 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        tick = min(0.1, self.interval)
+        last_report = time.monotonic()
+        try:
+            while True:
+                started = time.monotonic()
+                await asyncio.sleep(tick)
+                self.loop_lag = max(self.loop_lag, time.monotonic() - started - tick)
+                if time.monotonic() - last_report >= self.interval:
+                    report = {"time": time.time(), "loop_lag": self.loop_lag, "pending_streams": self.pending_streams}
+                    self.loop_lag = 0.0
+                    last_report = time.monotonic()
+                    await loop.run_in_executor(None, _write_report, report)
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(_report_path())
+
+    async def aclose(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+
+def _report_path(pid: int = None) -> str:
+    return os.path.join(LOAD_DIR, f"{pid or os.getpid()}.json")
+
+
+def _write_report(report: dict):
+    try:
+        os.makedirs(LOAD_DIR, exist_ok=True)
+        tmp = _report_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(report, f)
+        os.replace(tmp, _report_path())
+    except Exception as e:
+        logger.warning(f"Failed to write load report: {e}")
+
+
+def read_reports(max_age: float = None):
+    max_age = max_age or 3 * LOAD_REPORT_SECONDS
+    now = time.time()
+    reports = []
+    for path in glob.glob(os.path.join(LOAD_DIR, "*.json")):
+        try:
+            with open(path) as f:
+                report = json.load(f)
+        except Exception:
+            continue
+        if now - report.get("time", 0) <= max_age:
+            reports.append(report)
+    return reports
+
+
+def _cpu() -> float:
+    if psutil is not None:
+        # Since the previous call (LiveKit polls load_fnc about every half second)
+        return psutil.cpu_percent() / 100
+    return os.getloadavg()[0] / (os.cpu_count() or 1)
+
+
+_reports = (0.0, [])  # (monotonic time read, read_reports())
+
+
+def _cached_reports():
+    # load_fnc runs on the worker's event loop about every half second; job processes
+    # only rewrite their reports every LOAD_REPORT_SECONDS, so read the files at most
+    # once per interval
+    global _reports
+    now = time.monotonic()
+    if now - _reports[0] >= LOAD_REPORT_SECONDS:
+        _reports = (now, read_reports())
+    return _reports[1]
+
+
+def load_signals(active_sessions: int) -> dict:
+    """Each signal normalised to its budget (1.0 = at capacity)."""
+    reports = _cached_reports()
+    return {
+        "cpu": _cpu(),
+        "sessions": active_sessions / MAX_SESSIONS,
+        "loop_lag": max((r["loop_lag"] for r in reports), default=0.0) / LOOP_LAG_BUDGET,
+        "pending_streams": sum(r["pending_streams"] for r in reports) / MAX_PENDING_STREAMS,
+    }
+
+
+_last_logged = 0.0
+
+
+def load_fnc(worker=None) -> float:
+    """WorkerOptions.load_fnc: the most saturated signal decides, so a worker that is
+    fine on CPU but lagging (or full on sessions) still stops taking rooms."""
+    global _last_logged
+    active = len(getattr(worker, "active_jobs", None) or [])
+    signals = load_signals(active)
+    score = min(1.0, max(signals.values()))
+    metrics.WORKER_LOAD.observe(score)
+    if score >= LOAD_THRESHOLD and time.monotonic() - _last_logged > 10:
+        _last_logged = time.monotonic()
+        logger.warning(f"Worker at capacity (load {score:.2f}, threshold {LOAD_THRESHOLD}): "
+                       + " ".join(f"{k}={v:.2f}" for k, v in signals.items()))
+    return score
+
+
+_monitor: LoadMonitor = None
+
+
+def get_monitor() -> LoadMonitor:
+    # One monitor per job process
+    global _monitor
+    if _monitor is None:
+        _monitor = LoadMonitor()
+    return _monitor
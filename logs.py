@@ -0,0 +1,125 @@
+"""Logging for the worker, job processes and API.
+
+Records from the "voice-agent.*" loggers are put on an in-memory queue by the calling
+thread (the event loop) and formatted, redacted and written to stdout by a background
+thread, so a slow log pipe never stalls audio. On top of that:
+- per-module levels (LOG_LEVELS="voice-agent.tools=DEBUG,livekit=WARNING"),
+- DEBUG records are sampled per call site (1 in LOG_DEBUG_SAMPLE_EVERY),
+- phone numbers are masked (last two digits kept),
+- JSON lines (LOG_FORMAT=json) or plain text, with the room name when known.
+"""
+from __future__ import annotations
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+LOG_DEBUG_SAMPLE_EVERY = int(os.environ.get("LOG_DEBUG_SAMPLE_EVERY", "10"))
+
+# 7-15 digits with optional separators, not part of a date/time or a longer token
+_PHONE_RE = re.compile(r"(?<![\w:.-])(?!\d{4}-\d{2}-\d{2})\+?\d(?:[\s().-]{0,2}\d){6,14}(?![\w:])")
+
+_room = contextvars.ContextVar("log_room", default=None)
+
+
+def bind_room(name: str):
+    """Tag records logged from this task (and tasks it creates) with the room name."""
+    _room.set(name)
+
+
+def redact(text: str) -> str:
+    def mask(m):
+        digits = re.sub(r"\D", "", m.group(0))
+        return f"***{digits[-2:]}"
+    return _PHONE_RE.sub(mask, text)
+
+
+class DebugSampler(logging.Filter):
+    """Keeps 1 in `every` DEBUG records per call site; other levels always pass."""
+
+    def __init__(self, every: int = LOG_DEBUG_SAMPLE_EVERY):
+        super().__init__()
+        self.every = max(1, every)
+        self._seen = {}
+
+    def filter(self, record) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        site = (record.name, record.lineno)
+        count = self._seen.get(site, 0)
+        self._seen[site] = count + 1
+        return count % self.every == 0
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Only merge args and attach context here, on the caller's thread; formatting,
+        # tracebacks, redaction and the write happen on the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        record.room = _room.get()
+        return record
+
+
+class _Formatter(logging.Formatter):
+    def __init__(self, fmt: str = LOG_FORMAT):
+        super().__init__()
+        self.json = fmt == "json"
+
+    def format(self, record) -> str:
+        message = redact(record.getMessage())
+        exc = redact(self.formatException(record.exc_info)) if record.exc_info else None
+        room = getattr(record, "room", None)
+        if self.json:
+            entry = {
+                "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+                "level": record.levelname,
+                "logger": record.name,
+                "msg": message,
+            }
+            if room:
+                entry["room"] = room
+            if exc:
+                entry["exc"] = exc
+            return json.dumps(entry, ensure_ascii=False)
+        room_tag = f" [{room}]" if room else ""
+        text = f"{self.formatTime(record)} {record.levelname} {record.name}{room_tag} {message}"
+        return f"{text}\n{exc}" if exc else text
+
+
+_listener = None
+_pid = None
+
+
+def setup_logging(level: str = LOG_LEVEL, levels: str = LOG_LEVELS, fmt: str = LOG_FORMAT,
+                  stream=None, sample_every: int = LOG_DEBUG_SAMPLE_EVERY):
+    """Idempotent per process (safe to call from main, prewarm and the API)."""
+    global _listener, _pid
+    if _listener is not None and _pid == os.getpid():
+        return
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(_Formatter(fmt))
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    _pid = os.getpid()
+    atexit.register(_listener.stop)
+
+    handler = _QueueHandler(records)
+    handler.addFilter(DebugSampler(sample_every))
+    app = logging.getLogger("voice-agent")
+    app.handlers = [handler]
+    app.propagate = False
+    app.setLevel(level)
+    for entry in filter(None, (e.strip() for e in levels.split(","))):
+        name, _, module_level = entry.partition("=")
+        logging.getLogger(name.strip()).setLevel(module_level.strip().upper())
@@ -1,16 +1,41 @@
 import asyncio
 import logging
+import os
 from dotenv import load_dotenv
 from livekit.agents import AutoSubscribe, JobContext, WorkerOptions, cli, WorkerType
-from agent import entrypoint
+from agent import entrypoint, prewarm
+import metrics
+import load
+import logs
 
 load_dotenv()
 
+# On SIGTERM the worker stops taking rooms and waits up to this long for active calls
+# to end before closing them (seconds; keep the orchestrator's kill timeout above it)
+DRAIN_TIMEOUT = int(os.environ.get("DRAIN_TIMEOUT", "600"))
+# Time a finishing job gets for its shutdown (summary save, write-behind flush)
+SHUTDOWN_PROCESS_TIMEOUT = float(os.environ.get("SHUTDOWN_PROCESS_TIMEOUT", "20"))
+
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO)
+    logging.basicConfig(level=logging.INFO)  # livekit and other third-party loggers
+    # Our own loggers go through a queue to a writer thread (see logs.py)
+    logs.setup_logging()
+    # Aggregated per-turn/tool/DB histograms from all job processes of this worker
+    metrics_port = int(os.environ.get("METRICS_PORT", "9100"))
+    if metrics_port:
+        metrics.serve_in_thread(metrics_port)
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm, # Loads VAD + plugin clients before a job arrives
+            num_idle_processes=int(os.environ.get("NUM_IDLE_PROCESSES", "2")), # Prewarmed procs kept ready
             worker_type=WorkerType.ROOM, # Explicitly handling Room jobs
+            # Set (with the API's AGENT_NAME) for explicit dispatch into pooled rooms
+            agent_name=os.environ.get("AGENT_NAME", ""),
+            # Stop taking rooms when CPU, loop lag, sessions or open streams near capacity
+            load_fnc=load.load_fnc,
+            load_threshold=load.LOAD_THRESHOLD,
+            drain_timeout=DRAIN_TIMEOUT,
+            shutdown_process_timeout=SHUTDOWN_PROCESS_TIMEOUT,
         )
     )
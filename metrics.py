@@ -0,0 +1,298 @@
+from __future__ import annotations
+import asyncio
+import bisect
+import glob
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("voice-agent.metrics")
+
+# Job processes write their metrics here; the worker/API /metrics endpoints merge them.
+# docker-compose mounts the same directory into both containers.
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics"))
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "10"))
+# Snapshots of processes that stopped writing are dropped after this long
+METRICS_RETENTION_SECONDS = float(os.environ.get("METRICS_RETENTION_SECONDS", str(24 * 3600)))
+
+# Scrapers of either /metrics endpoint must send "Authorization: Bearer <token>";
+# empty means only clients on the same host (loopback) are answered
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+
+def _label_key(labels: dict) -> str:
+    return ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.series = {}  # label key -> {"buckets": [...], "sum": float, "count": int}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            series["buckets"][i] += 1  # non-cumulative here, made cumulative on render
+        series["sum"] += value
+        series["count"] += 1
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.series = {}  # label key -> value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        self.series[key] = self.series.get(key, 0) + amount
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        if name not in self.metrics:
+            self.metrics[name] = Histogram(name, help, buckets)
+        return self.metrics[name]
+
+    def counter(self, name: str, help: str) -> Counter:
+        if name not in self.metrics:
+            self.metrics[name] = Counter(name, help)
+        return self.metrics[name]
+
+    def snapshot(self) -> dict:
+        out = {}
+        for name, m in self.metrics.items():
+            if isinstance(m, Histogram):
+                out[name] = {"type": "histogram", "help": m.help, "buckets": list(m.buckets),
+                             "series": {k: dict(v, buckets=list(v["buckets"])) for k, v in m.series.items()}}
+            else:
+                out[name] = {"type": "counter", "help": m.help, "series": dict(m.series)}
+        return out
+
+
+REGISTRY = Registry()
+
+TURN_LATENCY = REGISTRY.histogram("voice_turn_latency_seconds", "End of user speech to agent playback start")
+STAGE_LATENCY = REGISTRY.histogram("voice_stage_seconds", "Per-stage latency within a turn")
+TOOL_LATENCY = REGISTRY.histogram("voice_tool_seconds", "Function tool duration")
+DB_LATENCY = REGISTRY.histogram("db_query_seconds", "Database call duration")
+HTTP_LATENCY = REGISTRY.histogram("http_request_seconds", "API request duration")
+ROOM_POOL = REGISTRY.counter("api_room_pool_total", "/token requests served from the room pool (hit) or a new room (miss)")
+TURNS = REGISTRY.counter("voice_turns_total", "Completed agent turns")
+LLM_ROUTES = REGISTRY.counter("voice_llm_route_total", "LLM routing decisions")
+LLM_FALLBACKS = REGISTRY.counter("voice_llm_fallback_total", "Fast-route LLM calls retried on the full model")
+LLM_ROUTE_LATENCY = REGISTRY.histogram("voice_llm_route_seconds", "LLM time to first chunk / total, per route")
+AVATAR_TTFF = REGISTRY.histogram("voice_avatar_ttff_seconds", "init_avatar request to avatar video track published")
+AVATAR_POOL = REGISTRY.counter("voice_avatar_pool_total", "init_avatar requests served by a pre-started avatar (hit) or a cold start (miss)")
+WORKER_LOAD = REGISTRY.histogram("voice_worker_load", "Worker load score reported to LiveKit (0-1)",
+                                 buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.9, 1.0))
+SESSION_TASKS = REGISTRY.histogram("voice_session_tasks", "Background tasks per session: peak live, and still running (cancelled) at close",
+                                   buckets=(0, 1, 2, 4, 8, 16, 32, 64))
+SESSION_MEMORY = REGISTRY.histogram("voice_session_rss_growth_mb", "Job process RSS growth over a session (MB)",
+                                    buckets=(1, 5, 10, 25, 50, 100, 250, 500))
+
+
+def merge(snapshots) -> dict:
+    merged = {}
+    for snap in snapshots:
+        for name, m in snap.items():
+            target = merged.setdefault(name, {"type": m["type"], "help": m["help"], "buckets": m.get("buckets"), "series": {}})
+            for key, value in m["series"].items():
+                if m["type"] == "counter":
+                    target["series"][key] = target["series"].get(key, 0) + value
+                    continue
+                if m["buckets"] != target["buckets"]:
+                    continue
+                series = target["series"].setdefault(key, {"buckets": [0] * len(m["buckets"]), "sum": 0.0, "count": 0})
+                series["buckets"] = [a + b for a, b in zip(series["buckets"], value["buckets"])]
+                series["sum"] += value["sum"]
+                series["count"] += value["count"]
+    return merged
+
+
+def render(snapshot: dict) -> str:
+    """Prometheus text exposition format."""
+    lines = []
+    for name, m in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {m['help']}")
+        lines.append(f"# TYPE {name} {m['type']}")
+        for key, value in sorted(m["series"].items()):
+            sep = "," if key else ""
+            if m["type"] == "counter":
+                lines.append(f"{name}{{{key}}} {value}" if key else f"{name} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(m["buckets"], value["buckets"]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{key}{sep}le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{key}{sep}le="+Inf"}} {value["count"]}')
+            lines.append(f"{name}_sum{{{key}}} {value['sum']}" if key else f"{name}_sum {value['sum']}")
+            lines.append(f"{name}_count{{{key}}} {value['count']}" if key else f"{name}_count {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def _snapshot_path(pid: int = None) -> str:
+    return os.path.join(METRICS_DIR, f"{pid or os.getpid()}.json")
+
+
+def write_snapshot():
+    """Persist this process's metrics (blocking file IO; call from an executor)."""
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        tmp = _snapshot_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(REGISTRY.snapshot(), f)
+        os.replace(tmp, _snapshot_path())
+    except Exception as e:
+        logger.warning(f"Failed to write metrics snapshot: {e}")
+
+
+def read_snapshots():
+    snapshots = []
+    now = time.time()
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            if now - os.path.getmtime(path) > METRICS_RETENTION_SECONDS:
+                os.remove(path)
+                continue
+            if path == _snapshot_path():
+                continue  # this process is added live below
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except Exception:
+            continue
+    return snapshots
+
+
+def render_all() -> str:
+    """All processes' metrics (snapshots on disk + this process live)."""
+    return render(merge(read_snapshots() + [REGISTRY.snapshot()]))
+
+
+async def snapshot_loop(interval: float = METRICS_FLUSH_SECONDS):
+    """Periodically persist this process's metrics; final write on cancellation."""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            await loop.run_in_executor(None, write_snapshot)
+    finally:
+        write_snapshot()
+
+
+def scrape_allowed(client_host: str, authorization: str) -> bool:
+    if METRICS_TOKEN:
+        return hmac.compare_digest((authorization or "").encode(), f"Bearer {METRICS_TOKEN}".encode())
+    return client_host in ("127.0.0.1", "::1")
+
+
+def serve_in_thread(port: int):
+    """Expose /metrics from a daemon thread (keeps the worker's event loop out of it)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            if not scrape_allowed(self.client_address[0], self.headers.get("Authorization")):
+                self.send_response(403)
+                self.end_headers()
+                return
+            body = render_all().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Metrics endpoint on :{port}/metrics")
+    return server
+
+
+class TurnTracer:
+    """Per-session timeline of each turn, fed by AgentSession events and tool hooks.
+
+    A turn starts when the user stops speaking and ends when the agent starts playing
+    audio. Stage latencies reported by the framework (end of utterance, LLM time to
+    first token, TTS first byte) go to STAGE_LATENCY; the first LLM token and first
+    TTS frame are marked by ClinicAgent when they come out of the stream (the
+    framework only reports them once the stream has finished). Recording is a
+    perf_counter call and a list append, so it stays on in production.
+    """
+
+    def __init__(self):
+        self._turn_started = None
+        self._timeline = []
+        self._tools = {}  # (name, task) -> start; each tool call runs in its own task
+
+    def attach(self, session):
+        session.on("user_state_changed", self._on_user_state)
+        session.on("user_input_transcribed", self._on_transcribed)
+        session.on("agent_state_changed", self._on_agent_state)
+        session.on("metrics_collected", self._on_metrics)
+
+    def mark(self, event: str):
+        if self._turn_started is not None:
+            self._timeline.append((event, time.perf_counter() - self._turn_started))
+
+    def tool_start(self, name: str):
+        # Keyed per call: the LLM can run the same tool more than once in parallel
+        self._tools[(name, asyncio.current_task())] = time.perf_counter()
+        self.mark(f"tool_start:{name}")
+
+    def tool_end(self, name: str):
+        started = self._tools.pop((name, asyncio.current_task()), None)
+        if started is not None:
+            TOOL_LATENCY.observe(time.perf_counter() - started, tool=name)
+        self.mark(f"tool_end:{name}")
+
+    def _on_user_state(self, ev):
+        if ev.old_state == "speaking" and ev.new_state != "speaking":
+            self._turn_started = time.perf_counter()
+            self._timeline = [("speech_end", 0.0)]
+
+    def _on_transcribed(self, ev):
+        if getattr(ev, "is_final", False):
+            self.mark("stt_final")
+
+    def _on_metrics(self, ev):
+        m = ev.metrics
+        kind = getattr(m, "type", None)
+        if kind == "eou_metrics":
+            STAGE_LATENCY.observe(m.end_of_utterance_delay, stage="end_of_utterance")
+            STAGE_LATENCY.observe(m.transcription_delay, stage="stt_final")
+        elif kind == "llm_metrics" and m.ttft >= 0:
+            STAGE_LATENCY.observe(m.ttft, stage="llm_ttft")
+        elif kind == "tts_metrics" and m.ttfb >= 0:
+            STAGE_LATENCY.observe(m.ttfb, stage="tts_ttfb")
+
+    def _on_agent_state(self, ev):
+        if ev.new_state != "speaking" or self._turn_started is None:
+            return
+        latency = time.perf_counter() - self._turn_started
+        self._timeline.append(("playback_start", latency))
+        TURN_LATENCY.observe(latency)
+        TURNS.inc()
+        logger.debug("Turn timeline: " + " ".join(f"{name}=+{t * 1000:.0f}ms" for name, t in self._timeline))
+        self._turn_started = None
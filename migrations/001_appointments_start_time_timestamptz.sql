@@ -0,0 +1,33 @@
+-- 001: appointments.start_time TEXT ("10:00 AM") -> TIMESTAMPTZ, plus indexes.
+-- For databases created from the old setup_db.sql (new ones already have all of
+-- this). Run once in the Supabase SQL Editor, or: psql "$DATABASE_URL" -f <file>
+--
+-- Old rows only carry a time of day; they are dated on the day they were created.
+-- Replace 'UTC' below with the agent's CLINIC_TZ if the clinic is elsewhere.
+
+BEGIN;
+
+-- Rows whose time cannot be parsed keep their creation time and stop counting as booked
+UPDATE appointments SET status = 'unparsed'
+WHERE start_time !~* '^\s*\d{1,2}:\d{2}\s*[AP]M\s*$' AND status = 'booked';
+
+ALTER TABLE appointments ALTER COLUMN start_time TYPE TIMESTAMPTZ USING (
+    CASE WHEN start_time ~* '^\s*\d{1,2}:\d{2}\s*[AP]M\s*$'
+        THEN ((COALESCE(created_at, NOW()) AT TIME ZONE 'UTC')::date
+              + to_timestamp(upper(trim(start_time)), 'HH12:MI AM')::time) AT TIME ZONE 'UTC'
+        ELSE COALESCE(created_at, NOW())
+    END
+);
+
+-- The old schema allowed the same slot to be booked twice: keep the earliest booking
+UPDATE appointments a SET status = 'cancelled'
+WHERE a.status = 'booked' AND EXISTS (
+    SELECT 1 FROM appointments b
+    WHERE b.status = 'booked' AND b.start_time = a.start_time AND b.id < a.id
+);
+
+CREATE INDEX IF NOT EXISTS appointments_user_contact_idx ON appointments (user_contact);
+CREATE INDEX IF NOT EXISTS appointments_start_time_status_idx ON appointments (start_time, status);
+CREATE UNIQUE INDEX IF NOT EXISTS appointments_booked_slot_key ON appointments (start_time) WHERE status = 'booked';
+
+COMMIT;
@@ -0,0 +1,22 @@
+-- 002: bounded appointment history (retrieve_appointments pages + counts).
+-- For databases created before this change (new ones already have it). Run once in
+-- the Supabase SQL Editor, or: psql "$DATABASE_URL" -f <file>
+
+BEGIN;
+
+-- Pages are read per contact in start_time order: one index serves the filter and
+-- the ordering, and makes the single-column index redundant
+CREATE INDEX IF NOT EXISTS appointments_user_contact_start_time_idx ON appointments (user_contact, start_time);
+DROP INDEX IF EXISTS appointments_user_contact_idx;
+
+-- History summary for the agent (upcoming/past x status). A function because
+-- PostgREST cannot GROUP BY; called as rpc("appointment_counts").
+CREATE OR REPLACE FUNCTION appointment_counts(contact TEXT, since TIMESTAMPTZ)
+RETURNS TABLE (upcoming BOOLEAN, status TEXT, n BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT a.start_time >= since, a.status, count(*)
+    FROM appointments a WHERE a.user_contact = contact
+    GROUP BY 1, 2;
+$$;
+
+COMMIT;
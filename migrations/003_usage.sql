@@ -0,0 +1,32 @@
+-- 003: per-call usage metering (usage.py).
+-- For databases created before this change (new ones already have it). Run once in
+-- the Supabase SQL Editor, or: psql "$DATABASE_URL" -f <file>
+
+BEGIN;
+
+-- One row per session and metric (stt_seconds, llm_prompt_tokens, tts_chars,
+-- avatar_seconds, db_round_trips, ...); detail is e.g. "<model>:<route>" for LLM tokens
+CREATE TABLE IF NOT EXISTS usage (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    room TEXT NOT NULL,
+    user_contact TEXT, -- not a foreign key: callers who never registered are metered too
+    started_at TIMESTAMPTZ NOT NULL,
+    ended_at TIMESTAMPTZ NOT NULL,
+    metric TEXT NOT NULL,
+    detail TEXT NOT NULL DEFAULT '',
+    quantity DOUBLE PRECISION NOT NULL
+);
+
+-- The cost report reads a time window of sessions
+CREATE INDEX IF NOT EXISTS usage_ended_at_idx ON usage (ended_at);
+
+-- Totals for the cost report (python usage.py); called as rpc("usage_totals")
+CREATE OR REPLACE FUNCTION usage_totals(since TIMESTAMPTZ)
+RETURNS TABLE (metric TEXT, detail TEXT, quantity DOUBLE PRECISION, sessions BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT u.metric, u.detail, sum(u.quantity), count(DISTINCT u.room)
+    FROM usage u WHERE u.ended_at >= since
+    GROUP BY 1, 2;
+$$;
+
+COMMIT;
@@ -0,0 +1,23 @@
+-- 004: transcript turns stored as the call happens (transcripts.py).
+-- For databases created before this change (new ones already have it). Run once in
+-- the Supabase SQL Editor, or: psql "$DATABASE_URL" -f <file>
+
+BEGIN;
+
+-- Append-only: rows are never updated. role is u(ser) / a(ssistant) / s(ystem) / t(ool)
+CREATE TABLE IF NOT EXISTS conversation_turns (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    room TEXT NOT NULL, -- the session
+    seq INTEGER NOT NULL, -- order within the session
+    user_contact TEXT, -- NULL before the caller is identified; not a foreign key (unregistered callers)
+    role CHAR(1) NOT NULL,
+    text TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- A caller's most recent turns (prior-context digest in identify_user)
+CREATE INDEX IF NOT EXISTS conversation_turns_user_contact_created_at_idx ON conversation_turns (user_contact, created_at);
+-- One session's transcript, in order
+CREATE INDEX IF NOT EXISTS conversation_turns_room_seq_idx ON conversation_turns (room, seq);
+
+COMMIT;
@@ -0,0 +1,106 @@
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import time
+
+import db
+import slots
+from cache import MISSING
+
+logger = logging.getLogger("voice-agent.prefetch")
+
+# Prefetched data older than this is ignored and re-read
+PREFETCH_MAX_AGE = float(os.environ.get("PREFETCH_MAX_AGE", "30"))
+
+
+class Prefetcher:
+    """Speculatively loads caller context as soon as the caller is identified.
+
+    identify_user is almost always followed by retrieve_appointments or
+    book_appointment, so the first page of the caller's appointment history (with its
+    counts) and the current slot inventory are fetched concurrently in the background
+    while the LLM is still talking. Tools then read the result instead of waiting on
+    their own round trip.
+
+    stats["saved_ms"] is the DB time tools did not have to wait for.
+    """
+
+    def __init__(self, max_age: float = PREFETCH_MAX_AGE, spawn=asyncio.create_task):
+        self.max_age = max_age
+        self.spawn = spawn  # SessionSupervisor.spawn in a room
+        self._contact = None
+        self._task = None
+        self._fetched_at = 0.0
+        self.stats = {"started": 0, "hits": 0, "misses": 0, "saved_ms": 0.0}
+
+    def start(self, contact_number: str):
+        if contact_number == self._contact and self._task and not self._stale():
+            return
+        self._contact = contact_number
+        self._fetched_at = 0.0
+        self._task = self.spawn(self._run(contact_number), name="prefetch")
+        self.stats["started"] += 1
+
+    def invalidate(self, contact_number: str):
+        # Called after a write that changes what was prefetched
+        if contact_number == self._contact:
+            self._contact = None
+            self._task = None
+
+    async def history(self, contact_number: str):
+        """Prefetched (since, counts, first upcoming page) for this contact, or MISSING
+        if there is nothing usable."""
+        task = self._task
+        if task is None or contact_number != self._contact:
+            self.stats["misses"] += 1
+            return MISSING
+        wait_started = time.perf_counter()
+        try:
+            # Shielded: a tool call cancelled while waiting must not cancel the prefetch
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+            result = None  # close() cancelled the prefetch itself
+        waited = time.perf_counter() - wait_started
+        if result is None or task is not self._task or self._stale():
+            self.stats["misses"] += 1
+            return MISSING
+        history, fetch_time = result
+        self.stats["hits"] += 1
+        self.stats["saved_ms"] += max(0.0, fetch_time - waited) * 1000
+        return history
+
+    def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    def _stale(self) -> bool:
+        return bool(self._fetched_at) and time.monotonic() - self._fetched_at > self.max_age
+
+    async def _run(self, contact_number: str):
+        started = time.perf_counter()
+
+        since = slots.now_timestamp()
+
+        async def fetch_history():
+            counts, page = await asyncio.gather(
+                db.get_appointment_counts(contact_number, since),
+                db.get_appointments(contact_number, since, "upcoming"),
+            )
+            if counts is None:
+                return None
+            return (since, counts, page), time.perf_counter() - started
+
+        try:
+            history_result, _ = await asyncio.gather(
+                fetch_history(),
+                slots.get_inventory().load(),
+            )
+        except Exception as e:
+            logger.warning(f"Prefetch failed: {e}")
+            return None
+        self._fetched_at = time.monotonic()
+        return history_result  # ((since, counts, page), seconds the fetch took), or None
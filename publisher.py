@@ -0,0 +1,168 @@
+from __future__ import annotations
+import asyncio
+import collections
+import json
+import logging
+import os
+
+from livekit import rtc
+
+try:
+    import msgpack
+except ImportError:  # optional, frontend falls back to JSON
+    msgpack = None
+
+logger = logging.getLogger("voice-agent.publisher")
+
+# Events queued within this window go out as a single data packet (seconds)
+PUBLISH_WINDOW = float(os.environ.get("PUBLISH_WINDOW", "0.03"))
+# Max events waiting to be sent per room
+PUBLISH_QUEUE_SIZE = int(os.environ.get("PUBLISH_QUEUE_SIZE", "256"))
+# Keep reliable packets under LiveKit's recommended size; larger batches are split
+MAX_PACKET_BYTES = 14 * 1024
+
+ENCODINGS = ("json", "msgpack")
+
+
+class DataPublisher:
+    """One per room: queues frontend events and sends them in coalesced data packets.
+
+    - publish() never blocks. Non-critical events (progress updates) are dropped when
+      the queue is full; critical ones are never dropped: they evict the oldest
+      non-critical event, or go over max_queue if every queued event is critical.
+    - send() is for critical events from callers that can wait; it waits for queue space.
+    - The frontend can ask for msgpack by sending the data message "encoding:msgpack".
+
+    A packet holds either a single event (same shape as before) or
+    {"type": "batch", "events": [...]}.
+    """
+
+    def __init__(self, room: rtc.Room, window: float = PUBLISH_WINDOW, max_queue: int = PUBLISH_QUEUE_SIZE,
+                 spawn=asyncio.create_task):
+        self.room = room
+        self.spawn = spawn  # SessionSupervisor.spawn in a room
+        self.window = window
+        self.max_queue = max_queue
+        self.encoding = "json"
+
+        self._queue = collections.deque()  # (event, critical)
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = None
+        self._closed = False
+
+        self.stats = {"events": 0, "packets": 0, "bytes": 0, "dropped": 0}
+
+    def start(self):
+        if self._task is None:
+            self._task = self.spawn(self._run(), name="publisher")
+
+    def set_encoding(self, name: str) -> bool:
+        if name not in ENCODINGS or (name == "msgpack" and msgpack is None):
+            logger.warning(f"Unsupported data encoding requested: {name}")
+            return False
+        self.encoding = name
+        return True
+
+    def publish(self, event: dict, critical: bool = False) -> bool:
+        if self._closed:
+            return False
+        if len(self._queue) >= self.max_queue:
+            if not critical:
+                self.stats["dropped"] += 1
+                return False
+            self._evict_non_critical()  # nothing to evict: the queue grows past max_queue
+        self._enqueue(event, critical)
+        return True
+
+    async def send(self, event: dict):
+        # Backpressure for critical events: wait for the sender to catch up
+        while not self._closed and len(self._queue) >= self.max_queue:
+            self._space.clear()
+            await self._space.wait()
+        if not self._closed:
+            self._enqueue(event, True)
+
+    async def flush(self):
+        """Wait until everything queued so far has been handed to the room."""
+        if self._task is None:
+            return
+        if self._queue:
+            self._wakeup.set()
+        await self._idle.wait()
+
+    async def aclose(self):
+        if self._closed:
+            return
+        await self.flush()
+        self._closed = True
+        self._space.set()  # wake send() calls waiting for room in the queue
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        logger.info(
+            f"Data publisher closed: {self.stats['events']} events in {self.stats['packets']} packets, "
+            f"{self.stats['bytes']} bytes, {self.stats['dropped']} dropped ({self.encoding})"
+        )
+
+    def _enqueue(self, event: dict, critical: bool):
+        self._queue.append((event, critical))
+        self._idle.clear()
+        self._wakeup.set()
+
+    def _evict_non_critical(self) -> bool:
+        for i, (_, critical) in enumerate(self._queue):
+            if not critical:
+                del self._queue[i]
+                self.stats["dropped"] += 1
+                return True
+        return False
+
+    def _encode(self, payload) -> bytes:
+        if self.encoding == "msgpack":
+            return msgpack.packb(payload, use_bin_type=True)
+        return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+    def _packets(self, events: list):
+        # Greedily pack events into as few packets as possible under MAX_PACKET_BYTES
+        batch, size = [], 0
+        for event in events:
+            event_size = len(self._encode(event))
+            if batch and size + event_size > MAX_PACKET_BYTES:
+                yield batch
+                batch, size = [], 0
+            batch.append(event)
+            size += event_size
+        if batch:
+            yield batch
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Let a burst accumulate before sending
+            await asyncio.sleep(self.window)
+            self._wakeup.clear()
+
+            events = [event for event, _ in self._queue]
+            self._queue.clear()
+            self._space.set()
+
+            for batch in self._packets(events):
+                payload = batch[0] if len(batch) == 1 else {"type": "batch", "events": batch}
+                data = self._encode(payload)
+                try:
+                    await self.room.local_participant.publish_data(data, reliable=True)
+                    self.stats["packets"] += 1
+                    self.stats["bytes"] += len(data)
+                    self.stats["events"] += len(batch)
+                except Exception as e:
+                    logger.error(f"Failed to publish data: {e}")
+
+            if not self._queue:
+                self._idle.set()
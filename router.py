@@ -0,0 +1,144 @@
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import re
+import time
+
+from livekit.agents import NOT_GIVEN, APIConnectOptions
+
+import metrics
+import usage
+
+logger = logging.getLogger("voice-agent.router")
+
+# Set to 0 to send every turn to the full model
+LLM_ROUTING = os.environ.get("LLM_ROUTING", "1") != "0"
+LLM_FAST_MODEL = os.environ.get("LLM_FAST_MODEL", "gpt-4o-mini")
+# Turns scored below this go to the full model
+ROUTER_MIN_CONFIDENCE = float(os.environ.get("ROUTER_MIN_CONFIDENCE", "0.7"))
+# User turns up to this many words count as "short"
+ROUTER_FAST_MAX_WORDS = int(os.environ.get("ROUTER_FAST_MAX_WORDS", "12"))
+# Fast model gets this long to produce its first chunk before we fall back (seconds)
+ROUTER_FAST_TIMEOUT = float(os.environ.get("ROUTER_FAST_TIMEOUT", "1.5"))
+# After a fast-route failure, stay on the full model for this long (seconds)
+ROUTER_COOLDOWN = float(os.environ.get("ROUTER_COOLDOWN", "30"))
+
+_CONFIRM_RE = re.compile(r"^\W*(yes|yeah|yep|yup|no|nope|sure|ok|okay|correct|right|that's right|that works|"
+                         r"sounds good|please|please do|go ahead|confirm|perfect|great|thanks|thank you)\b", re.IGNORECASE)
+_PHONE_RE = re.compile(r"(?:\d[\s().-]*){7,}")
+_CLOCK_RE = re.compile(r"\b\d{1,2}(?::\d{2})?\s*[ap]\.?\s*m\b|\b(today|tomorrow|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b", re.IGNORECASE)
+# Things a small model tends to get wrong: open questions, multi-step changes, medical talk
+_COMPLEX_RE = re.compile(r"\b(why|how come|explain|what if|reschedule|move|change|instead|both|and also|"
+                         r"problem|pain|symptom|medication|prescription|emergency|insurance|wrong|not what|i said)\b", re.IGNORECASE)
+
+
+def _last_turn(chat_ctx):
+    """(kind, text): kind is "tool_output" when the model is answering a tool result,
+    otherwise "user" with the latest user message."""
+    for item in reversed(chat_ctx.items):
+        item_type = getattr(item, "type", "message")
+        if item_type == "function_call_output":
+            return "tool_output", str(item.output)
+        if item_type == "message" and item.role == "user":
+            return "user", getattr(item, "text_content", None) or ""
+    return "user", ""
+
+
+class ModelRouter:
+    """Picks the fast or the full model for each LLM turn from cheap signals.
+
+    - answering a tool result, confirmations ("yes", "that works"), phone numbers and
+      short slot requests are routed to the fast model,
+    - long or open-ended turns, corrections and medical/complex topics go to the full one,
+    - the fast model falls back to the full one if it errors or has not produced its
+      first chunk within ROUTER_FAST_TIMEOUT, and a failure keeps the session on the
+      full model for ROUTER_COOLDOWN seconds.
+
+    Decisions and time to first chunk / total time per route are recorded in metrics.
+    """
+
+    def __init__(self, fast, full, min_confidence: float = ROUTER_MIN_CONFIDENCE,
+                 fast_timeout: float = ROUTER_FAST_TIMEOUT, enabled: bool = LLM_ROUTING):
+        self.fast = fast
+        self.full = full
+        self.min_confidence = min_confidence
+        self.fast_timeout = fast_timeout
+        self.enabled = enabled and fast is not None
+        self.tracer = None  # metrics.TurnTracer, injected later
+        self._fast_failed_at = None
+        self.stats = {"fast": 0, "full": 0, "fallbacks": 0}
+
+    def decide(self, chat_ctx):
+        """-> (route, reason, confidence that the fast model is good enough)."""
+        if not self.enabled:
+            return "full", "disabled", 0.0
+        if self._fast_failed_at is not None and time.monotonic() - self._fast_failed_at < ROUTER_COOLDOWN:
+            return "full", "cooldown", 0.0
+
+        kind, text = _last_turn(chat_ctx)
+        words = len(text.split())
+        if kind == "tool_output":
+            reason, confidence = "tool_output", 0.9
+        elif not text or _COMPLEX_RE.search(text):
+            reason, confidence = "complex", 0.2
+        elif _CONFIRM_RE.match(text) and words <= 6:
+            reason, confidence = "confirmation", 0.9
+        elif _PHONE_RE.search(text):
+            reason, confidence = "contact_number", 0.85
+        elif _CLOCK_RE.search(text) and words <= 2 * ROUTER_FAST_MAX_WORDS:
+            reason, confidence = "slot", 0.8
+        elif words <= ROUTER_FAST_MAX_WORDS:
+            reason, confidence = "short", 0.6
+        else:
+            reason, confidence = "long", 0.3
+        return ("fast" if confidence >= self.min_confidence else "full"), reason, confidence
+
+    async def chat(self, chat_ctx, tools, model_settings=None):
+        """Same chunks as LLM.chat(), from the routed model."""
+        tool_choice = getattr(model_settings, "tool_choice", NOT_GIVEN)
+        route, reason, confidence = self.decide(chat_ctx)
+        metrics.LLM_ROUTES.inc(route=route, reason=reason)
+        self.stats[route] += 1
+        if self.tracer:
+            self.tracer.mark(f"llm_route:{route}")
+        logger.debug(f"LLM route: {route} ({reason}, confidence={confidence:.2f})")
+
+        if route == "fast":
+            yielded = False
+            try:
+                # No retries on the fast route: falling back is quicker than retrying
+                async for chunk in self._stream("fast", self.fast, chat_ctx, tools, tool_choice,
+                                                APIConnectOptions(max_retry=0), self.fast_timeout):
+                    yielded = True
+                    yield chunk
+                return
+            except Exception as e:
+                if yielded:
+                    raise  # part of the reply is already out; nothing sensible to retry
+                fallback = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                logger.warning(f"Fast LLM route failed ({fallback}: {e!r}), falling back to full model")
+                metrics.LLM_FALLBACKS.inc(reason=fallback)
+                self.stats["fallbacks"] += 1
+                self._fast_failed_at = time.monotonic()
+
+        async for chunk in self._stream("full", self.full, chat_ctx, tools, tool_choice):
+            yield chunk
+
+    async def _stream(self, route, model, chat_ctx, tools, tool_choice, conn_options=None, first_chunk_timeout=None):
+        started = time.perf_counter()
+        kwargs = {"conn_options": conn_options} if conn_options else {}
+        async with model.chat(chat_ctx=chat_ctx, tools=tools, tool_choice=tool_choice, **kwargs) as stream:
+            chunks = stream.__aiter__()
+            try:
+                first = await asyncio.wait_for(chunks.__anext__(), first_chunk_timeout)
+            except StopAsyncIteration:
+                return
+            metrics.LLM_ROUTE_LATENCY.observe(time.perf_counter() - started, route=route, stage="ttft")
+            usage.add_llm_usage(model, route, getattr(first, "usage", None))
+            yield first
+            async for chunk in chunks:
+                # Token counts arrive on the last chunk
+                usage.add_llm_usage(model, route, getattr(chunk, "usage", None))
+                yield chunk
+        metrics.LLM_ROUTE_LATENCY.observe(time.perf_counter() - started, route=route, stage="total")
@@ -1,16 +1,177 @@
+import asyncio
+import collections
+import contextlib
+import functools
+import logging
 import os
+import time
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from livekit import api
 import uuid
+import metrics
+import logs
 
 load_dotenv()
 
 LIVEKIT_API_KEY = os.getenv("LIVEKIT_API_KEY")
 LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET")
+LIVEKIT_URL = os.getenv("LIVEKIT_URL")
 
-app = FastAPI()
+# Rooms created ahead of time, each with an agent job already dispatched and waiting
+# for its caller (0 disables the pool: rooms are created when the caller joins).
+# Opt-in: every pooled room holds a running agent session, recycled each ROOM_POOL_TTL
+ROOM_POOL_SIZE = int(os.getenv("ROOM_POOL_SIZE", "0"))
+# Pooled rooms not handed out within this many seconds are deleted and replaced
+ROOM_POOL_TTL = float(os.getenv("ROOM_POOL_TTL", "300"))
+# Set (together with the worker's AGENT_NAME) to dispatch agents explicitly; empty
+# means the worker's automatic dispatch picks up every new room
+AGENT_NAME = os.getenv("AGENT_NAME", "")
+
+logger = logging.getLogger("voice-agent.server")
+
+
+def new_room_name() -> str:
+    return f"medical-clinic-{str(uuid.uuid4())[:8]}"
+
+
+@functools.lru_cache(maxsize=None)
+def _agent_dispatch():
+    # Same for every room: built once
+    return api.RoomConfiguration(agents=[api.RoomAgentDispatch(agent_name=AGENT_NAME)])
+
+
+def mint_token(room_name: str, dispatch: bool = False) -> str:
+    """Caller token for room_name. dispatch=True embeds the agent dispatch (AGENT_NAME
+    set), for rooms the pool did not already dispatch an agent to."""
+    # Create a random participant identity
+    identity = f"user_{str(uuid.uuid4())[:8]}"
+    grant = api.VideoGrants(room_join=True, room=room_name)
+    token = api.AccessToken(LIVEKIT_API_KEY, LIVEKIT_API_SECRET) \
+        .with_identity(identity) \
+        .with_name("Guest User") \
+        .with_grants(grant)
+    if dispatch and AGENT_NAME:
+        # The worker only takes explicitly dispatched rooms when AGENT_NAME is set
+        token = token.with_room_config(_agent_dispatch())
+    return token.to_jwt()
+
+
+class RoomPool:
+    """Keeps ROOM_POOL_SIZE rooms created, with their agent dispatched and the caller's
+    token already signed, so /token is a deque pop and the agent's cold start happens
+    before the caller asks for a room instead of after they join."""
+
+    def __init__(self, size: int = ROOM_POOL_SIZE, ttl: float = ROOM_POOL_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._ready = collections.deque()  # (room_name, token, created_at)
+        self._creating = 0
+        self._lkapi = None
+        self._task = None
+        self._tasks = set()  # in-flight creates/deletes (the loop only keeps weak references)
+        self._wakeup = asyncio.Event()
+        self.stats = {"hits": 0, "misses": 0, "created": 0, "expired": 0, "failures": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and bool(LIVEKIT_URL and LIVEKIT_API_KEY and LIVEKIT_API_SECRET)
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._lkapi = api.LiveKitAPI(LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+        self._task = asyncio.create_task(self._maintain())
+
+    def take(self):
+        """(room_name, token) from the pool, or None if it is empty."""
+        now = time.monotonic()
+        while self._ready:
+            room_name, token, created_at = self._ready.popleft()
+            if now - created_at < self.ttl:
+                self.stats["hits"] += 1
+                self._wakeup.set()
+                return room_name, token
+            self._expire(room_name)
+        self.stats["misses"] += 1
+        self._wakeup.set()
+        return None
+
+    def _expire(self, room_name: str):
+        self.stats["expired"] += 1
+        self._spawn(self._delete(room_name))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _delete(self, room_name: str):
+        try:
+            await self._lkapi.room.delete_room(api.DeleteRoomRequest(room=room_name))
+        except Exception as e:
+            logger.warning(f"Failed to delete pooled room {room_name}: {e}")
+
+    async def _create(self):
+        room_name = new_room_name()
+        try:
+            # Outlives the pool TTL so an unused room is removed by us, not by the server
+            await self._lkapi.room.create_room(api.CreateRoomRequest(name=room_name, empty_timeout=int(self.ttl) + 60))
+            if AGENT_NAME:
+                await self._lkapi.agent_dispatch.create_dispatch(
+                    api.CreateAgentDispatchRequest(agent_name=AGENT_NAME, room=room_name))
+            self._ready.append((room_name, mint_token(room_name), time.monotonic()))
+            self.stats["created"] += 1
+        except Exception as e:
+            self.stats["failures"] += 1
+            logger.warning(f"Failed to create pooled room: {e}")
+            await asyncio.sleep(5)  # don't hammer the server while it is unreachable
+        finally:
+            self._creating -= 1
+
+    async def _maintain(self):
+        while True:
+            now = time.monotonic()
+            while self._ready and now - self._ready[0][2] >= self.ttl:
+                self._expire(self._ready.popleft()[0])
+            missing = self.size - len(self._ready) - self._creating
+            for _ in range(max(0, missing)):
+                self._creating += 1
+                self._spawn(self._create())
+            self._wakeup.clear()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), min(self.ttl / 4, 30))
+
+    async def aclose(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        if self._tasks:
+            # Rooms still being created end up in the pool and are deleted below
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._lkapi:
+            # Rooms still in the pool would only hold idle agent jobs
+            await asyncio.gather(*(self._delete(room_name) for room_name, _, _ in self._ready))
+            self._ready.clear()
+            await self._lkapi.aclose()
+        logger.info(f"Room pool stats: {self.stats}")
+
+
+room_pool = RoomPool()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    logs.setup_logging()
+    room_pool.start()
+    yield
+    await room_pool.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,19 +181,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class LatencyMiddleware:
+    # Plain ASGI middleware: @app.middleware("http") adds a task and a response stream
+    # copy per request, a large share of a cheap endpoint like /token
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Label by route template (set on the scope by the router): raw paths from
+            # scanners and typos would add a series each
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "other"
+            metrics.HTTP_LATENCY.observe(time.perf_counter() - started, path=path)
+
+app.add_middleware(LatencyMiddleware)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(request: Request):
+    # API metrics plus the latest snapshots written by agent job processes
+    client = request.client.host if request.client else None
+    if not metrics.scrape_allowed(client, request.headers.get("authorization")):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return metrics.render_all()
+
 @app.get("/token")
 async def get_token():
-    # Create a random participant identity
-    identity = f"user_{str(uuid.uuid4())[:8]}"
-    name = "Guest User"
-
-    room_name = f"medical-clinic-{str(uuid.uuid4())[:8]}"
-    grant = api.VideoGrants(room_join=True, room=room_name)
-    token = api.AccessToken(LIVEKIT_API_KEY, LIVEKIT_API_SECRET) \
-        .with_identity(identity) \
-        .with_name(name) \
-        .with_grants(grant)
-    return {"token": token.to_jwt(), "url": os.getenv("LIVEKIT_URL")}
+    pooled = room_pool.take() if room_pool.enabled else None
+    if pooled:
+        metrics.ROOM_POOL.inc(result="hit")
+        room_name, token = pooled
+    else:
+        if room_pool.enabled:
+            metrics.ROOM_POOL.inc(result="miss")
+        room_name = new_room_name()
+        token = mint_token(room_name, dispatch=True)
+    return {"token": token, "url": LIVEKIT_URL, "room": room_name}
 
 
 if __name__ == "__main__":
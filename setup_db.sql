@@ -13,11 +13,29 @@ CREATE TABLE IF NOT EXISTS users (
 CREATE TABLE IF NOT EXISTS appointments (
     id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
     user_contact TEXT REFERENCES users(contact_number),
-    start_time TEXT NOT NULL, -- Storing as string for simplicity like "10:00 AM"
+    start_time TIMESTAMPTZ NOT NULL, -- slot start, written by the agent in UTC
     status TEXT DEFAULT 'booked',
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Appointment history pages (ordered by start_time) and counts per contact
+CREATE INDEX IF NOT EXISTS appointments_user_contact_start_time_idx ON appointments (user_contact, start_time);
+-- Availability checks and the slot inventory's range scan
+CREATE INDEX IF NOT EXISTS appointments_start_time_status_idx ON appointments (start_time, status);
+-- At most one booked appointment per slot: booking is a single insert that either
+-- wins or conflicts (ON CONFLICT ... DO NOTHING / unique violation = slot taken)
+CREATE UNIQUE INDEX IF NOT EXISTS appointments_booked_slot_key ON appointments (start_time) WHERE status = 'booked';
+
+-- History summary for the agent (upcoming/past x status). A function because
+-- PostgREST cannot GROUP BY; called as rpc("appointment_counts").
+CREATE OR REPLACE FUNCTION appointment_counts(contact TEXT, since TIMESTAMPTZ)
+RETURNS TABLE (upcoming BOOLEAN, status TEXT, n BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT a.start_time >= since, a.status, count(*)
+    FROM appointments a WHERE a.user_contact = contact
+    GROUP BY 1, 2;
+$$;
+
 -- 3. Conversations Table (for summaries)
 CREATE TABLE IF NOT EXISTS conversations (
     id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
@@ -26,6 +44,49 @@ CREATE TABLE IF NOT EXISTS conversations (
     timestamp TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- 4. Usage Table (per-call metering, see usage.py)
+-- One row per session and metric (stt_seconds, llm_prompt_tokens, tts_chars,
+-- avatar_seconds, db_round_trips, ...); detail is e.g. "<model>:<route>" for LLM tokens
+CREATE TABLE IF NOT EXISTS usage (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    room TEXT NOT NULL,
+    user_contact TEXT, -- not a foreign key: callers who never registered are metered too
+    started_at TIMESTAMPTZ NOT NULL,
+    ended_at TIMESTAMPTZ NOT NULL,
+    metric TEXT NOT NULL,
+    detail TEXT NOT NULL DEFAULT '',
+    quantity DOUBLE PRECISION NOT NULL
+);
+
+-- The cost report reads a time window of sessions
+CREATE INDEX IF NOT EXISTS usage_ended_at_idx ON usage (ended_at);
+
+-- Totals for the cost report (python usage.py); called as rpc("usage_totals")
+CREATE OR REPLACE FUNCTION usage_totals(since TIMESTAMPTZ)
+RETURNS TABLE (metric TEXT, detail TEXT, quantity DOUBLE PRECISION, sessions BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT u.metric, u.detail, sum(u.quantity), count(DISTINCT u.room)
+    FROM usage u WHERE u.ended_at >= since
+    GROUP BY 1, 2;
+$$;
+
+-- 5. Conversation Turns (transcript lines, appended during the call; see transcripts.py)
+-- Append-only: rows are never updated. role is u(ser) / a(ssistant) / s(ystem) / t(ool)
+CREATE TABLE IF NOT EXISTS conversation_turns (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    room TEXT NOT NULL, -- the session
+    seq INTEGER NOT NULL, -- order within the session
+    user_contact TEXT, -- NULL before the caller is identified; not a foreign key (unregistered callers)
+    role CHAR(1) NOT NULL,
+    text TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- A caller's most recent turns (prior-context digest in identify_user)
+CREATE INDEX IF NOT EXISTS conversation_turns_user_contact_created_at_idx ON conversation_turns (user_contact, created_at);
+-- One session's transcript, in order
+CREATE INDEX IF NOT EXISTS conversation_turns_room_seq_idx ON conversation_turns (room, seq);
+
 -- Enable Realtime for these tables (Optional, for frontend updates)
 alter publication supabase_realtime add table appointments;
 alter publication supabase_realtime add table conversations;
@@ -40,9 +101,9 @@ ON CONFLICT (contact_number) DO NOTHING;
 
 -- Insert Appointments
 INSERT INTO appointments (user_contact, start_time, status) VALUES
-('+15550101', '10:00 AM', 'booked'),
-('+15550101', '2:00 PM', 'completed'),
-('+15550102', '4:30 PM', 'booked');
+('+15550101', '2026-01-05T10:00:00+00:00', 'booked'),
+('+15550101', '2025-12-15T14:00:00+00:00', 'completed'),
+('+15550102', '2026-01-05T16:30:00+00:00', 'booked');
 
 -- Insert Conversation History
 INSERT INTO conversations (user_contact, summary) VALUES
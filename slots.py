@@ -0,0 +1,344 @@
+from __future__ import annotations
+import asyncio
+import datetime
+import enum
+import logging
+import os
+import re
+import time as _time
+from typing import NamedTuple
+
+import db
+
+logger = logging.getLogger("voice-agent.slots")
+
+# Day is split into fixed-width buckets between opening and closing time
+SLOT_MINUTES = int(os.environ.get("SLOT_MINUTES", "30"))
+CLINIC_OPEN = os.environ.get("CLINIC_OPEN", "9:00 AM")
+CLINIC_CLOSE = os.environ.get("CLINIC_CLOSE", "5:00 PM")
+# Slots offered to callers (comma separated); must fall on bucket boundaries
+OFFERED_SLOTS = [s.strip() for s in os.environ.get("OFFERED_SLOTS", "10:00 AM,2:00 PM,4:00 PM").split(",") if s.strip()]
+# Bookings made by other worker processes show up after at most this many seconds
+SLOT_REFRESH_SECONDS = float(os.environ.get("SLOT_REFRESH_SECONDS", "60"))
+# Also ask the database before inserting a booking (one more round trip). Only needed
+# for databases without the unique index on booked slots (setup_db.sql / migration
+# 001): without it the insert cannot detect a slot another worker just booked
+BOOKING_DB_CHECK = os.environ.get("BOOKING_DB_CHECK", "0") == "1"
+
+# Spoken times are interpreted in the clinic's timezone; appointments store UTC timestamps
+CLINIC_TZ = os.environ.get("CLINIC_TZ", "UTC")
+
+DEFAULT_PROVIDER = "default"
+
+_TIME_RE = re.compile(r"^\s*(\d{1,2})(?:[:.](\d{2}))?\s*([ap])?\.?\s*m?\.?\s*$", re.IGNORECASE)
+
+
+def _minutes(text: str):
+    """'10:00 AM', '10 am', '2pm', '14:30' -> minutes since midnight (None if not a time)."""
+    m = _TIME_RE.match(text or "")
+    if not m:
+        return None
+    hour, minute, meridiem = int(m.group(1)), int(m.group(2) or 0), (m.group(3) or "").lower()
+    if minute > 59:
+        return None
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == "p" else 0)
+    elif hour > 23:
+        return None
+    return hour * 60 + minute
+
+
+_OPEN = _minutes(CLINIC_OPEN)
+_CLOSE = _minutes(CLINIC_CLOSE)
+NUM_BUCKETS = (_CLOSE - _OPEN) // SLOT_MINUTES
+
+
+def parse_time(text: str):
+    """Spoken/typed time -> bucket index, or None if it is not a bookable slot time."""
+    minutes = _minutes(text)
+    if minutes is None or minutes < _OPEN or minutes >= _CLOSE or (minutes - _OPEN) % SLOT_MINUTES:
+        return None
+    return (minutes - _OPEN) // SLOT_MINUTES
+
+
+def format_bucket(bucket: int) -> str:
+    """Bucket index -> canonical time of day ("2:00 PM")."""
+    minutes = _OPEN + bucket * SLOT_MINUTES
+    hour, minute = divmod(minutes, 60)
+    return f"{hour % 12 or 12}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+
+def _mask(buckets) -> int:
+    mask = 0
+    for bucket in buckets:
+        mask |= 1 << bucket
+    return mask
+
+
+OFFERED_MASK = _mask(b for b in (parse_time(s) for s in OFFERED_SLOTS) if b is not None)
+
+
+if CLINIC_TZ.upper() == "UTC":
+    TZ = datetime.timezone.utc
+else:
+    from zoneinfo import ZoneInfo
+    TZ = ZoneInfo(CLINIC_TZ)
+
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+
+# "10:00 AM", "10 a.m.", "2pm" or a 24h "14:30" somewhere inside a longer phrase
+_CLOCK_RE = re.compile(r"\b\d{1,2}(?:[:.]\d{2})?\s*[ap]\.?\s*m\b\.?|\b\d{1,2}[:.]\d{2}\b", re.IGNORECASE)
+_ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_FILLER_RE = re.compile(r"\b(on|at|the|this|of|for|in|o'clock)\b|[,.]", re.IGNORECASE)
+
+
+class Slot(NamedTuple):
+    day: datetime.date
+    bucket: int
+    day_given: bool = True  # False if the caller only said a time
+
+
+def now() -> datetime.datetime:
+    return datetime.datetime.now(TZ)
+
+
+def now_timestamp() -> str:
+    """Current time in the appointments.start_time format (splits upcoming from past)."""
+    return now().astimezone(datetime.timezone.utc).replace(microsecond=0).isoformat()
+
+
+def _weekday(words):
+    """Index (0 = Monday) of the first weekday named in words, or None."""
+    for word in words:
+        for index, name in enumerate(_WEEKDAYS):
+            if len(word) >= 3 and name.startswith(word.rstrip("s")):
+                return index
+    return None
+
+
+def parse_day(text: str, today: datetime.date = None):
+    """'today', 'tomorrow', 'friday', 'next monday', 'january 5th', '2026-01-05' -> date
+    (None if it is not a day we understand). Weekdays and dates without a year mean the
+    next one on or after today."""
+    today = today or now().date()
+    text = _FILLER_RE.sub(" ", (text or "").lower())
+    words = text.split()
+    if not words:
+        return None
+    if "day after tomorrow" in " ".join(words):
+        return today + datetime.timedelta(days=2)
+    if "today" in words:
+        return today
+    if "tomorrow" in words:
+        return today + datetime.timedelta(days=1)
+    m = _ISO_DATE_RE.search(text)
+    if m:
+        try:
+            return datetime.date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        except ValueError:
+            return None
+    weekday = _weekday(words)
+    if weekday is not None:
+        ahead = (weekday - today.weekday()) % 7
+        if ahead == 0 and "next" in words:
+            ahead = 7
+        return today + datetime.timedelta(days=ahead)
+    month = next((i + 1 for word in words for i, name in enumerate(_MONTHS) if word.startswith(name)), None)
+    numbers = [int(n) for n in re.findall(r"\b(\d{1,4})(?:st|nd|rd|th)?\b", text)]
+    day_of_month = next((n for n in numbers if 1 <= n <= 31), None)
+    if month is None or day_of_month is None:
+        return None
+    year = next((n for n in numbers if n > 31), None)
+    try:
+        date = datetime.date(year or today.year, month, day_of_month)
+        if year is None and date < today:
+            date = date.replace(year=today.year + 1)
+    except ValueError:
+        return None
+    return date
+
+
+def slot_start(day: datetime.date, bucket: int) -> datetime.datetime:
+    minutes = _OPEN + bucket * SLOT_MINUTES
+    return datetime.datetime.combine(day, datetime.time(minutes // 60, minutes % 60), tzinfo=TZ)
+
+
+def parse_slot(text: str, current: datetime.datetime = None):
+    """Spoken/typed day and time ("tomorrow at 2pm", "Friday 10:30 AM", "10 am") -> Slot,
+    or None if it is not a bookable slot time. A bare time means its next occurrence."""
+    current = current or now()
+    bucket = parse_time(text)
+    rest = ""
+    if bucket is None:
+        m = _CLOCK_RE.search(text or "")
+        if not m:
+            return None
+        bucket = parse_time(m.group(0))
+        rest = (text[:m.start()] + " " + text[m.end():]).strip()
+        if bucket is None:
+            return None
+    if not _FILLER_RE.sub(" ", rest).strip():
+        day = current.date()
+        if slot_start(day, bucket) <= current:
+            day += datetime.timedelta(days=1)
+        return Slot(day, bucket, day_given=False)
+    day = parse_day(rest, current.date())
+    if day is None:
+        return None
+    named_weekday = _weekday(_FILLER_RE.sub(" ", rest.lower()).split()) is not None
+    if named_weekday and day == current.date() and slot_start(day, bucket) <= current:
+        # "Friday 10 AM" said on Friday afternoon: next Friday, not a slot in the past
+        day += datetime.timedelta(days=7)
+    return Slot(day, bucket)
+
+
+def slot_timestamp(slot: Slot) -> str:
+    """Slot -> value stored in appointments.start_time (ISO 8601, UTC)."""
+    return slot_start(slot.day, slot.bucket).astimezone(datetime.timezone.utc).isoformat()
+
+
+def slot_from_timestamp(value):
+    """appointments.start_time (ISO string or datetime) -> Slot in clinic time, or None
+    for values that are not on a bucket boundary (or legacy "10:00 AM" strings)."""
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime.datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    local = value.astimezone(TZ)
+    bucket = parse_time(f"{local.hour}:{local.minute:02d}")
+    return Slot(local.date(), bucket) if bucket is not None else None
+
+
+def format_day(day: datetime.date) -> str:
+    return f"{_WEEKDAYS[day.weekday()].capitalize()}, {day.strftime('%B')} {day.day}"
+
+
+def describe(slot: Slot) -> str:
+    """Slot -> how the agent says it ("Monday, January 5 at 10:00 AM")."""
+    return f"{format_day(slot.day)} at {format_bucket(slot.bucket)}"
+
+
+def describe_timestamp(value) -> str:
+    slot = slot_from_timestamp(value)
+    return describe(slot) if slot else str(value)
+
+
+class BookingResult(enum.Enum):
+    BOOKED = "booked"
+    TAKEN = "taken"
+    FAILED = "failed"
+
+
+class SlotInventory:
+    """Per-process view of slot availability, one bitmap per (day, provider).
+
+    A set bit means the bucket is booked (or reserved by a booking in flight). Reads
+    never touch the network. Booking is reserve -> insert -> commit/rollback, so two
+    callers in this process can never be handed the same slot; the DB insert is the
+    only round trip, and the partial unique index on booked start_time makes it the
+    final word across processes (a conflict comes back as TAKEN).
+    """
+
+    def __init__(self):
+        self._booked = {}  # (day, provider) -> bitmap of committed bookings
+        self._reserved = {}  # (day, provider) -> bitmap of bookings in flight
+        self._loaded_at = 0.0
+        self._refresh_task = None
+
+    def _key(self, day, provider):
+        return (day, provider)
+
+    async def load(self):
+        # Only today onwards: one range scan on the (start_time, status) index
+        since = datetime.datetime.combine(now().date(), datetime.time(), tzinfo=TZ)
+        rows = await db.get_booked_times(since.astimezone(datetime.timezone.utc).isoformat())
+        if rows is None:
+            return  # keep the previous view if the DB is unavailable
+        booked = {}
+        for row in rows:
+            slot = slot_from_timestamp(row.get("start_time"))
+            if slot is None:
+                continue
+            key = self._key(slot.day, DEFAULT_PROVIDER)
+            booked[key] = booked.get(key, 0) | (1 << slot.bucket)
+        self._booked = booked
+        self._loaded_at = _time.monotonic()
+        logger.info(f"Slot inventory loaded: {len(rows)} booked appointments")
+
+    def refresh_if_stale(self):
+        """Kick off a background reload if the view is older than SLOT_REFRESH_SECONDS."""
+        if _time.monotonic() - self._loaded_at < SLOT_REFRESH_SECONDS:
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.load())
+
+    def _taken(self, key) -> int:
+        return self._booked.get(key, 0) | self._reserved.get(key, 0)
+
+    def available(self, day: datetime.date, provider: str = DEFAULT_PROVIDER):
+        free = OFFERED_MASK & ~self._taken(self._key(day, provider))
+        current = now()
+        return [format_bucket(b) for b in range(NUM_BUCKETS) if free >> b & 1 and slot_start(day, b) > current]
+
+    def is_free(self, bucket: int, day: datetime.date, provider: str = DEFAULT_PROVIDER) -> bool:
+        return not self._taken(self._key(day, provider)) >> bucket & 1
+
+    def reserve(self, bucket: int, day: datetime.date, provider: str = DEFAULT_PROVIDER) -> bool:
+        # No await between the check and the set: atomic on the event loop
+        key = self._key(day, provider)
+        if self._taken(key) >> bucket & 1:
+            return False
+        self._reserved[key] = self._reserved.get(key, 0) | (1 << bucket)
+        return True
+
+    def commit(self, bucket: int, day: datetime.date, provider: str = DEFAULT_PROVIDER):
+        key = self._key(day, provider)
+        self._reserved[key] = self._reserved.get(key, 0) & ~(1 << bucket)
+        self._booked[key] = self._booked.get(key, 0) | (1 << bucket)
+
+    def rollback(self, bucket: int, day: datetime.date, provider: str = DEFAULT_PROVIDER):
+        key = self._key(day, provider)
+        self._reserved[key] = self._reserved.get(key, 0) & ~(1 << bucket)
+
+    def release(self, bucket: int, day: datetime.date, provider: str = DEFAULT_PROVIDER):
+        """A booking was cancelled."""
+        key = self._key(day, provider)
+        self._booked[key] = self._booked.get(key, 0) & ~(1 << bucket)
+
+    async def book(self, contact_number: str, slot: Slot, provider: str = DEFAULT_PROVIDER) -> BookingResult:
+        if not self.reserve(slot.bucket, slot.day, provider):
+            return BookingResult.TAKEN
+        try:
+            if BOOKING_DB_CHECK and not await db.check_slot_availability(slot_timestamp(slot)):
+                # Booked according to the database (or the check failed): never double book
+                self.rollback(slot.bucket, slot.day, provider)
+                return BookingResult.TAKEN
+            result = await db.create_appointment(contact_number, slot_timestamp(slot))
+        except BaseException:
+            self.rollback(slot.bucket, slot.day, provider)
+            raise
+        if result is None:
+            self.rollback(slot.bucket, slot.day, provider)
+            return BookingResult.FAILED
+        # [] = the insert hit the unique index: another worker booked it first
+        self.commit(slot.bucket, slot.day, provider)
+        return BookingResult.BOOKED if result else BookingResult.TAKEN
+
+
+_inventory: SlotInventory = None
+
+
+def get_inventory() -> SlotInventory:
+    # One shared inventory per worker process
+    global _inventory
+    if _inventory is None:
+        _inventory = SlotInventory()
+    return _inventory
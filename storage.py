@@ -0,0 +1,430 @@
+"""Storage backends behind db.py.
+
+STORAGE_BACKEND selects one per worker process:
+- supabase (default): Supabase REST via supabase-py (SUPABASE_URL / SUPABASE_KEY)
+- postgres: direct asyncpg pool to a self-hosted Postgres (DATABASE_URL)
+- sqlite: embedded SQLite file (SQLITE_PATH), schema applied from setup_db.sql
+
+Backends raise on errors; db.py owns caching, timeouts, metrics and the
+"log and return a safe default" behaviour the tools rely on.
+"""
+from __future__ import annotations
+import asyncio
+import datetime
+import json
+import os
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "supabase")
+# Max queries in flight per worker process (executor threads / pool connections)
+DB_MAX_CONCURRENCY = int(os.environ.get("DB_MAX_CONCURRENCY", "8"))
+DB_TIMEOUT = float(os.environ.get("DB_TIMEOUT", "5"))
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "setup_db.sql")
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# SQLSTATE for unique_violation (PostgREST reports it as the error code)
+UNIQUE_VIOLATION = "23505"
+
+# What the appointment history needs per row; everything else stays in the database
+HISTORY_COLUMNS = "start_time, status"
+# Likewise for the prior-context digest of conversation_turns
+TURN_COLUMNS = "room, role, text, created_at"
+HISTORY_SECTIONS = ("upcoming", "past")
+
+
+def _check_section(section: str):
+    if section not in HISTORY_SECTIONS:
+        raise ValueError(f"Unknown history section: {section}")
+
+
+def _timestamp(value):
+    # asyncpg wants datetime objects for timestamptz parameters
+    return datetime.datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def multi_insert_sql(table: str, columns, num_rows: int, placeholder) -> str:
+    """INSERT ... VALUES (...), (...) for num_rows rows. placeholder(i) -> "$1" / "?"."""
+    for name in [table, *columns]:
+        if not _IDENTIFIER.match(name):
+            raise ValueError(f"Invalid identifier: {name}")
+    width = len(columns)
+    values = ", ".join(
+        "(" + ", ".join(placeholder(r * width + c + 1) for c in range(width)) + ")"
+        for r in range(num_rows)
+    )
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values}"
+
+
+class StorageBackend:
+    name = "base"
+
+    async def create_user(self, contact_number: str, name: str):
+        raise NotImplementedError
+
+    async def get_user(self, contact_number: str):
+        raise NotImplementedError
+
+    async def create_appointment(self, contact_number: str, time: str, status: str):
+        """time is an ISO 8601 timestamp. Returns the inserted rows, or [] if a booked
+        appointment already holds that start_time (partial unique index)."""
+        raise NotImplementedError
+
+    async def get_appointments(self, contact_number: str, since: str, section: str, offset: int, limit: int):
+        """One page of a contact's appointments, HISTORY_COLUMNS only: "upcoming"
+        (start_time >= since) soonest first, or "past" most recent first."""
+        raise NotImplementedError
+
+    async def count_appointments(self, contact_number: str, since: str):
+        """[{"upcoming": bool, "status": str, "n": int}], one row per group."""
+        raise NotImplementedError
+
+    async def check_slot_availability(self, time: str) -> bool:
+        raise NotImplementedError
+
+    async def get_booked_times(self, since: str):
+        """start_time of booked appointments starting at or after since."""
+        raise NotImplementedError
+
+    async def cancel_appointment(self, contact_number: str, time: str) -> bool:
+        raise NotImplementedError
+
+    async def save_conversation(self, contact_number: str, summary: str, timestamp: str):
+        raise NotImplementedError
+
+    async def recent_turns(self, contact_number: str, exclude_room: str, limit: int):
+        """The contact's last `limit` conversation turns (TURN_COLUMNS) from rooms other
+        than exclude_room, newest first."""
+        raise NotImplementedError
+
+    async def usage_totals(self, since: str):
+        """[{"metric", "detail", "quantity", "sessions"}]: usage rows of sessions ended at
+        or after since, summed per metric/detail (sessions = distinct rooms)."""
+        raise NotImplementedError
+
+    async def insert_many(self, table: str, rows: list):
+        """Insert rows (dicts with the same keys) into table in one statement/request."""
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class SupabaseBackend(StorageBackend):
+    """Supabase REST. The client is synchronous, so every .execute() runs on a small
+    dedicated thread pool instead of the event loop; its httpx session keeps one pool
+    of keep-alive connections shared by every room in the process."""
+
+    name = "supabase"
+
+    def __init__(self, client=None, url: str = None, key: str = None):
+        self.client = client
+        if self.client is None:
+            from supabase import create_client
+            from supabase.lib.client_options import ClientOptions
+            self.client = create_client(url, key, options=ClientOptions(postgrest_client_timeout=DB_TIMEOUT))
+        self._executor = ThreadPoolExecutor(max_workers=DB_MAX_CONCURRENCY, thread_name_prefix="db")
+
+    async def _execute(self, query):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, query.execute)
+
+    async def create_user(self, contact_number, name):
+        response = await self._execute(self.client.table("users").upsert({"contact_number": contact_number, "name": name}))
+        return response.data
+
+    async def get_user(self, contact_number):
+        response = await self._execute(self.client.table("users").select("*").eq("contact_number", contact_number))
+        return response.data[0] if response.data else None
+
+    async def create_appointment(self, contact_number, time, status):
+        try:
+            response = await self._execute(self.client.table("appointments").insert({
+                "user_contact": contact_number,
+                "start_time": time,
+                "status": status
+            }))
+        except Exception as e:
+            if getattr(e, "code", None) == UNIQUE_VIOLATION:
+                return []
+            raise
+        return response.data
+
+    async def get_appointments(self, contact_number, since, section, offset, limit):
+        _check_section(section)
+        query = self.client.table("appointments").select(HISTORY_COLUMNS).eq("user_contact", contact_number)
+        if section == "upcoming":
+            query = query.gte("start_time", since).order("start_time")
+        else:
+            query = query.lt("start_time", since).order("start_time", desc=True)
+        response = await self._execute(query.range(offset, offset + limit - 1))
+        return response.data
+
+    async def count_appointments(self, contact_number, since):
+        # PostgREST has no GROUP BY: appointment_counts() is defined in setup_db.sql
+        response = await self._execute(self.client.rpc("appointment_counts", {"contact": contact_number, "since": since}))
+        return response.data
+
+    async def check_slot_availability(self, time):
+        response = await self._execute(self.client.table("appointments").select("id").eq("start_time", time).eq("status", "booked").limit(1))
+        return not response.data
+
+    async def get_booked_times(self, since):
+        response = await self._execute(self.client.table("appointments").select("start_time").gte("start_time", since).eq("status", "booked"))
+        return response.data
+
+    async def cancel_appointment(self, contact_number, time):
+        response = await self._execute(self.client.table("appointments").delete().eq("user_contact", contact_number).eq("start_time", time))
+        return bool(response.data)
+
+    async def save_conversation(self, contact_number, summary, timestamp):
+        response = await self._execute(self.client.table("conversations").insert({
+            "user_contact": contact_number,
+            "summary": summary,
+            "timestamp": timestamp
+        }))
+        return response.data
+
+    async def recent_turns(self, contact_number, exclude_room, limit):
+        response = await self._execute(
+            self.client.table("conversation_turns").select(TURN_COLUMNS).eq("user_contact", contact_number)
+            .neq("room", exclude_room).order("created_at", desc=True).limit(limit))
+        return response.data
+
+    async def usage_totals(self, since):
+        response = await self._execute(self.client.rpc("usage_totals", {"since": since}))
+        return response.data
+
+    async def insert_many(self, table, rows):
+        await self._execute(self.client.table(table).insert(rows))
+
+    async def aclose(self):
+        self._executor.shutdown(wait=False)
+
+
+class PostgresBackend(StorageBackend):
+    """Direct asyncpg connection pool. asyncpg prepares each statement once per
+    connection and reuses it (statement cache), so repeated lookups skip parsing and
+    planning. Needs `pip install asyncpg`."""
+
+    name = "postgres"
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+
+    async def _get_pool(self):
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    import asyncpg
+                    self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=DB_MAX_CONCURRENCY, command_timeout=DB_TIMEOUT)
+        return self._pool
+
+    async def _fetch(self, sql, *args):
+        pool = await self._get_pool()
+        # Timestamps go back as ISO strings, the same shape Supabase and SQLite return
+        return [{k: v.isoformat() if isinstance(v, datetime.datetime) else v for k, v in r.items()}
+                for r in await pool.fetch(sql, *args)]
+
+    async def create_user(self, contact_number, name):
+        return await self._fetch(
+            "INSERT INTO users (contact_number, name) VALUES ($1, $2) "
+            "ON CONFLICT (contact_number) DO UPDATE SET name = EXCLUDED.name RETURNING *",
+            contact_number, name)
+
+    async def get_user(self, contact_number):
+        rows = await self._fetch("SELECT * FROM users WHERE contact_number = $1", contact_number)
+        return rows[0] if rows else None
+
+    async def create_appointment(self, contact_number, time, status):
+        return await self._fetch(
+            "INSERT INTO appointments (user_contact, start_time, status) VALUES ($1, $2, $3) "
+            "ON CONFLICT (start_time) WHERE status = 'booked' DO NOTHING RETURNING *",
+            contact_number, _timestamp(time), status)
+
+    async def get_appointments(self, contact_number, since, section, offset, limit):
+        _check_section(section)
+        where, order = (">=", "ASC") if section == "upcoming" else ("<", "DESC")
+        return await self._fetch(
+            f"SELECT {HISTORY_COLUMNS} FROM appointments WHERE user_contact = $1 AND start_time {where} $2 "
+            f"ORDER BY start_time {order} LIMIT $3 OFFSET $4",
+            contact_number, _timestamp(since), limit, offset)
+
+    async def count_appointments(self, contact_number, since):
+        return await self._fetch(
+            "SELECT start_time >= $2 AS upcoming, status, count(*) AS n FROM appointments "
+            "WHERE user_contact = $1 GROUP BY 1, 2", contact_number, _timestamp(since))
+
+    async def check_slot_availability(self, time):
+        rows = await self._fetch("SELECT 1 FROM appointments WHERE start_time = $1 AND status = 'booked' LIMIT 1", _timestamp(time))
+        return not rows
+
+    async def get_booked_times(self, since):
+        return await self._fetch("SELECT start_time FROM appointments WHERE start_time >= $1 AND status = 'booked'", _timestamp(since))
+
+    async def cancel_appointment(self, contact_number, time):
+        rows = await self._fetch("DELETE FROM appointments WHERE user_contact = $1 AND start_time = $2 RETURNING id", contact_number, _timestamp(time))
+        return bool(rows)
+
+    async def save_conversation(self, contact_number, summary, timestamp):
+        return await self._fetch(
+            "INSERT INTO conversations (user_contact, summary, timestamp) VALUES ($1, $2, $3) RETURNING *",
+            contact_number, summary, _timestamp(timestamp))
+
+    async def recent_turns(self, contact_number, exclude_room, limit):
+        return await self._fetch(
+            f"SELECT {TURN_COLUMNS} FROM conversation_turns WHERE user_contact = $1 AND room <> $2 "
+            "ORDER BY created_at DESC LIMIT $3", contact_number, exclude_room, limit)
+
+    async def usage_totals(self, since):
+        return await self._fetch(
+            "SELECT metric, detail, sum(quantity) AS quantity, count(DISTINCT room) AS sessions FROM usage "
+            "WHERE ended_at >= $1 GROUP BY metric, detail", _timestamp(since))
+
+    async def insert_many(self, table, rows):
+        # One statement, one parameter: Postgres casts the JSON fields to the column
+        # types (e.g. ISO strings -> timestamptz), whatever the batch size
+        columns = list(rows[0])
+        for name in [table, *columns]:
+            if not _IDENTIFIER.match(name):
+                raise ValueError(f"Invalid identifier: {name}")
+        cols = ", ".join(columns)
+        pool = await self._get_pool()
+        await pool.execute(
+            f"INSERT INTO {table} ({cols}) SELECT {cols} FROM json_populate_recordset(NULL::{table}, $1::json)",
+            json.dumps(rows, default=str))
+
+    async def aclose(self):
+        if self._pool is not None:
+            await self._pool.close()
+
+
+def sqlite_schema(sql: str) -> str:
+    """Translate setup_db.sql (Postgres/Supabase) to SQLite."""
+    sql = re.sub(r"(?im)^\s*alter publication.*$", "", sql)
+    sql = re.sub(r"(?is)CREATE (OR REPLACE )?FUNCTION .*?\$\$.*?\$\$;", "", sql)
+    sql = re.sub(r"(?i)BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT", sql)
+    sql = re.sub(r"(?i)\bTIMESTAMPTZ\b", "TEXT", sql)
+    sql = re.sub(r"(?i)DEFAULT NOW\(\)", "DEFAULT CURRENT_TIMESTAMP", sql)
+    return sql
+
+
+class SQLiteBackend(StorageBackend):
+    """Embedded SQLite for tests, benchmarks and edge deployments. One connection on a
+    single dedicated thread (SQLite serializes writes anyway). A new database file is
+    created from setup_db.sql, including its sample data."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        if not conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'").fetchone():
+            with open(SCHEMA_PATH) as f:
+                conn.executescript(sqlite_schema(f.read()))
+        return conn
+
+    def _run(self, sql, args):
+        if self._conn is None:
+            self._conn = self._connect()
+        with self._conn:
+            return [dict(r) for r in self._conn.execute(sql, args).fetchall()]
+
+    async def _fetch(self, sql, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run, sql, args)
+
+    async def create_user(self, contact_number, name):
+        return await self._fetch(
+            "INSERT INTO users (contact_number, name) VALUES (?, ?) "
+            "ON CONFLICT (contact_number) DO UPDATE SET name = excluded.name RETURNING *",
+            contact_number, name)
+
+    async def get_user(self, contact_number):
+        rows = await self._fetch("SELECT * FROM users WHERE contact_number = ?", contact_number)
+        return rows[0] if rows else None
+
+    async def create_appointment(self, contact_number, time, status):
+        return await self._fetch(
+            "INSERT INTO appointments (user_contact, start_time, status) VALUES (?, ?, ?) "
+            "ON CONFLICT (start_time) WHERE status = 'booked' DO NOTHING RETURNING *",
+            contact_number, time, status)
+
+    async def get_appointments(self, contact_number, since, section, offset, limit):
+        _check_section(section)
+        where, order = (">=", "ASC") if section == "upcoming" else ("<", "DESC")
+        return await self._fetch(
+            f"SELECT {HISTORY_COLUMNS} FROM appointments WHERE user_contact = ? AND start_time {where} ? "
+            f"ORDER BY start_time {order} LIMIT ? OFFSET ?",
+            contact_number, since, limit, offset)
+
+    async def count_appointments(self, contact_number, since):
+        rows = await self._fetch(
+            "SELECT start_time >= ? AS upcoming, status, count(*) AS n FROM appointments "
+            "WHERE user_contact = ? GROUP BY 1, 2", since, contact_number)
+        return [dict(r, upcoming=bool(r["upcoming"])) for r in rows]
+
+    async def check_slot_availability(self, time):
+        rows = await self._fetch("SELECT 1 FROM appointments WHERE start_time = ? AND status = 'booked' LIMIT 1", time)
+        return not rows
+
+    async def get_booked_times(self, since):
+        return await self._fetch("SELECT start_time FROM appointments WHERE start_time >= ? AND status = 'booked'", since)
+
+    async def cancel_appointment(self, contact_number, time):
+        rows = await self._fetch("DELETE FROM appointments WHERE user_contact = ? AND start_time = ? RETURNING id", contact_number, time)
+        return bool(rows)
+
+    async def save_conversation(self, contact_number, summary, timestamp):
+        return await self._fetch(
+            "INSERT INTO conversations (user_contact, summary, timestamp) VALUES (?, ?, ?) RETURNING *",
+            contact_number, summary, timestamp)
+
+    async def recent_turns(self, contact_number, exclude_room, limit):
+        return await self._fetch(
+            f"SELECT {TURN_COLUMNS} FROM conversation_turns WHERE user_contact = ? AND room <> ? "
+            "ORDER BY created_at DESC LIMIT ?", contact_number, exclude_room, limit)
+
+    async def usage_totals(self, since):
+        return await self._fetch(
+            "SELECT metric, detail, sum(quantity) AS quantity, count(DISTINCT room) AS sessions FROM usage "
+            "WHERE ended_at >= ? GROUP BY metric, detail", since)
+
+    async def insert_many(self, table, rows):
+        columns = list(rows[0])
+        sql = multi_insert_sql(table, columns, len(rows), lambda i: "?")
+        await self._fetch(sql, *[row.get(c) for row in rows for c in columns])
+
+    async def aclose(self):
+        def close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await asyncio.get_running_loop().run_in_executor(self._executor, close)
+        self._executor.shutdown(wait=False)
+
+
+def create_backend(name: str = STORAGE_BACKEND):
+    """Backend from configuration, or None if it is not configured (e.g. no Supabase keys)."""
+    if name == "supabase":
+        url = os.environ.get("SUPABASE_URL", "")
+        key = os.environ.get("SUPABASE_KEY", "")
+        return SupabaseBackend(url=url, key=key) if url and key else None
+    if name == "postgres":
+        dsn = os.environ.get("DATABASE_URL", "")
+        return PostgresBackend(dsn) if dsn else None
+    if name == "sqlite":
+        return SQLiteBackend(os.environ.get("SQLITE_PATH", "clinic.db"))
+    raise ValueError(f"Unknown STORAGE_BACKEND: {name}")
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import asyncio
+import logging
+import os
+
+from livekit.agents import llm
+
+import usage
+
+logger = logging.getLogger("voice-agent.summarizer")
+
+# Fold new turns into the running summary once this many have accumulated
+SUMMARY_BATCH_TURNS = int(os.environ.get("SUMMARY_BATCH_TURNS", "6"))
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a phone call between a clinic assistant and a caller. "
+    "Given the current summary and the newest turns, return the updated summary in 3-4 sentences. "
+    "Include any appointments booked or cancelled and key information collected."
+)
+
+
+def chunk_text(chunk) -> str:
+    """Text content of a streamed ChatChunk, across livekit-agents versions."""
+    # LiveKit Agents ChatChunk (v0.8+) uses .delta
+    delta = getattr(chunk, "delta", None)
+    if delta is None and getattr(chunk, "choices", None):
+        # Fallback for other versions
+        delta = chunk.choices[0].delta
+    if delta is not None:
+        return getattr(delta, "content", None) or ""
+    return getattr(chunk, "content", None) or ""
+
+
+async def complete(model: llm.LLM, system: str, user: str) -> str:
+    """One-shot, non-tool LLM call; returns the full response text."""
+    prompt_ctx = llm.ChatContext()
+    prompt_ctx.add_message(role="system", content=system)
+    prompt_ctx.add_message(role="user", content=user)
+    parts = []
+    async with model.chat(chat_ctx=prompt_ctx) as stream:
+        async for chunk in stream:
+            usage.add_llm_usage(model, "summary", getattr(chunk, "usage", None))
+            text = chunk_text(chunk)
+            if text:
+                parts.append(text)
+    return "".join(parts)
+
+
+class RollingSummarizer:
+    """Keeps a compact running summary of the call, updated in the background.
+
+    Every SUMMARY_BATCH_TURNS committed turns, the current summary plus the new turns
+    are folded into a new summary, so each LLM call sees a bounded prompt no matter
+    how long the call runs. finalize() only has to fold in the last few turns.
+    """
+
+    def __init__(self, model: llm.LLM, batch_turns: int = SUMMARY_BATCH_TURNS, spawn=asyncio.create_task):
+        self.model = model
+        self.spawn = spawn  # SessionSupervisor.spawn in a room
+        self.batch_turns = batch_turns
+        self.summary = ""
+        self.turns = 0
+        self.folded = 0  # turns already covered by self.summary
+        self._pending = []  # "role: text" lines not yet in the summary
+        self._task = None
+        self._session = None
+
+    def attach(self, session):
+        self._session = session
+        session.on("conversation_item_added", self._on_item_added)
+
+    def detach(self):
+        if self._session:
+            self._session.off("conversation_item_added", self._on_item_added)
+            self._session = None
+
+    def _on_item_added(self, ev):
+        msg = ev.item
+        text = getattr(msg, "text_content", None)
+        if text and msg.role in ("user", "assistant"):
+            self.add_turn(msg.role, text)
+
+    def add_turn(self, role: str, text: str):
+        self._pending.append(f"{role}: {text}")
+        self.turns += 1
+        if len(self._pending) >= self.batch_turns and (self._task is None or self._task.done()):
+            self._task = self.spawn(self._update(), name="summary_update")
+
+    async def _update(self):
+        while self._pending:
+            batch, self._pending = self._pending, []
+            user = f"Current summary:\n{self.summary or '(none yet)'}\n\nNew turns:\n" + "\n".join(batch)
+            try:
+                summary = await complete(self.model, SUMMARY_PROMPT, user)
+            except Exception as e:
+                logger.error(f"Rolling summary update failed: {e}")
+                self._pending = batch + self._pending  # retried on the next update/finalize
+                return
+            if summary:
+                self.summary = summary
+                self.folded += len(batch)
+            if len(self._pending) < self.batch_turns:
+                return
+
+    async def finalize(self) -> str:
+        """Fold in whatever is left and return the final summary."""
+        self.detach()
+        if self._task and not self._task.done():
+            await self._task
+        if self._pending:
+            self._task = None
+            await self._update()
+        if self._pending:
+            # Last update failed; keep what we have plus the raw tail
+            return (self.summary + "\n" if self.summary else "") + "\n".join(self._pending)
+        if not self.summary:
+            return "No conversation recorded."
+        logger.info(f"FINAL SUMMARY: {self.summary}")
+        return self.summary
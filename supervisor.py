@@ -0,0 +1,177 @@
+"""Per-session ownership of background tasks.
+
+Everything a call starts in the background (prefetches, summary updates, avatar
+start/teardown, the end-of-call sequence, the publisher and metrics loops) is
+spawned through the room's SessionSupervisor, and per-room components register
+their aclose() with it. When the room or the AgentSession closes, the components
+are closed in order and tasks still running are cancelled instead of outliving the
+call; the session's task counts and memory growth are logged and recorded in metrics.
+"""
+from __future__ import annotations
+import asyncio
+import collections
+import contextvars
+import logging
+import os
+import resource
+
+import metrics
+
+try:
+    import psutil
+except ImportError:  # fall back to peak RSS from getrusage
+    psutil = None
+
+logger = logging.getLogger("voice-agent.supervisor")
+
+# Log live tasks / memory of each session this often (seconds, 0 = only at close)
+SESSION_REPORT_SECONDS = float(os.environ.get("SESSION_REPORT_SECONDS", "60"))
+# Tasks spawned with grace=True (e.g. saving the call summary) get this long to finish
+# when the session closes before they are cancelled
+SESSION_CLOSE_GRACE = float(os.environ.get("SESSION_CLOSE_GRACE", "5"))
+
+
+def _rss_mb() -> float:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2**20
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, in KB on Linux
+
+
+class SessionSupervisor:
+    """Owns the background tasks of one room.
+
+    - spawn() replaces asyncio.create_task: the task is kept referenced, named, and
+      its exception (if any) is logged instead of vanishing with the task,
+    - aclose() runs once, on room disconnect, AgentSession close or job shutdown:
+      grace tasks are given SESSION_CLOSE_GRACE seconds, then the closers run in the
+      order they were added (so e.g. queued DB writes are flushed after the summary
+      was queued), then everything still running is cancelled,
+    - daemon tasks (loops meant to live as long as the session) are cancelled at close
+      without counting as left over,
+    - report() is what is logged periodically and at close.
+    """
+
+    def __init__(self, name: str, report_seconds: float = SESSION_REPORT_SECONDS,
+                 close_grace: float = SESSION_CLOSE_GRACE):
+        self.name = name
+        self.report_seconds = report_seconds
+        self.close_grace = close_grace
+        self.closed = False
+        self._tasks = set()
+        self._grace = set()
+        self._daemons = set()
+        self._closers = []
+        self._report_task = None
+        self._close_task = None
+        self._context = contextvars.copy_context()
+        self._rss_start = _rss_mb()
+        self.stats = {"spawned": 0, "failed": 0, "peak_live": 0, "cancelled_at_close": 0}
+
+    def attach(self, ctx):
+        """Close with the room; the job's shutdown waits for the close to finish.
+
+        Tasks and closers run in (a copy of) the context attach() was called from, so
+        what the entrypoint bound there (log room tag, usage meter) also applies to
+        work started from room/session event callbacks and to the close itself."""
+        self._context = contextvars.copy_context()
+        ctx.room.on("disconnected", self._on_closed)
+        ctx.add_shutdown_callback(self.aclose)
+        if self.report_seconds:
+            self._report_task = asyncio.create_task(self._report_loop())
+
+    def watch_session(self, ctx, session):
+        # The caller hung up or the session errored out: end the job too, so the
+        # process is freed instead of idling in an empty room
+        @session.on("close")
+        def _on_session_close(ev):
+            reason = getattr(ev, "reason", None)
+            logger.info(f"AgentSession closed ({reason}), shutting down the job")
+            self._on_closed()
+            ctx.shutdown(reason=f"session closed: {reason}")
+
+    def add_closer(self, fn):
+        """async fn() run at close, after grace tasks finished and before cancellation."""
+        self._closers.append(fn)
+
+    def spawn(self, coro, name: str = None, grace: bool = False, daemon: bool = False) -> asyncio.Task:
+        if self.closed:
+            # Late event after the room closed (e.g. a final transcript): nothing to run it for
+            coro.close()
+            logger.debug(f"Session {self.name} closed, not starting {name}")
+            return None
+        task = asyncio.create_task(coro, name=name, context=self._context.copy())
+        self._tasks.add(task)
+        if grace:
+            self._grace.add(task)
+        if daemon:
+            self._daemons.add(task)
+        task.add_done_callback(self._on_task_done)
+        self.stats["spawned"] += 1
+        self.stats["peak_live"] = max(self.stats["peak_live"], len(self._tasks))
+        return task
+
+    def _on_task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._grace.discard(task)
+        self._daemons.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["failed"] += 1
+            logger.error(f"Background task {task.get_name()} failed: {task.exception()!r}",
+                         exc_info=task.exception())
+
+    def report(self) -> dict:
+        live = collections.Counter(t.get_name() for t in self._tasks)
+        rss = _rss_mb()
+        return {
+            "live_tasks": len(self._tasks),
+            "by_name": dict(live),
+            "loop_tasks": len(asyncio.all_tasks()),
+            "rss_mb": round(rss, 1),
+            "rss_growth_mb": round(rss - self._rss_start, 1),
+            **self.stats,
+        }
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_seconds)
+            logger.info(f"Session {self.name}: {self.report()}")
+
+    def _on_closed(self, *args):
+        if self._close_task is None and not self.closed:
+            self._close_task = asyncio.create_task(self._close(), context=self._context.copy())
+
+    async def aclose(self):
+        self._on_closed()
+        if self._close_task is not None:
+            await asyncio.shield(self._close_task)
+
+    async def _close(self):
+        self.closed = True
+        if self._report_task:
+            self._report_task.cancel()
+        if self._grace:
+            _, pending = await asyncio.wait(set(self._grace), timeout=self.close_grace)
+            if pending:
+                logger.warning(f"{len(pending)} task(s) still running after {self.close_grace:.0f}s grace, cancelling")
+
+        for fn in self._closers:
+            try:
+                await fn()
+            except Exception as e:
+                logger.error(f"Error closing {getattr(fn, '__qualname__', fn)}: {e}", exc_info=True)
+
+        remaining = list(self._tasks)
+        leftover = [t for t in remaining if t not in self._daemons]
+        self.stats["cancelled_at_close"] = len(leftover)
+        report = self.report()
+        if leftover:
+            logger.warning(f"Cancelling {len(leftover)} task(s) left running at close: {[t.get_name() for t in leftover]}")
+        metrics.SESSION_TASKS.observe(report["peak_live"], stage="peak")
+        metrics.SESSION_TASKS.observe(len(leftover), stage="cancelled_at_close")
+        metrics.SESSION_MEMORY.observe(max(0.0, report["rss_growth_mb"]))
+        logger.info(f"Session {self.name} closed: {report}")
+
+        for task in remaining:
+            task.cancel()
+        if remaining:
+            await asyncio.gather(*remaining, return_exceptions=True)
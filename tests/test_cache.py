@@ -0,0 +1,59 @@
+import pytest
+
+import cache
+from cache import MISSING, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    c = TTLCache("t", maxsize=10, ttl=30)
+    c.set("a", 1)
+    clock[0] += 29
+    assert c.get("a") == 1
+    clock[0] += 2
+    assert c.get("a") is MISSING
+    assert len(c) == 0
+
+
+def test_none_uses_negative_ttl(clock):
+    c = TTLCache("t", maxsize=10, ttl=30, negative_ttl=5)
+    c.set("unknown", None)
+    assert c.get("unknown") is None  # a cached "not found", not a miss
+    clock[0] += 6
+    assert c.get("unknown") is MISSING
+    assert c.stats["negative_hits"] == 1 and c.stats["misses"] == 1
+
+
+def test_zero_ttl_is_not_cached(clock):
+    c = TTLCache("t", maxsize=10, ttl=30, negative_ttl=0)
+    c.set("unknown", None)
+    assert len(c) == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    c = TTLCache("t", maxsize=2, ttl=30)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")  # "b" is now the least recently used
+    c.set("c", 3)
+    assert c.get("b") is MISSING
+    assert c.get("a") == 1 and c.get("c") == 3
+    assert c.stats["evictions"] == 1
+
+
+def test_stats(clock):
+    c = TTLCache("t", maxsize=10, ttl=30)
+    c.get("a")
+    c.set("a", 1)
+    c.get("a")
+    c.get("a", record=False)
+    c.record_lookup(False)
+    c.invalidate("a")
+    c.invalidate("a")  # already gone: not counted
+    assert c.stats == {"hits": 1, "negative_hits": 0, "misses": 2, "evictions": 0, "invalidations": 1}
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("livekit.rtc")
+
+import publisher
+
+
+class FakeParticipant:
+    def __init__(self):
+        self.packets = []
+
+    async def publish_data(self, data, reliable=True):
+        self.packets.append(json.loads(data))
+
+
+class FakeRoom:
+    def __init__(self):
+        self.local_participant = FakeParticipant()
+
+
+def test_burst_is_coalesced_into_one_batch_packet():
+    async def run():
+        room = FakeRoom()
+        pub = publisher.DataPublisher(room, window=0.01)
+        pub.start()
+        for i in range(3):
+            pub.publish({"type": "progress", "n": i})
+        await pub.flush()
+        pub.publish({"type": "done"})
+        await pub.aclose()
+        return room.local_participant.packets, pub.stats
+
+    packets, stats = asyncio.run(run())
+    assert packets == [
+        {"type": "batch", "events": [{"type": "progress", "n": 0}, {"type": "progress", "n": 1}, {"type": "progress", "n": 2}]},
+        {"type": "done"},  # a lone event keeps its own shape
+    ]
+    assert stats["events"] == 4 and stats["packets"] == 2
+
+
+def test_large_burst_is_split_under_max_packet_bytes():
+    pub = publisher.DataPublisher(FakeRoom())
+    events = [{"type": "transcript", "text": "x" * 5000} for _ in range(5)]
+    batches = list(pub._packets(events))
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert all(len(pub._encode({"type": "batch", "events": b})) <= publisher.MAX_PACKET_BYTES for b in batches)
+
+
+def test_full_queue_drops_non_critical_and_never_critical():
+    async def run():
+        pub = publisher.DataPublisher(FakeRoom(), max_queue=2)  # not started: nothing drains
+        assert pub.publish({"n": 1}) and pub.publish({"n": 2})
+        assert not pub.publish({"n": 3})
+        # A critical event evicts the oldest non-critical one
+        assert pub.publish({"n": 4}, critical=True)
+        assert [e["n"] for e, _ in pub._queue] == [2, 4]
+        assert pub.publish({"n": 5}, critical=True)
+        # Only critical events left: the next one goes over max_queue
+        assert pub.publish({"n": 6}, critical=True)
+        assert [e["n"] for e, _ in pub._queue] == [4, 5, 6]
+        assert pub.stats["dropped"] == 3
+
+    asyncio.run(run())
+
+
+def test_close_wakes_blocked_send():
+    async def run():
+        pub = publisher.DataPublisher(FakeRoom(), max_queue=1)
+        pub.publish({"n": 1})
+        waiting = asyncio.create_task(pub.send({"n": 2}))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        await pub.aclose()
+        await asyncio.wait_for(waiting, 1)
+        assert [e["n"] for e, _ in pub._queue] == [1]
+
+    asyncio.run(run())
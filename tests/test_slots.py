@@ -0,0 +1,59 @@
+import datetime
+
+import pytest
+
+import slots
+
+# Friday 2026-01-09, 3:00 PM clinic time (defaults: 9 AM-5 PM, 30 minute slots)
+NOW = datetime.datetime(2026, 1, 9, 15, 0, tzinfo=slots.TZ)
+FRIDAY = NOW.date()
+
+
+def day(offset: int) -> datetime.date:
+    return FRIDAY + datetime.timedelta(days=offset)
+
+
+@pytest.mark.parametrize("text, expected", [
+    # bare times: the next occurrence
+    ("4 pm", (day(0), "4:00 PM", False)),
+    ("4:00 PM", (day(0), "4:00 PM", False)),
+    ("10 a.m.", (day(1), "10:00 AM", False)),
+    ("14:30", (day(1), "2:30 PM", False)),
+    # relative days
+    ("today at 4pm", (day(0), "4:00 PM")),
+    ("tomorrow at 2pm", (day(1), "2:00 PM")),
+    ("the day after tomorrow at 9:30 AM", (day(2), "9:30 AM")),
+    # weekdays: today's only while the slot is still ahead, else next week
+    ("Friday 4 PM", (day(0), "4:00 PM")),
+    ("Friday 10 AM", (day(7), "10:00 AM")),
+    ("on Friday at 3:00 PM", (day(7), "3:00 PM")),
+    ("next Friday at 4 pm", (day(7), "4:00 PM")),
+    ("Monday at 10 AM", (day(3), "10:00 AM")),
+    ("Thurs 11:30 am", (day(6), "11:30 AM")),
+    # dates
+    ("January 12th at 10 AM", (datetime.date(2026, 1, 12), "10:00 AM")),
+    ("January 5 at 10 AM", (datetime.date(2027, 1, 5), "10:00 AM")),
+    ("2026-02-03 at 2 PM", (datetime.date(2026, 2, 3), "2:00 PM")),
+    # not bookable / not understood
+    ("8 AM", None),
+    ("10:15 AM", None),
+    ("6 pm tomorrow", None),
+    ("sometime next week", None),
+    ("blursday at 10 AM", None),
+    ("February 30 at 10 AM", None),
+])
+def test_parse_slot(text, expected):
+    slot = slots.parse_slot(text, NOW)
+    if expected is None:
+        assert slot is None
+        return
+    expected_day, time, *day_given = expected
+    assert (slot.day, slots.format_bucket(slot.bucket)) == (expected_day, time)
+    assert slot.day_given == (day_given[0] if day_given else True)
+
+
+def test_today_in_the_past_is_not_rolled_forward():
+    # Only named weekdays roll over; "today" keeps its day and is rejected by the caller
+    slot = slots.parse_slot("today at 10 AM", NOW)
+    assert slot.day == FRIDAY
+    assert slots.slot_start(slot.day, slot.bucket) <= NOW
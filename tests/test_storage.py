@@ -0,0 +1,17 @@
+import inspect
+
+import pytest
+
+import storage
+
+BACKENDS = [storage.SupabaseBackend, storage.PostgresBackend, storage.SQLiteBackend]
+OPERATIONS = [name for name, fn in vars(storage.StorageBackend).items()
+              if inspect.iscoroutinefunction(fn) and not name.startswith("_")]
+
+
+@pytest.mark.parametrize("backend", BACKENDS, ids=lambda b: b.name)
+@pytest.mark.parametrize("op", OPERATIONS)
+def test_backend_signatures_match_base(backend, op):
+    # db.py calls every backend the same way: a missing parameter is a TypeError at runtime
+    expected = list(inspect.signature(getattr(storage.StorageBackend, op)).parameters)
+    assert list(inspect.signature(getattr(backend, op)).parameters) == expected
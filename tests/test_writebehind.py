@@ -0,0 +1,110 @@
+import asyncio
+import glob
+import os
+
+import pytest
+
+import db
+import storage
+import writebehind
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = storage.SQLiteBackend(str(tmp_path / "clinic.db"))
+    db.set_backend(backend)
+    yield backend
+    db.set_backend(None)
+    backend._executor.shutdown(wait=True)
+
+
+def make_queue(tmp_path):
+    return writebehind.WriteBehindQueue(batch_size=10, flush_interval=60, spool_dir=str(tmp_path / "spool"))
+
+
+def turn(seq):
+    return {"room": "room-1", "seq": seq, "user_contact": None, "role": "u", "text": f"line {seq}",
+            "created_at": "2026-01-05T10:00:00+00:00"}
+
+
+def usage_row(metric):
+    return {"room": "room-1", "user_contact": None, "started_at": "2026-01-05T10:00:00+00:00",
+            "ended_at": "2026-01-05T10:05:00+00:00", "metric": metric, "detail": "", "quantity": 1.0}
+
+
+def spooled(tmp_path):
+    return sum(1 for path in glob.glob(os.path.join(tmp_path, "spool", "*.jsonl")) for _ in open(path))
+
+
+async def count(backend, table):
+    return (await backend._fetch(f"SELECT count(*) AS n FROM {table}"))[0]["n"]
+
+
+def test_failed_flush_spools_and_replay_inserts(backend, tmp_path, monkeypatch):
+    async def down(table, rows):
+        raise ConnectionError("database unavailable")
+
+    async def run():
+        queue = make_queue(tmp_path)
+        monkeypatch.setattr(backend, "insert_many", down)
+        for seq in range(1, 4):
+            queue.enqueue("conversation_turns", turn(seq))
+        await queue.flush()
+        # (the startup replay claims the fresh spool, fails too and puts it back)
+        assert queue.stats["written"] == 0
+        assert spooled(tmp_path) == 3
+
+        # Database back: the next successful flush replays the spool
+        monkeypatch.undo()
+        queue.enqueue("conversation_turns", turn(4))
+        await queue.flush()
+        await queue.aclose()
+        assert queue.stats["written"] == 4 and queue.stats["replayed"] == 3
+        assert spooled(tmp_path) == 0
+        assert await count(backend, "conversation_turns") == 4
+
+    asyncio.run(run())
+
+
+def test_cancel_during_multi_table_flush_spools_every_table(backend, tmp_path, monkeypatch):
+    insert_many = backend.insert_many
+
+    async def run():
+        blocked = asyncio.Event()
+
+        async def hang(table, rows):
+            blocked.set()
+            await asyncio.Event().wait()
+
+        queue = make_queue(tmp_path)
+        monkeypatch.setattr(backend, "insert_many", hang)
+        batch = [("conversation_turns", turn(1)), ("conversation_turns", turn(2)),
+                 ("usage", usage_row("llm_tokens")), ("usage", usage_row("tts_characters"))]
+        task = asyncio.create_task(queue._write(batch))
+        await blocked.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert queue.stats["spooled"] == 4 and queue.stats["written"] == 0
+        assert spooled(tmp_path) == 4
+
+        # The next process replays both tables on startup
+        monkeypatch.setattr(backend, "insert_many", insert_many)
+        replayer = make_queue(tmp_path)
+        await replayer.flush()
+        assert replayer.stats["replayed"] == 4
+        assert await count(backend, "conversation_turns") == 2
+        assert await count(backend, "usage") == 2
+
+    asyncio.run(run())
+
+
+def test_rows_without_backend_are_not_counted_as_written(tmp_path):
+    async def run():
+        db.set_backend(None)
+        queue = make_queue(tmp_path)
+        queue.enqueue("conversation_turns", turn(1))
+        await queue.flush()
+        assert queue.stats["written"] == 0 and queue.stats["batches"] == 0
+
+    asyncio.run(run())
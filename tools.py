@@ -4,30 +4,131 @@ from typing import Annotated
 from livekit.agents import llm
 import enum
 import db
+import slots
+from cache import MISSING
+from prefetch import Prefetcher
+import transcripts
 import json
 import asyncio
-from livekit.plugins import openai
 
-logger = logging.getLogger("voice-agent")
+logger = logging.getLogger("voice-agent.tools")
+
+# Fixed replies spoken straight from the TTS cache (see tts_cache.cacheable_phrases)
+GOODBYE = "Conversation ended. Goodbye."
+SLOT_TAKEN = "I'm sorry, the slot at {time} is already booked. Please choose another time."
+# Upcoming appointments searched for "cancel my 10 AM" when the day is not given
+UPCOMING_SCAN = 20
+
+
+def _first_at(appointments, slot):
+    """Earliest upcoming booked appointment at slot's time of day, or None."""
+    current = slots.now()
+    booked = (slots.slot_from_timestamp(a.get("start_time")) for a in appointments or [] if a.get("status") == "booked")
+    upcoming = [s for s in booked if s and s.bucket == slot.bucket and slots.slot_start(s.day, s.bucket) > current]
+    return min(upcoming, default=None)
+
+
+def _describe_counts(counts) -> str:
+    # "2 upcoming (2 booked) and 14 past (2 cancelled, 12 completed)"
+    parts = []
+    for section in ("upcoming", "past"):
+        total = sum(counts[section].values())
+        detail = ", ".join(f"{n} {status}" for status, n in sorted(counts[section].items()))
+        parts.append(f"{total} {section}" + (f" ({detail})" if total else ""))
+    return " and ".join(parts)
+
 
 class Tools:
-    def __init__(self):
+    def __init__(self, supervisor=None):
+        self.supervisor = supervisor # SessionSupervisor of the room (None outside a room)
         self.room = None
         self.assistant = None # Injected later
+        self.publisher = None # DataPublisher for this room, injected later
+        self.session = None # AgentSession, injected later
+        self.tts_cache = None # TTSCache, injected later
+        self.prefetcher = Prefetcher(spawn=supervisor.spawn if supervisor else asyncio.create_task)
+        self.summarizer = None # RollingSummarizer, injected later
+        self.tracer = None # metrics.TurnTracer, injected later
+        self.transcript = None # transcripts.TranscriptRecorder, injected later
+        self._shutdown_task = None
+        self._history = None # retrieve_appointments cursor, for "show more"
+
+    def _spawn(self, coro, name: str, grace: bool = False):
+        if self.supervisor:
+            return self.supervisor.spawn(coro, name=name, grace=grace)
+        return asyncio.create_task(coro, name=name)
+
+    def _speak_cached(self, text: str):
+        # Speak a fixed reply from the TTS cache. Returning None from the tool means the
+        # LLM does not generate (and synthesize) its own version of the same sentence.
+        if self.session and self.tts_cache:
+            self.tts_cache.say(self.session, text)
+            return None
+        return text
 
     async def _publish_update(self, name: str, message: str, type: str = "tool_start"):
-        if self.room:
-            try:
-                payload = json.dumps({
-                    "type": type,
-                    "name": name,
-                    "message": message,
-                    "timestamp": asyncio.get_event_loop().time() * 1000 
-                })
-                # Using reliable publishing
-                await self.room.local_participant.publish_data(payload, reliable=True)
-            except Exception as e:
-                logger.error(f"Failed to publish data: {e}")
+        if self.tracer:
+            if type == "tool_start":
+                self.tracer.tool_start(name)
+            else:
+                self.tracer.tool_end(name)
+        if self.publisher:
+            # Queued, not awaited: start/end of a fast tool usually share one packet.
+            # Progress (tool_start) may be dropped under load, results may not.
+            self.publisher.publish({
+                "type": type,
+                "name": name,
+                "message": message,
+                "timestamp": asyncio.get_event_loop().time() * 1000 
+            }, critical=(type != "tool_start"))
+
+    async def _upcoming_at(self, contact_number: str, slot):
+        """Earliest upcoming booked appointment at slot's time of day (slot itself if none)."""
+        history = await self.prefetcher.history(contact_number)
+        # The prefetched page holds the soonest upcoming appointments: a match there is the earliest
+        match = _first_at(history[2], slot) if history is not MISSING else None
+        if match is None:
+            appointments = await db.get_appointments(contact_number, slots.now_timestamp(), "upcoming", limit=UPCOMING_SCAN)
+            match = _first_at(appointments, slot)
+        return match or slot
+
+    async def _start_history(self, contact_number: str):
+        history = await self.prefetcher.history(contact_number)
+        if history is MISSING:
+            since = slots.now_timestamp()
+            counts = await db.get_appointment_counts(contact_number, since)
+            if counts is None:
+                return None
+        else:
+            since, counts, _ = history
+        total = sum(n for section in counts.values() for n in section.values())
+        return {"contact": contact_number, "since": since, "counts": counts, "total": total,
+                "section": "upcoming", "offset": 0, "listed": 0}
+
+    async def _prior_context(self, contact_number: str) -> str:
+        """Digest of the caller's earlier calls (one indexed read), "" if none."""
+        if not self.transcript or not transcripts.DIGEST_TURNS:
+            return ""
+        turns = await db.get_recent_turns(contact_number, self.transcript.room, transcripts.DIGEST_TURNS)
+        return transcripts.digest(turns)
+
+    async def _history_page(self, cursor):
+        """Next db.HISTORY_PAGE_SIZE appointments: upcoming ones, then past ones."""
+        items = []
+        while len(items) < db.HISTORY_PAGE_SIZE and cursor["section"]:
+            section = cursor["section"]
+            in_section = sum(cursor["counts"][section].values())
+            if cursor["offset"] < in_section:
+                rows = await db.get_appointments(cursor["contact"], cursor["since"], section, cursor["offset"])
+                rows = rows[:db.HISTORY_PAGE_SIZE - len(items)]
+                items += [(section, row) for row in rows]
+                # No rows: some were deleted since they were counted
+                cursor["offset"] = cursor["offset"] + len(rows) if rows else in_section
+            if cursor["offset"] >= in_section:
+                cursor["section"] = "past" if section == "upcoming" else None
+                cursor["offset"] = 0
+        cursor["listed"] += len(items)
+        return items
 
     @llm.function_tool(description="Identify the user by their phone number")
     async def identify_user(
@@ -38,13 +139,21 @@ class Tools:
         await self._publish_update("identify_user", f"Identifying user {contact_number}")
         logger.info(f"identifying user: {contact_number}")
         self.current_user_contact = contact_number
-        user = await db.get_user(contact_number)
+        if self.transcript:
+            # Turns from here on are stored under the caller's number
+            self.transcript.contact = contact_number
+        # Concurrent, so the digest adds no round trip to identification
+        user, prior = await asyncio.gather(db.get_user(contact_number), self._prior_context(contact_number))
         if user:
+            # Next call is almost always retrieve/book: load their context in the background
+            self.prefetcher.start(contact_number)
             await self._publish_update("identify_user", f"Identified {user.get('name')}", type="tool_end")
-            return f"Welcome back, {user.get('name', 'User')}."
+            welcome = f"Welcome back, {user.get('name', 'User')}."
+            return f"{welcome} {prior}" if prior else welcome
         else:
             if name:
                 await db.create_user(contact_number, name)
+                self.prefetcher.start(contact_number)
                 msg = f"Registered {name} ({contact_number})"
                 await self._publish_update("identify_user", msg, type="tool_end")
                 return f"Nice to meet you, {name}. I've registered you with number {contact_number}."
@@ -52,33 +161,52 @@ class Tools:
             await self._publish_update("identify_user", "User found/registered", type="tool_end")
             return f"I see you are new. I've noted your number {contact_number}. What is your name?"
 
-    @llm.function_tool(description="Fetch available appointment slots")
-    async def fetch_slots(self):
+    @llm.function_tool(description="Fetch available appointment slots for a day")
+    async def fetch_slots(
+        self,
+        day: Annotated[str, "The day to check, e.g. 'today', 'tomorrow', 'Friday' or 'January 5'"] = "today"
+    ):
         await self._publish_update("fetch_slots", "Checking available slots...")
-        logger.info("fetching slots")
-        # Hardcoded slots for now
-        slots = ["10:00 AM", "2:00 PM", "4:00 PM"]
-        await self._publish_update("fetch_slots", f"Found {len(slots)} slots", type="tool_end")
-        return slots
+        logger.info(f"fetching slots for {day}")
+        date = slots.parse_day(day)
+        if date is None:
+            await self._publish_update("fetch_slots", "Invalid day", type="tool_end")
+            return f"I couldn't tell which day '{day}' is. Please ask for a day like 'tomorrow' or 'Friday'."
+        inventory = slots.get_inventory()
+        inventory.refresh_if_stale()
+        available = inventory.available(date)
+        await self._publish_update("fetch_slots", f"Found {len(available)} slots", type="tool_end")
+        if not available:
+            return f"There are no free slots on {slots.format_day(date)}."
+        return f"Free slots on {slots.format_day(date)}: {', '.join(available)}."
 
     @llm.function_tool(description="Book an appointment")
     async def book_appointment(
         self,
         contact_number: Annotated[str, "The user's contact number"],
         name: Annotated[str, "The user's name"],
-        time: Annotated[str, "The requested appointment time"]
+        time: Annotated[str, "The requested day and time, e.g. 'tomorrow at 2 PM' (a bare time means the next one)"]
     ):
         await self._publish_update("book_appointment", f"Booking for {name} at {time}")
         logger.info(f"booking appointment for {name} ({contact_number}) at {time}")
         
-        # Check availability first
-        is_available = await db.check_slot_availability(time)
-        if not is_available:
-             await self._publish_update("book_appointment", "Slot unavailable", type="tool_end")
-             return f"I'm sorry, the slot at {time} is already booked. Please choose another time."
+        slot = slots.parse_slot(time)
+        if slot is None:
+            await self._publish_update("book_appointment", "Invalid slot", type="tool_end")
+            today = slots.now().date()
+            return f"{time} is not one of our appointment times. Available slots today are: {', '.join(slots.get_inventory().available(today)) or 'none'}."
+        if slots.slot_start(slot.day, slot.bucket) <= slots.now():
+            await self._publish_update("book_appointment", "Slot in the past", type="tool_end")
+            return f"{slots.describe(slot)} has already passed. Please pick a later time."
+        time = slots.describe(slot)
 
-        result = await db.create_appointment(contact_number, time)
-        if result:
+        # Reserve in the local inventory, then a single conflict-checked insert
+        result = await slots.get_inventory().book(contact_number, slot)
+        if result is slots.BookingResult.TAKEN:
+             await self._publish_update("book_appointment", "Slot unavailable", type="tool_end")
+             return self._speak_cached(SLOT_TAKEN.format(time=slots.format_bucket(slot.bucket)))
+        if result is slots.BookingResult.BOOKED:
+            self.prefetcher.invalidate(contact_number)
             await self._publish_update("book_appointment", "Booking success!", type="tool_end")
             return f"Appointment booked for {name} at {time}."
         await self._publish_update("book_appointment", "Booking failed.", type="tool_end")
@@ -88,142 +216,109 @@ class Tools:
     async def cancel_appointment(
         self,
         contact_number: Annotated[str, "The user's contact number"],
-        time: Annotated[str, "The time of the appointment to cancel"]
+        time: Annotated[str, "The day and time of the appointment to cancel, e.g. 'Friday at 10 AM'"]
     ):
         await self._publish_update("cancel_appointment", f"Canceling for {contact_number} at {time}")
         logger.info(f"canceling appointment for {contact_number} at {time}")
         
-        result = await db.cancel_appointment(contact_number, time)
+        slot = slots.parse_slot(time)
+        if slot is None:
+            await self._publish_update("cancel_appointment", "Invalid slot", type="tool_end")
+            return f"I couldn't understand the time '{time}'. Which day and time is the appointment?"
+        if not slot.day_given:
+            # "Cancel my 10 AM": their next booked appointment at that time of day
+            slot = await self._upcoming_at(contact_number, slot)
+        time = slots.describe(slot)
+
+        result = await db.cancel_appointment(contact_number, slots.slot_timestamp(slot))
         if result:
+            slots.get_inventory().release(slot.bucket, slot.day)
+            self.prefetcher.invalidate(contact_number)
             await self._publish_update("cancel_appointment", "Cancellation success", type="tool_end")
             return f"Your appointment at {time} has been successfully cancelled."
         
         await self._publish_update("cancel_appointment", "Cancellation failed", type="tool_end")
         return f"I couldn't find an appointment at {time} to cancel, or something went wrong."
 
-    @llm.function_tool(description="Retrieve past appointments")
+    @llm.function_tool(description="Retrieve the user's appointments, a few at a time: upcoming first, then past. "
+                                   "Call again with more=true to hear the next ones")
     async def retrieve_appointments(
         self,
-        contact_number: Annotated[str, "The user's contact number"]
+        contact_number: Annotated[str, "The user's contact number"],
+        more: Annotated[bool, "True to continue after the appointments already listed"] = False
     ):
         await self._publish_update("retrieve_appointments", f"Fetching history for {contact_number}")
-        logger.info(f"retrieving appointments for {contact_number}")
-        appointments = await db.get_appointments(contact_number)
-        if appointments:
-            appt_list = ", ".join([f"{appt.get('start_time')} ({appt.get('status')})" for appt in appointments])
-            await self._publish_update("retrieve_appointments", f"Found {len(appointments)} appts", type="tool_end")
-            return f"You have the following appointments: {appt_list}"
-        await self._publish_update("retrieve_appointments", "No appointments found", type="tool_end")
-        return "No past appointments found."
+        logger.info(f"retrieving appointments for {contact_number} (more={more})")
+        cursor = self._history
+        continuing = more and cursor is not None and cursor["contact"] == contact_number
+        if not continuing:
+            cursor = self._history = await self._start_history(contact_number)
+            if cursor is None:
+                await self._publish_update("retrieve_appointments", "History lookup failed", type="tool_end")
+                return "I couldn't retrieve the appointments right now."
+        if not cursor["total"]:
+            await self._publish_update("retrieve_appointments", "No appointments found", type="tool_end")
+            return "No appointments found."
+
+        items = await self._history_page(cursor)
+        await self._publish_update("retrieve_appointments", f"Listed {cursor['listed']} of {cursor['total']} appts", type="tool_end")
+        if not items:
+            return "There are no more appointments to list."
+        parts = [] if continuing else [f"The user has {_describe_counts(cursor['counts'])} appointments."]
+        for section in ("upcoming", "past"):
+            listed = [f"{slots.describe_timestamp(row.get('start_time'))} ({row.get('status')})" for s, row in items if s == section]
+            if listed:
+                parts.append(f"{section.capitalize()}: " + "; ".join(listed) + ".")
+        remaining = cursor["total"] - cursor["listed"]
+        if remaining > 0:
+            parts.append(f"{remaining} more not listed; call again with more=true if the user wants to hear them.")
+        return " ".join(parts)
 
     @llm.function_tool(description="End the conversation")
     async def end_conversation(self):
         await self._publish_update("end_conversation", "Ending conversation", type="tool_start")
         logger.info("ending conversation")
-        
-        summary = "No summary available."
-        appointment_status = "No new appointments."
-        
-        if hasattr(self, 'assistant') and self.assistant:
-            # Extract history (messages are in self.assistant.chat_ctx.messages)
-            # Depending on version it might be .messages which is a list
-            try:
-                # Safe access to messages
-                # LiveKit ChatContext usually has .messages. ReadOnlyChatContext has .items
-                messages = []
-                if hasattr(self.assistant.chat_ctx, "messages"):
-                    messages = self.assistant.chat_ctx.messages
-                elif hasattr(self.assistant.chat_ctx, "items"):
-                    messages = self.assistant.chat_ctx.items
-                
-                conversation_text = "\n".join([
-                    f"{msg.role}: {msg.content}" 
-                    for msg in messages 
-                    if hasattr(msg, 'content') and msg.content
-                ])
-                
-                # Generate summary
-                logger.info(f"Generating summary for {len(messages)} messages")
-                if not conversation_text:
-                    logger.warning("Conversation text is empty")
-                    summary = "No conversation recorded."
-                else:
-                    temp_llm = openai.LLM()
-                    
-                    # Create a new context for summary generation
-                    prompt_ctx = llm.ChatContext()
-                    prompt_ctx.add_message(
-                        role="system",
-                        content="Summarize the following conversation in 3-4 sentences. Include any appointments booked or key information collected."
-                    )
-                    prompt_ctx.add_message(
-                        role="user", 
-                        content=conversation_text
-                    )
-                    
-                    stream = temp_llm.chat(chat_ctx=prompt_ctx)
-                    full_response = ""
-                    full_response = ""
-                    logger.info("Starting summary stream...")
-                    
-                    async for chunk in stream:
-                        content = ""
-                        # LiveKit Agents ChatChunk (v0.8+) seems to use .delta
-                        if hasattr(chunk, "delta"):
-                            delta = chunk.delta
-                            if hasattr(delta, "content"):
-                                content = delta.content
-                        elif hasattr(chunk, "choices") and chunk.choices:
-                            # Fallback for other versions
-                            delta = chunk.choices[0].delta
-                            if hasattr(delta, "content"):
-                                content = delta.content
-                        elif hasattr(chunk, "content"):
-                             content = chunk.content
-                        
-                        if content:
-                             full_response += str(content)
-                    
-                    summary = full_response
-                    if not summary:
-                        logger.warning("Summary was empty! Inspecting last chunk structure...")
-                        summary = "Summary generation returned empty."
-                        
-                    logger.info(f"FINAL SUMMARY: {summary}")
-            except Exception as e:
-                logger.error(f"Summary generation failed: {e}", exc_info=True)
-                summary = f"Summary failed: {str(e)}"
 
-        # Move shutdown logic to background task to allow tool to return immediately
-        asyncio.create_task(self._shutdown_sequence(summary))
+        # The summary is finished off the critical path (most of it was already built
+        # in the background by the RollingSummarizer), so "Goodbye" plays right away.
+        # grace: if the caller hangs up meanwhile, the summary still gets saved
+        self._shutdown_task = self._spawn(self._shutdown_sequence(), "end_conversation", grace=True)
+
+        return self._speak_cached(GOODBYE)
 
-        return "Conversation ended. Goodbye."
+    async def _summarize(self):
+        if not self.summarizer:
+            return "No summary available."
+        try:
+            return await self.summarizer.finalize()
+        except Exception as e:
+            logger.error(f"Summary generation failed: {e}", exc_info=True)
+            return f"Summary failed: {str(e)}"
 
-    async def _shutdown_sequence(self, summary):
+    async def _shutdown_sequence(self):
         logger.info("Starting shutdown sequence...")
+        summary = await self._summarize()
         
         # Publish summary
-        if self.room:
+        if self.publisher:
              logger.info("Publishing summary to frontend...")
-             try:
-                 await self.room.local_participant.publish_data(json.dumps({
-                    "type": "summary",
-                    "summary": summary
-                 }), reliable=True)
-             except Exception as e:
-                 logger.error(f"Failed to publish summary: {e}")
+             await self.publisher.send({
+                "type": "summary",
+                "summary": summary
+             })
              
         # Save to DB if we have a contact number
         if hasattr(self, 'current_user_contact'):
-            logger.info("Saving to DB...")
+            logger.info("Queueing summary for DB...")
             try:
                 await db.save_conversation(self.current_user_contact, summary)
-                logger.info("Saved to DB.")
             except Exception as e:
                 logger.error(f"DB save failed: {e}")
 
         # Force disconnect to switch UI to summary
         if self.room:
-             print("Disconnecting room to show summary...")
-             await asyncio.sleep(2) # Give a moment for the summary event to be sent/received
+             logger.info("Disconnecting room to show summary...")
+             if self.publisher:
+                 await self.publisher.flush()
+             await asyncio.sleep(2) # Give a moment for the summary event to be received
              await self.room.disconnect()
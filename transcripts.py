@@ -0,0 +1,87 @@
+"""Incremental transcript persistence.
+
+Every line the AgentSession commits is appended to conversation_turns while the call
+is going on, through the write-behind queue (batched, off the event loop, spooled
+to disk if the database is down), so a worker crash or a failed summary no longer
+loses the conversation. Rows are never updated: a turn is (room, seq, role, text),
+with a one-letter role and whitespace-collapsed text capped at TRANSCRIPT_MAX_CHARS.
+Turns before the caller is identified have no user_contact.
+
+identify_user reads a short digest of the caller's previous calls back with one
+indexed read on (user_contact, created_at).
+"""
+from __future__ import annotations
+import datetime
+import logging
+import os
+
+import writebehind
+
+logger = logging.getLogger("voice-agent.transcripts")
+
+# Longer turns are cut (the call summary covers the gist)
+TRANSCRIPT_MAX_CHARS = int(os.environ.get("TRANSCRIPT_MAX_CHARS", "1000"))
+# Prior-context digest given to the LLM when a caller is identified: their last N
+# turns from earlier calls, each cut to DIGEST_TURN_CHARS (0 = no digest)
+DIGEST_TURNS = int(os.environ.get("DIGEST_TURNS", "6"))
+DIGEST_TURN_CHARS = int(os.environ.get("DIGEST_TURN_CHARS", "150"))
+
+ROLE_CODES = {"user": "u", "assistant": "a", "system": "s", "developer": "s"}  # anything else: "t" (tool)
+ROLE_NAMES = {"u": "caller", "a": "assistant", "s": "system", "t": "tool"}
+
+
+def encode(role: str, text: str):
+    """(role code, compact text), or None if there is nothing to store."""
+    text = " ".join(text.split())[:TRANSCRIPT_MAX_CHARS]
+    if not text:
+        return None
+    return ROLE_CODES.get(role, "t"), text
+
+
+class TranscriptRecorder:
+    """Appends one room's conversation to conversation_turns as it happens."""
+
+    def __init__(self, room: str, queue: writebehind.WriteBehindQueue = None):
+        self.room = room
+        self.queue = queue or writebehind.get_queue()
+        self.contact = None  # set by identify_user; earlier turns are stored without it
+        self.seq = 0
+        self.stats = {"turns": 0, "chars": 0}
+
+    def record(self, role: str, text: str):
+        encoded = encode(role, text)
+        if encoded is None:
+            return
+        code, text = encoded
+        self.seq += 1
+        self.queue.enqueue("conversation_turns", {
+            "room": self.room,
+            "seq": self.seq,
+            "user_contact": self.contact,
+            "role": code,
+            "text": text,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        })
+        self.stats["turns"] += 1
+        self.stats["chars"] += len(text)
+
+
+def digest(turns) -> str:
+    """One line for the LLM from recent_turns() rows (newest first), oldest turn first:
+    'Earlier calls: [Oct 12] caller: ...; assistant: ...'."""
+    if not turns:
+        return ""
+    parts, last_room = [], None
+    for turn in reversed(turns):
+        text = turn["text"]
+        if len(text) > DIGEST_TURN_CHARS:
+            text = text[:DIGEST_TURN_CHARS].rsplit(" ", 1)[0] + "..."
+        line = f"{ROLE_NAMES.get(turn['role'], 'tool')}: {text}"
+        if turn["room"] != last_room:
+            last_room = turn["room"]
+            created = turn.get("created_at")
+            if created:
+                day = datetime.datetime.fromisoformat(str(created)).strftime("%b %d").replace(" 0", " ")
+                line = f"[{day}] {line}"
+        parts.append(line)
+    return "Earlier calls: " + "; ".join(parts)
@@ -0,0 +1,178 @@
+from __future__ import annotations
+import asyncio
+import collections
+import hashlib
+import logging
+import os
+import wave
+
+from livekit import rtc
+
+import usage
+
+logger = logging.getLogger("voice-agent.tts_cache")
+
+# In-memory budget for cached PCM audio, per worker process
+TTS_CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# On-disk tier; can be pre-populated at build time with `python tts_cache.py`
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache"))
+
+FRAME_MS = 20
+
+
+class TTSCache:
+    """Cache of synthesized audio for fixed/templated utterances, in front of the TTS.
+
+    Entries are keyed by (text, voice, speed). Lookups go memory (LRU) -> disk (.wav)
+    -> TTS; a hit plays back without any network round trip. Misses are streamed to
+    the caller as they are synthesized and stored once complete.
+
+    Only use this for text that repeats across calls (greeting, goodbye, fixed tool
+    replies); free-form LLM output should go through the session's normal TTS path.
+    """
+
+    def __init__(self, tts, voice: str = None, speed: float = None,
+                 max_bytes: int = TTS_CACHE_MAX_BYTES, cache_dir: str = TTS_CACHE_DIR):
+        self.tts = tts
+        opts = getattr(tts, "_opts", None)
+        self.voice = str(voice if voice is not None else getattr(opts, "voice", "default"))
+        self.speed = speed if speed is not None else getattr(opts, "speed", None)
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+
+        self._memory = collections.OrderedDict()  # key -> (sample_rate, num_channels, pcm bytes)
+        self._memory_bytes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def key(self, text: str) -> str:
+        raw = f"{self.voice}|{self.speed}|{text}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def say(self, session, text: str, **kwargs):
+        """session.say() with cached audio. Returns the SpeechHandle."""
+        return session.say(text, audio=self.frames(text), **kwargs)
+
+    async def frames(self, text: str):
+        key = self.key(text)
+        entry = await self._lookup(key)
+        if entry:
+            # Billed TTS is counted from the session's TTS metrics; hits are what the cache saved
+            sample_rate, num_channels, pcm = entry
+            usage.add("tts_cached_chars", len(text))
+            usage.add("tts_cached_seconds", len(pcm) / (sample_rate * num_channels * 2))
+            for frame in _to_frames(*entry):
+                yield frame
+            return
+
+        self.stats["misses"] += 1
+        sample_rate, num_channels, chunks = None, None, []
+        async with self.tts.synthesize(text) as stream:
+            async for ev in stream:
+                frame = ev.frame
+                sample_rate, num_channels = frame.sample_rate, frame.num_channels
+                chunks.append(bytes(frame.data))
+                yield frame
+        # Only reached if playback consumed the whole utterance (no partial entries)
+        if chunks:
+            entry = (sample_rate, num_channels, b"".join(chunks))
+            self._remember(key, entry)
+            await asyncio.get_running_loop().run_in_executor(None, self._write_disk, key, entry)
+
+    async def warm(self, texts):
+        """Synthesize every text that is not cached yet (used at build time / startup)."""
+        for text in texts:
+            async for _ in self.frames(text):
+                pass
+
+    async def _lookup(self, key: str):
+        entry = self._memory.get(key)
+        if entry:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return entry
+        entry = await asyncio.get_running_loop().run_in_executor(None, self._read_disk, key)
+        if entry:
+            self.stats["disk_hits"] += 1
+            self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry):
+        size = len(entry[2])
+        if size > self.max_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key)[2])
+        self._memory[key] = entry
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted[2])
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _read_disk(self, key: str):
+        path = self._path(key)
+        if not self.cache_dir or not os.path.exists(path):
+            return None
+        try:
+            with wave.open(path, "rb") as f:
+                return f.getframerate(), f.getnchannels(), f.readframes(f.getnframes())
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable TTS cache file {path}: {e}")
+            return None
+
+    def _write_disk(self, key: str, entry):
+        if not self.cache_dir:
+            return
+        sample_rate, num_channels, pcm = entry
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = self._path(key) + ".tmp"
+            with wave.open(tmp, "wb") as f:
+                f.setnchannels(num_channels)
+                f.setsampwidth(2)  # int16 PCM
+                f.setframerate(sample_rate)
+                f.writeframes(pcm)
+            os.replace(tmp, self._path(key))
+        except Exception as e:
+            logger.warning(f"Failed to write TTS cache file: {e}")
+
+
+def _to_frames(sample_rate: int, num_channels: int, pcm: bytes):
+    samples_per_frame = sample_rate * FRAME_MS // 1000
+    frame_bytes = samples_per_frame * num_channels * 2
+    for i in range(0, len(pcm), frame_bytes):
+        chunk = pcm[i:i + frame_bytes]
+        yield rtc.AudioFrame(
+            data=chunk,
+            sample_rate=sample_rate,
+            num_channels=num_channels,
+            samples_per_channel=len(chunk) // (2 * num_channels),
+        )
+
+
+def cacheable_phrases():
+    """Every fixed or templated utterance the agent speaks through the cache."""
+    from agent import GREETING
+    from tools import GOODBYE, SLOT_TAKEN
+    from slots import OFFERED_SLOTS, format_bucket, parse_time
+    return [GREETING, GOODBYE] + [SLOT_TAKEN.format(time=format_bucket(parse_time(slot))) for slot in OFFERED_SLOTS]
+
+
+async def _prepopulate():
+    import aiohttp
+    from livekit.plugins import cartesia
+
+    async with aiohttp.ClientSession() as http_session:
+        cache = TTSCache(cartesia.TTS(speed=0.85, http_session=http_session))
+        phrases = cacheable_phrases()
+        await cache.warm(phrases)
+        print(f"TTS cache ready in {cache.cache_dir}: {len(phrases)} phrases, {cache.stats}")
+
+
+if __name__ == "__main__":
+    # Pre-populate the on-disk tier, e.g. as a build step: python tts_cache.py
+    from dotenv import load_dotenv
+    load_dotenv()
+    asyncio.run(_prepopulate())
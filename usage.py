@@ -0,0 +1,277 @@
+"""Per-session usage metering and the cost report built on it.
+
+Each call counts what the providers bill for: STT audio seconds, LLM prompt /
+completion tokens per model and route, TTS characters and audio seconds (cache hits
+separately), avatar active time, call length and DB round trips. Counting is an
+in-memory dict update; the totals are written as a handful of rows to the `usage`
+table (through the write-behind queue) when the session closes.
+
+`python usage.py` recomputes the scenarios of cost_estimation/README.md from those
+rows instead of estimates:
+
+    python usage.py --days 30 --calls-per-month 440
+    python usage.py --prices prices.json   # override any of PRICES
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import collections
+import contextvars
+import datetime
+import json
+import logging
+import time
+
+import writebehind
+
+logger = logging.getLogger("voice-agent.usage")
+
+# USD, from cost_estimation/README.md (January 2026)
+PRICES = {
+    "stt_minute": 0.0059,  # Deepgram Nova-2 streaming
+    # per 1M tokens: input, cached input, output
+    "llm": {
+        "gpt-4o": [2.50, 1.25, 10.00],
+        "gpt-4o-mini": [0.15, 0.075, 0.60],
+    },
+    "tts_minute": 0.03,  # Cartesia pay-as-you-go, per minute of generated audio
+    "avatar_minute": 0.35,  # Beyond Presence managed agent, Starter rate
+    "livekit_participant_minute": 0.015,
+    "participants": 2,  # caller + agent/avatar, as in Scenario A
+}
+
+_meter = contextvars.ContextVar("usage_meter", default=None)
+
+
+def bind(meter: UsageMeter):
+    """Count usage from this task (and tasks it creates) against meter."""
+    _meter.set(meter)
+
+
+def add(metric: str, amount: float, detail: str = ""):
+    """Add to the current session's meter; a no-op outside a session (API, scripts)."""
+    meter = _meter.get()
+    if meter is not None:
+        meter.add(metric, amount, detail)
+
+
+def add_llm_usage(model, route: str, usage):
+    """Token counts of a ChatChunk.usage, per "<model>:<route>"."""
+    if usage is None:
+        return
+    detail = f"{getattr(model, 'model', None) or route}:{route}"
+    add("llm_prompt_tokens", usage.prompt_tokens, detail)
+    add("llm_cached_tokens", getattr(usage, "prompt_cached_tokens", 0) or 0, detail)
+    add("llm_completion_tokens", usage.completion_tokens, detail)
+    add("llm_requests", 1, detail)
+
+
+class UsageMeter:
+    """In-memory usage counters of one room, keyed by (metric, detail).
+
+    The call starts when start() is called (the caller joined), not when the room's
+    job starts: a pooled room can wait minutes for its caller, and one that never gets
+    a caller is not a call, so nothing is written for it.
+    """
+
+    def __init__(self, room: str):
+        self.room = room
+        self.started_at = None
+        self._started = None
+        self.totals = collections.defaultdict(float)
+        self.flushed = False
+
+    def start(self):
+        if self._started is None:
+            self.started_at = datetime.datetime.now(datetime.timezone.utc)
+            self._started = time.monotonic()
+
+    def add(self, metric: str, amount: float, detail: str = ""):
+        self.totals[(metric, detail)] += amount
+
+    def attach(self, session):
+        # STT/TTS report per request; LLM tokens are counted in router.py instead,
+        # since the session only forwards the full model's metrics
+        session.on("metrics_collected", self._on_metrics)
+
+    def _on_metrics(self, ev):
+        m = ev.metrics
+        kind = getattr(m, "type", None)
+        if kind == "stt_metrics":
+            self.add("stt_seconds", m.audio_duration)
+        elif kind == "tts_metrics":
+            self.add("tts_chars", m.characters_count)
+            self.add("tts_seconds", m.audio_duration)
+
+    def rows(self, contact: str = None) -> list:
+        ended_at = datetime.datetime.now(datetime.timezone.utc)
+        self.totals[("session_seconds", "")] = time.monotonic() - self._started
+        base = {"room": self.room, "user_contact": contact,
+                "started_at": self.started_at.isoformat(), "ended_at": ended_at.isoformat()}
+        return [dict(base, metric=metric, detail=detail, quantity=round(quantity, 3))
+                for (metric, detail), quantity in sorted(self.totals.items())
+                if quantity or metric == "session_seconds"]  # the report counts calls by it
+
+    async def flush(self, contact: str = None):
+        """Queue this session's totals (once); the write-behind queue batches them."""
+        if self.flushed:
+            return
+        self.flushed = True
+        if self._started is None:
+            logger.info("No caller joined, not recording usage")
+            return
+        rows = self.rows(contact)
+        queue = writebehind.get_queue()
+        for row in rows:
+            queue.enqueue("usage", row)
+        summary = " ".join(f"{r['metric']}[{r['detail']}]={r['quantity']:g}" if r["detail"] else f"{r['metric']}={r['quantity']:g}"
+                           for r in rows)
+        logger.info(f"Session usage: {summary}")
+
+
+# --- Report ---
+
+def _llm_price(prices: dict, model: str):
+    # Longest matching name, so "gpt-4o-mini-2024-07-18" is priced as gpt-4o-mini
+    names = [name for name in prices["llm"] if model.startswith(name)]
+    return prices["llm"][max(names, key=len)] if names else None
+
+
+def _llm_cost(prices: dict, model: str, prompt: float, cached: float, completion: float) -> float:
+    price = _llm_price(prices, model)
+    if price is None:
+        return 0.0
+    uncached_in, cached_in, out = price
+    return ((prompt - cached) * uncached_in + cached * cached_in + completion * out) / 1e6
+
+
+def estimate(rows: list, prices: dict = PRICES, full_model: str = "gpt-4o") -> dict:
+    """Per-call usage and cost from usage_totals() rows ({metric, detail, quantity, sessions})."""
+    totals = collections.defaultdict(float)
+    for row in rows:
+        totals[(row["metric"], row["detail"] or "")] += float(row["quantity"])
+    sessions = max((int(r["sessions"]) for r in rows if r["metric"] == "session_seconds"), default=0)
+    if not sessions:
+        return {"sessions": 0}
+    per_call = lambda metric, detail="": totals[(metric, detail)] / sessions
+
+    llm = collections.defaultdict(lambda: collections.defaultdict(float))  # (model, route) -> metric -> per call
+    for (metric, detail), quantity in totals.items():
+        if metric.startswith("llm_"):
+            model, _, route = detail.rpartition(":")
+            llm[(model, route)][metric] += quantity / sessions
+
+    call_minutes = per_call("session_seconds") / 60
+    usage = {
+        "call_minutes": call_minutes,
+        "participants": prices["participants"],
+        "stt_minutes": per_call("stt_seconds") / 60,
+        "tts_minutes": per_call("tts_seconds") / 60,
+        "tts_chars": per_call("tts_chars"),
+        "tts_cached_minutes": per_call("tts_cached_seconds") / 60,
+        "tts_cached_chars": per_call("tts_cached_chars"),
+        "avatar_minutes": per_call("avatar_seconds") / 60,
+        "llm_tokens": sum(v["llm_prompt_tokens"] + v["llm_completion_tokens"] for v in llm.values()),
+        "db_round_trips": sum(q for (metric, _), q in totals.items() if metric == "db_round_trips") / sessions,
+    }
+    llm_cost = {key: _llm_cost(prices, key[0], v["llm_prompt_tokens"], v["llm_cached_tokens"], v["llm_completion_tokens"])
+                for key, v in llm.items()}
+    cost = {
+        "avatar": usage["avatar_minutes"] * prices["avatar_minute"],
+        "stt": usage["stt_minutes"] * prices["stt_minute"],
+        "llm": sum(llm_cost.values()),
+        "tts": usage["tts_minutes"] * prices["tts_minute"],
+        "livekit": call_minutes * prices["participants"] * prices["livekit_participant_minute"],
+    }
+
+    # What the measured trade-offs are worth per call
+    synthesized = usage["tts_chars"] + usage["tts_cached_chars"]
+    fast_tokens = sum(v["llm_prompt_tokens"] + v["llm_completion_tokens"] for (_, route), v in llm.items() if route == "fast")
+    all_full = sum(_llm_cost(prices, full_model, v["llm_prompt_tokens"], v["llm_cached_tokens"], v["llm_completion_tokens"]) for v in llm.values())
+    prompt = sum(v["llm_prompt_tokens"] for v in llm.values())
+    tradeoffs = {
+        "tts_cache_hit_share": usage["tts_cached_chars"] / synthesized if synthesized else 0.0,
+        "tts_cache_saved": usage["tts_cached_minutes"] * prices["tts_minute"],
+        "llm_fast_token_share": fast_tokens / usage["llm_tokens"] if usage["llm_tokens"] else 0.0,
+        "llm_prompt_cache_share": sum(v["llm_cached_tokens"] for v in llm.values()) / prompt if prompt else 0.0,
+        "llm_all_full_model": all_full,
+        "llm_routing_saved": all_full - cost["llm"],
+        "avatar_share": cost["avatar"] / sum(cost.values()) if sum(cost.values()) else 0.0,
+    }
+    unpriced = sorted({model for model, _ in llm if _llm_price(prices, model) is None})
+    return {"sessions": sessions, "usage": usage, "cost": cost, "llm": dict(llm), "llm_cost": llm_cost,
+            "tradeoffs": tradeoffs, "unpriced_models": unpriced}
+
+
+def format_report(report: dict, days: float, calls_per_month: int) -> str:
+    if not report["sessions"]:
+        return f"No metered calls in the last {days:g} days."
+    u, c, t = report["usage"], report["cost"], report["tradeoffs"]
+    per_call = sum(c.values())
+    table = [
+        ("Beyond Presence", f"{u['avatar_minutes']:.2f} min avatar", c["avatar"]),
+        ("Deepgram STT", f"{u['stt_minutes']:.2f} min user audio", c["stt"]),
+        ("OpenAI LLM", f"{u['llm_tokens']:,.0f} tokens", c["llm"]),
+        ("Cartesia TTS", f"{u['tts_minutes']:.2f} min / {u['tts_chars']:,.0f} chars synthesized", c["tts"]),
+        ("LiveKit", f"{u['call_minutes']:.2f} min x {u['participants']} participants", c["livekit"]),
+        ("Total", "", per_call),
+    ]
+    lines = [
+        f"Measured over {report['sessions']} calls in the last {days:g} days",
+        "",
+        f"Scenario A: average call ({u['call_minutes']:.1f} min)",
+        *(f"| {service:<16} | {used:<40} | ${cost:>7.3f} |" for service, used, cost in table),
+        "",
+        "LLM by model/route (per call):",
+    ]
+    for (model, route), v in sorted(report["llm"].items()):
+        lines.append(f"  {model} [{route}]: {v['llm_requests']:.1f} requests, {v['llm_prompt_tokens']:,.0f} in "
+                     f"({v['llm_cached_tokens']:,.0f} cached), {v['llm_completion_tokens']:,.0f} out, "
+                     f"${report['llm_cost'][(model, route)]:.4f}")
+    if report["unpriced_models"]:
+        lines.append(f"  (no price for {', '.join(report['unpriced_models'])}: counted as $0, see --prices)")
+    lines += [
+        "",
+        f"Scenario B: {calls_per_month} calls/month",
+        f"  Total minutes: {u['call_minutes'] * calls_per_month:,.0f}",
+        *(f"  {name}: ${cost * calls_per_month:,.2f}" for name, cost in c.items()),
+        f"  Total: ${per_call * calls_per_month:,.2f}/month (pay-as-you-go rates)",
+        "",
+        "Trade-offs (per call):",
+        f"  Avatar share of cost: {t['avatar_share']:.0%}",
+        f"  TTS cache: {t['tts_cache_hit_share']:.0%} of spoken characters from cache, ${t['tts_cache_saved']:.4f} saved",
+        f"  LLM routing: {t['llm_fast_token_share']:.0%} of tokens on the fast model, "
+        f"${t['llm_all_full_model']:.4f} if all on the full model, ${t['llm_routing_saved']:.4f} saved",
+        f"  LLM prompt cache: {t['llm_prompt_cache_share']:.0%} of prompt tokens cached",
+        f"  DB round trips: {u['db_round_trips']:.1f}",
+    ]
+    return "\n".join(lines)
+
+
+async def _report(args):
+    import db
+    prices = dict(PRICES)
+    if args.prices:
+        with open(args.prices) as f:
+            prices.update(json.load(f))
+    backend = db.get_backend()
+    if backend is None:
+        raise SystemExit("No storage backend configured (see STORAGE_BACKEND)")
+    since = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=args.days)).isoformat()
+    try:
+        rows = await backend.usage_totals(since)
+    finally:
+        await backend.aclose()
+    report = estimate(rows, prices, args.full_model)
+    print(format_report(report, args.days, args.calls_per_month))
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=float, default=30, help="metered calls from this many days back")
+    parser.add_argument("--calls-per-month", type=int, default=440, help="Scenario B volume (20/day x 22 days)")
+    parser.add_argument("--full-model", default="gpt-4o", help="model the routing comparison prices every token at")
+    parser.add_argument("--prices", help="JSON file overriding entries of PRICES")
+    asyncio.run(_report(parser.parse_args()))
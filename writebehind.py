@@ -0,0 +1,175 @@
+from __future__ import annotations
+import asyncio
+import collections
+import glob
+import json
+import logging
+import os
+
+import db
+
+logger = logging.getLogger("voice-agent.writebehind")
+
+# Rows waiting in memory per worker process; beyond this they go straight to the spool
+WRITE_QUEUE_SIZE = int(os.environ.get("WRITE_QUEUE_SIZE", "1000"))
+# Flush when this many rows are queued...
+WRITE_BATCH_SIZE = int(os.environ.get("WRITE_BATCH_SIZE", "50"))
+# ...or this many seconds after the first queued row
+WRITE_FLUSH_SECONDS = float(os.environ.get("WRITE_FLUSH_SECONDS", "2"))
+# Rows that could not be written are appended here and retried later
+WRITE_SPOOL_DIR = os.environ.get("WRITE_SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool"))
+
+
+class WriteBehindQueue:
+    """Batches non-critical inserts (conversation summaries, transcript lines, usage
+    events) off the call's critical path.
+
+    enqueue() never waits on the database. Rows are flushed as one multi-row insert
+    per table when WRITE_BATCH_SIZE is reached or WRITE_FLUSH_SECONDS have passed. If
+    a flush fails, or the queue is full, rows are appended to a local JSONL spool and
+    replayed after the next successful flush (or by any worker on startup).
+    """
+
+    def __init__(self, max_size: int = WRITE_QUEUE_SIZE, batch_size: int = WRITE_BATCH_SIZE,
+                 flush_interval: float = WRITE_FLUSH_SECONDS, spool_dir: str = WRITE_SPOOL_DIR):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self._rows = collections.deque()  # (table, row)
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self._spool_tasks = set()
+        self._replay_pending = True  # check for leftovers from earlier processes
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "spooled": 0, "replayed": 0}
+
+    def enqueue(self, table: str, row: dict):
+        self.stats["enqueued"] += 1
+        if len(self._rows) >= self.max_size:
+            # Full: keep the row, but on disk instead of in memory
+            self._spool_in_background([(table, row)])
+            return
+        self._rows.append((table, row))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if len(self._rows) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._rows:
+                batch = [self._rows.popleft() for _ in range(min(self.batch_size, len(self._rows)))]
+                await self._write(batch)
+            if self._replay_pending:
+                await self._replay_spool()
+
+    async def aclose(self):
+        """Flush everything (spooling what cannot be written) and stop the flusher."""
+        if self._task and not self._task.done():
+            # Under the lock the flusher is waiting, never holding a popped batch, so
+            # cancelling it loses nothing; an in-flight flush finishes first
+            async with self._flush_lock:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._spool_tasks:
+            await asyncio.gather(*self._spool_tasks)
+        await self.flush()
+        logger.info(f"Write-behind queue closed: {self.stats}")
+
+    async def _run(self):
+        while self._rows:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _write(self, batch) -> bool:
+        by_table = collections.defaultdict(list)
+        for table, row in batch:
+            by_table[table].append(row)
+        ok = True
+        pending = list(by_table.items())
+        for i, (table, rows) in enumerate(pending):
+            try:
+                if await db.insert_rows(table, rows):
+                    self.stats["written"] += len(rows)
+                    self.stats["batches"] += 1
+            except asyncio.CancelledError:
+                # e.g. the job is being torn down: keep this table's rows and the ones
+                # not attempted yet for the next process
+                unwritten = [(t, row) for t, t_rows in pending[i:] for row in t_rows]
+                self.stats["spooled"] += len(unwritten)
+                self._append_spool(unwritten)
+                raise
+            except Exception as e:
+                logger.warning(f"Write-behind flush to {table} failed ({len(rows)} rows spooled): {e}")
+                await self._spool([(table, row) for row in rows])
+                ok = False
+        if ok and not self._replay_pending and glob.glob(os.path.join(self.spool_dir, "spool-*.jsonl")):
+            self._replay_pending = True
+        return ok
+
+    def _spool_in_background(self, entries):
+        task = asyncio.create_task(self._spool(entries))
+        self._spool_tasks.add(task)
+        task.add_done_callback(self._spool_tasks.discard)
+
+    async def _spool(self, entries):
+        self.stats["spooled"] += len(entries)
+        await asyncio.get_running_loop().run_in_executor(None, self._append_spool, entries)
+
+    def _append_spool(self, entries):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"spool-{os.getpid()}.jsonl")
+        with open(path, "a") as f:
+            for table, row in entries:
+                f.write(json.dumps({"table": table, "row": row}, default=str) + "\n")
+
+    def _claim_spool(self):
+        # Rename first so two processes never replay the same file
+        claimed = []
+        for path in glob.glob(os.path.join(self.spool_dir, "spool-*.jsonl")):
+            target = os.path.join(self.spool_dir, os.path.basename(path).replace("spool-", f"replay-{os.getpid()}-", 1))
+            try:
+                os.rename(path, target)
+                claimed.append(target)
+            except OSError:
+                continue
+        entries = []
+        for path in claimed:
+            with open(path) as f:
+                entries.extend((e["table"], e["row"]) for e in map(json.loads, f) if e)
+            os.remove(path)
+        return entries
+
+    async def _replay_spool(self):
+        self._replay_pending = False
+        entries = await asyncio.get_running_loop().run_in_executor(None, self._claim_spool)
+        if not entries:
+            return
+        logger.info(f"Replaying {len(entries)} spooled rows")
+        for i in range(0, len(entries), self.batch_size):
+            batch = entries[i:i + self.batch_size]
+            if await self._write(batch):
+                self.stats["replayed"] += len(batch)
+            else:
+                # Rest goes back to the spool for the next attempt
+                await self._spool(entries[i + self.batch_size:])
+                return
+
+
+_queue: WriteBehindQueue = None
+
+
+def get_queue() -> WriteBehindQueue:
+    # One queue per worker process
+    global _queue
+    if _queue is None:
+        _queue = WriteBehindQueue()
+    return _queue